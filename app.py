@@ -4,7 +4,9 @@ import time
 import config
 from src.backend.flask_app import run_flask_server
 from src.backend.smtp_server import run_smtp_server
-from src.backend import inbox_handler
+from src.backend.inbox_store import inbox_store
+from src.backend.db_reaper import reaper
+from src.backend.db_checkpointer import checkpointer
 
 def cleanup_emails_periodically():
     """Background task to clean up expired emails periodically"""
@@ -18,37 +20,12 @@ def cleanup_emails_periodically():
 
     while True:
         try:
-            inbox = inbox_handler.read_inbox()
+            # 只为有过期数据的邮箱追加删除记录，不整体重写收件箱
+            cutoff_time = int(time.time()) - config.EMAIL_RETENTION_TIME
+            removed = inbox_store.clean_expired(cutoff_time)
 
-            # Clean expired emails
-            cleaned_inbox = inbox_handler.clean_expired_emails(inbox)
-
-            # Clean expired mailboxes
-            cleaned_inbox = inbox_handler.clean_expired_mailboxes(cleaned_inbox)
-
-            # Count changes
-            mailboxes_before = len(inbox)
-            mailboxes_after = len(cleaned_inbox)
-
-            # Count emails
-            emails_before = 0
-            emails_after = 0
-
-            for mailbox_data in inbox.values():
-                if isinstance(mailbox_data, list):
-                    emails_before += len(mailbox_data)
-                else:
-                    emails_before += len(mailbox_data.get("emails", []))
-
-            for mailbox_data in cleaned_inbox.values():
-                if isinstance(mailbox_data, list):
-                    emails_after += len(mailbox_data)
-                else:
-                    emails_after += len(mailbox_data.get("emails", []))
-
-            if emails_before != emails_after or mailboxes_before != mailboxes_after:
-                inbox_handler.write_inbox(cleaned_inbox)
-                print(f"Cleanup completed - Mailboxes: {mailboxes_before}→{mailboxes_after}, Emails: {emails_before}→{emails_after}")
+            if removed['emails'] or removed['mailboxes']:
+                print(f"Cleanup completed - Removed mailboxes: {removed['mailboxes']}, Removed emails: {removed['emails']}")
         except Exception as e:
             print(f"Error during cleanup: {e}")
 
@@ -81,11 +58,17 @@ if __name__ == "__main__":
 
     flask_thread = threading.Thread(target=run_flask_server, args=(config.FLASK_HOST, config.FLASK_PORT))
     smtp_thread = threading.Thread(target=run_smtp_server, args=(config.SMTP_HOST, config.SMTP_PORT))
-    cleanup_thread = threading.Thread(target=cleanup_emails_periodically, daemon=True)
 
     flask_thread.start()
     smtp_thread.start()
-    cleanup_thread.start()
+
+    # 数据库模式使用分批清理的后台任务，JSON模式清理inbox文件
+    if config.USE_DATABASE:
+        reaper.start()
+        checkpointer.start()
+    else:
+        cleanup_thread = threading.Thread(target=cleanup_emails_periodically, daemon=True)
+        cleanup_thread.start()
 
     try:
         flask_thread.join()
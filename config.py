@@ -9,12 +9,48 @@ FLASK_PORT = int(os.getenv("FLASK_PORT", 5000))
 SMTP_HOST = os.getenv("SMTP_HOST", "0.0.0.0")
 SMTP_PORT = int(os.getenv("SMTP_PORT", 25))  # 使用非特权端口
 
+SMTP_WORKERS = int(os.getenv("SMTP_WORKERS", 0))  # SMTP工作进程数（SO_REUSEPORT 共享端口），0 表示在主进程中运行
+SMTP_SERVER_HOSTNAME = os.getenv("SMTP_SERVER_HOSTNAME", "")  # SMTP问候和EHLO响应中的服务器主机名，留空使用本机FQDN
+
+# SMTP收件处理池配置
+INGEST_EXECUTOR = os.getenv("INGEST_EXECUTOR", "thread")  # thread 或 process
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 4))  # 解析/入库的工作线程（进程）数
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 100))  # 排队上限，超出时返回451
+# 收件落盘队列：开启后邮件追加到本地队列文件并 fsync 即返回250，由后台任务解析入库，崩溃后重启时重放
+INGEST_SPOOL_ENABLED = os.getenv("INGEST_SPOOL_ENABLED", "false").lower() == "true"
+INGEST_SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR", "data/spool")  # 队列文件目录
+INGEST_SPOOL_FSYNC = os.getenv("INGEST_SPOOL_FSYNC", "true").lower() == "true"  # 返回250前是否 fsync
+INGEST_SPOOL_SEGMENT_MB = int(os.getenv("INGEST_SPOOL_SEGMENT_MB", 64))  # 单个队列文件大小上限（MB）
+INGEST_SPOOL_MAX_RETRIES = int(os.getenv("INGEST_SPOOL_MAX_RETRIES", 5))  # 入库失败的最大重试次数，超过后移到 failed 目录
+INGEST_SPOOL_MAX_PENDING_MB = int(os.getenv("INGEST_SPOOL_MAX_PENDING_MB", 256))  # 尚未入库的邮件总大小上限（MB），超出时返回451
+
 INBOX_FILE_NAME = os.getenv("INBOX_FILE_NAME", "inbox.json")
-MAX_INBOX_SIZE = int(os.getenv("MAX_INBOX_SIZE", 100000000))
+MAX_INBOX_SIZE = int(os.getenv("MAX_INBOX_SIZE", 100000000))  # JSON模式下收件箱数据的容量上限（字节），超出时按最近访问顺序淘汰旧邮件
+INBOX_EVICT_TARGET_RATIO = float(os.getenv("INBOX_EVICT_TARGET_RATIO", 0.9))  # 淘汰后保留的数据量占容量上限的比例，留出余量避免每封邮件都触发淘汰
+INBOX_LOG_COMPACT_BYTES = int(os.getenv("INBOX_LOG_COMPACT_BYTES", 8 * 1024 * 1024))  # JSON模式下修改日志超过该大小时合并为快照文件，0 表示只在启动和整体写入时合并
+INBOX_FLUSH_INTERVAL = float(os.getenv("INBOX_FLUSH_INTERVAL", 1))  # JSON模式下后台线程把修改刷到磁盘的间隔（秒），0 表示每次修改都立即刷盘
 
 # Database settings
 DATABASE_PATH = os.getenv("DATABASE_PATH", "data/mailbox.db")
 USE_DATABASE = os.getenv("USE_DATABASE", "true").lower() == "true"
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() == "true"  # 启动时自动执行未执行的结构迁移
+# 单写线程批量提交配置
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", 64))  # 每个事务最多合并的写操作数
+DB_WRITE_MAX_DELAY_MS = float(os.getenv("DB_WRITE_MAX_DELAY_MS", 5))  # 凑批的最长等待时间（毫秒）
+DB_WRITE_QUEUE_SIZE = int(os.getenv("DB_WRITE_QUEUE_SIZE", 10000))  # 写队列长度上限
+DB_WRITE_TIMEOUT = float(os.getenv("DB_WRITE_TIMEOUT", 30))  # 同步写操作等待提交的最长时间（秒），0 表示不限
+# 读连接池配置
+DB_POOL_MAX_IDLE = int(os.getenv("DB_POOL_MAX_IDLE", 8))  # 连接池保留的空闲连接数
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 256))  # 每个连接的预编译语句缓存数
+# SQLite 日志模式与连接参数
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL").upper()  # WAL 或 DELETE 等
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()  # OFF / NORMAL / FULL / EXTRA
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))  # 数据库被锁时的等待时间（毫秒）
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", 64 * 1024 * 1024))  # 内存映射大小（字节），0表示关闭
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", 16384))  # 每个连接的页缓存大小（KB）
+# WAL 检查点配置
+DB_CHECKPOINT_INTERVAL = int(os.getenv("DB_CHECKPOINT_INTERVAL", 30))  # 检查间隔（秒）
+DB_CHECKPOINT_IDLE_SECONDS = int(os.getenv("DB_CHECKPOINT_IDLE_SECONDS", 60))  # 无写入超过该时间视为空闲，执行TRUNCATE检查点
 
 PROTECTED_ADDRESSES = os.getenv("PROTECTED_ADDRESSES", "^admin.*")
 
@@ -38,6 +74,27 @@ else:
 
 MAX_EMAILS_PER_ADDRESS = int(os.getenv("MAX_EMAILS_PER_ADDRESS", 50))
 
+# 收件箱游标分页
+INBOX_PAGE_SIZE = int(os.getenv("INBOX_PAGE_SIZE", 20))  # 只传cursor时的默认每页邮件数
+INBOX_PAGE_SIZE_MAX = int(os.getenv("INBOX_PAGE_SIZE_MAX", 100))  # 每页邮件数上限
+STREAM_MAX_CLIENTS = int(os.getenv("STREAM_MAX_CLIENTS", 200))  # /api/stream 同时连接数上限，超出时返回503，前端退回轮询
+STREAM_MAX_SECONDS = int(os.getenv("STREAM_MAX_SECONDS", 300))  # 单个推送连接的最长时间（秒），到期后由浏览器自动重连
+STREAM_HEARTBEAT_SECONDS = int(os.getenv("STREAM_HEARTBEAT_SECONDS", 15))  # 推送连接的心跳间隔（秒）
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", 1))  # SMTP 运行在独立工作进程时检查已订阅邮箱变化的间隔，也是 wait_for_email 重新检查邮件的最长间隔（秒）
+WAIT_FOR_EMAIL_DEFAULT_TIMEOUT = float(os.getenv("WAIT_FOR_EMAIL_DEFAULT_TIMEOUT", 30))  # /api/wait_for_email 未指定 timeout 时的等待时间（秒）
+WAIT_FOR_EMAIL_MAX_TIMEOUT = float(os.getenv("WAIT_FOR_EMAIL_MAX_TIMEOUT", 120))  # /api/wait_for_email 的最长等待时间（秒）
+EMAIL_PREVIEW_LENGTH = int(os.getenv("EMAIL_PREVIEW_LENGTH", 150))  # 邮件列表摘要长度（字符）
+
+# 邮件正文压缩存储（数据库模式）
+BODY_CODEC = os.getenv("BODY_CODEC", "zlib")  # 新邮件正文的压缩编码，raw 表示不压缩
+BODY_COMPRESSION_LEVEL = int(os.getenv("BODY_COMPRESSION_LEVEL", 6))  # 压缩级别 1-9
+BODY_COMPRESS_MIN_BYTES = int(os.getenv("BODY_COMPRESS_MIN_BYTES", 256))  # 小于该大小的正文不压缩
+
+# 数据库模式下的过期数据后台清理（分批删除，不在收件路径中执行）
+DB_REAPER_INTERVAL = int(os.getenv("DB_REAPER_INTERVAL", 60))  # 两轮清理之间的间隔（秒）
+DB_REAPER_BATCH_SIZE = int(os.getenv("DB_REAPER_BATCH_SIZE", 500))  # 每批最多删除的行数
+DB_REAPER_PAUSE_MS = int(os.getenv("DB_REAPER_PAUSE_MS", 20))  # 批次之间让出写线程的时间（毫秒）
+
 # IP whitelist settings
 ENABLE_IP_WHITELIST = os.getenv("ENABLE_IP_WHITELIST", "false").lower() == "true"
 IP_WHITELIST = os.getenv("IP_WHITELIST", "127.0.0.1,::1,192.168.0.0/16,10.0.0.0/8")
@@ -53,6 +110,11 @@ MAX_MAILBOX_SIZE_BYTES = MAX_MAILBOX_SIZE_MB * 1024 * 1024  # 转换为字节
 MAX_EMAIL_SIZE_MB = int(os.getenv("MAX_EMAIL_SIZE_MB", 2))  # 单封邮件最大大小（MB）
 MAX_EMAIL_SIZE_BYTES = MAX_EMAIL_SIZE_MB * 1024 * 1024  # 转换为字节
 
+# 邮箱元数据缓存（SMTP信封阶段检查收件人使用）
+MAILBOX_CACHE_TTL = int(os.getenv("MAILBOX_CACHE_TTL", 30))  # 邮箱信息缓存时间（秒）
+MAILBOX_CACHE_NEGATIVE_TTL = int(os.getenv("MAILBOX_CACHE_NEGATIVE_TTL", 5))  # "邮箱不存在"结果缓存时间（秒）
+MAILBOX_CACHE_SIZE = int(os.getenv("MAILBOX_CACHE_SIZE", 10000))  # 最大缓存条目数
+
 # 测试用：快速过期时间（单位：天，可以设置小数）
 # EMAIL_RETENTION_DAYS = 0.001  # 约1.4分钟，用于测试
 
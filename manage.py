@@ -0,0 +1,80 @@
+"""
+离线维护命令
+用法:
+    python manage.py migrate               执行未执行的数据库结构迁移
+    python manage.py migrate --check       只检查是否有未执行的迁移（有则返回1）
+    python manage.py reconcile-counters    按邮件表重新计算邮箱计数字段
+    python manage.py recompress            把已有邮件正文转换为配置的压缩编码
+"""
+
+import argparse
+import os
+import sys
+
+# 添加backend目录到路径
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'backend')
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+# 维护命令不在导入时自动迁移，由 migrate 命令显式执行
+os.environ.setdefault('DB_AUTO_MIGRATE', 'false')
+
+from database import db_manager
+
+
+def migrate(args) -> int:
+    """执行或检查数据库结构迁移"""
+    status = db_manager.get_schema_status()
+    print(f"当前结构版本: {status['version']}，最新版本: {status['latest']}")
+
+    if args.check:
+        for item in status['pending']:
+            print(f"  未执行: {item['version']} - {item['description']}")
+        return 1 if status['pending'] else 0
+
+    applied = db_manager.migrate()
+    if not applied:
+        print("没有需要执行的迁移")
+    return 0
+
+
+def reconcile_counters(args) -> int:
+    """校正邮箱计数字段"""
+    result = db_manager.reconcile_mailbox_counters()
+    print(f"已校正 {result['fixed_mailboxes']} 个邮箱的计数，耗时 {result['duration']} 秒")
+    return 0
+
+
+def recompress(args) -> int:
+    """分批重新压缩已有邮件正文"""
+    result = db_manager.recompress_bodies(codec=args.codec, batch_size=args.batch_size,
+                                          pause=args.pause_ms / 1000)
+    print(f"已处理 {result['processed']} 条正文（编码: {result['codec']}），"
+          f"节省 {result['saved_bytes'] / 1024 / 1024:.2f}MB，耗时 {result['duration']} 秒")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='邮箱服务离线维护命令')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = subparsers.add_parser('migrate', help='执行未执行的数据库结构迁移')
+    migrate_parser.add_argument('--check', action='store_true', help='只检查不执行，有未执行的迁移时返回1')
+    subparsers.add_parser('reconcile-counters', help='按邮件表重新计算邮箱的邮件数、未读数、最新邮件时间和已用容量')
+
+    recompress_parser = subparsers.add_parser('recompress', help='把已有邮件正文转换为配置的压缩编码，可在服务运行时执行')
+    recompress_parser.add_argument('--codec', default=None, help='目标编码（默认使用 BODY_CODEC 配置）')
+    recompress_parser.add_argument('--batch-size', type=int, default=500, help='每批处理的正文数')
+    recompress_parser.add_argument('--pause-ms', type=int, default=20, help='批次之间的暂停时间（毫秒）')
+
+    args = parser.parse_args()
+    handlers = {
+        'migrate': migrate,
+        'reconcile-counters': reconcile_counters,
+        'recompress': recompress,
+    }
+    return handlers[args.command](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""
+邮件正文压缩编码
+email_bodies 每行记录自己的编码（codec）：raw 为明文存在 body 列，
+其他编码压缩后存在 data 列，读取时按行上的编码解压，因此可以随时更换默认编码
+"""
+
+import zlib
+from typing import Callable, Dict, Optional, Tuple
+
+# 编码名 -> (压缩函数, 解压函数)，压缩函数参数为 (字节, 压缩级别)
+CODECS: Dict[str, Tuple[Callable[[bytes, int], bytes], Callable[[bytes], bytes]]] = {}
+
+
+def register_codec(name: str, compress: Callable[[bytes, int], bytes], decompress: Callable[[bytes], bytes]):
+    """注册压缩编码"""
+    CODECS[name] = (compress, decompress)
+
+
+register_codec('zlib', lambda data, level: zlib.compress(data, level), zlib.decompress)
+
+
+def encode_body(body: Optional[str], codec: str = 'zlib', level: int = 6,
+                min_bytes: int = 0) -> Tuple[str, Optional[str], Optional[bytes], int]:
+    """
+    编码正文，返回 (编码名, 明文body列, 压缩data列, 存储字节数)
+    正文小于 min_bytes 或压缩后没有变小时按 raw 存储
+    """
+    body = body or ''
+    raw = body.encode('utf-8')
+    if codec != 'raw' and codec in CODECS and len(raw) >= min_bytes:
+        data = CODECS[codec][0](raw, level)
+        if len(data) < len(raw):
+            return codec, None, data, len(data)
+    return 'raw', body, None, len(raw)
+
+
+def decode_body(codec: Optional[str], body: Optional[str], data: Optional[bytes]) -> str:
+    """按行上的编码还原正文"""
+    if not codec or codec == 'raw' or data is None:
+        return body or ''
+    if codec not in CODECS:
+        raise ValueError(f"Unknown body codec: {codec}")
+    return CODECS[codec][1](data).decode('utf-8')
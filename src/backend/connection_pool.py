@@ -0,0 +1,190 @@
+"""
+SQLite 读连接池
+长期运行的线程（SMTP处理池、后台任务）复用线程本地连接，线程结束时连接自动归还连接池；
+Flask 请求在请求上下文中持有一个连接，请求结束后归还连接池供后续请求复用。
+复用连接可以保留已解析的schema、页缓存和预编译语句缓存
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from typing import Callable, Dict, List
+from flask import g, has_app_context
+
+# 请求上下文中保存连接的属性名
+_REQUEST_ATTR = '_db_connection'
+
+
+class _ThreadConnection:
+    """线程本地连接的持有者：线程结束时线程本地数据被清除，持有者被回收后连接归还连接池"""
+
+    __slots__ = ('conn', '__weakref__')
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+
+class ConnectionPool:
+    def __init__(self, db_path: str, max_idle: int = 8, cached_statements: int = 256,
+                 configure: Callable[[sqlite3.Connection], None] = None):
+        """初始化连接池"""
+        self.db_path = db_path
+        self.max_idle = max(0, max_idle)
+        self.cached_statements = cached_statements
+        self.configure = configure
+
+        self.lock = threading.Lock()
+        self._idle: List[sqlite3.Connection] = []
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+        self.created = 0
+        self.reused = 0
+        self.closed = 0
+        self.in_use = 0
+        self.errors = 0
+        self.thread_local = 0
+
+    def _check_pid(self):
+        """fork出的子进程不能使用父进程的连接"""
+        if self._pid != os.getpid():
+            with self.lock:
+                if self._pid != os.getpid():
+                    self._idle = []
+                    self._local = threading.local()
+                    self._pid = os.getpid()
+                    self.in_use = 0
+                    self.thread_local = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """新建连接并执行连接初始化"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row  # 使结果可以像字典一样访问
+        if self.configure:
+            self.configure(conn)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """从连接池取出一个连接，没有空闲连接时新建"""
+        self._check_pid()
+        with self.lock:
+            conn = self._idle.pop() if self._idle else None
+            self.in_use += 1
+            if conn is not None:
+                self.reused += 1
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self.lock:
+                    self.in_use -= 1
+                    self.errors += 1
+                raise
+            with self.lock:
+                self.created += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """归还连接，未结束的事务会被回滚"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._close(conn, error=True)
+            return
+
+        with self.lock:
+            self.in_use -= 1
+            if self._pid == os.getpid() and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        self._close(conn, counted=False)
+
+    def _close(self, conn: sqlite3.Connection, error: bool = False, counted: bool = True):
+        """关闭连接"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self.lock:
+            if counted:
+                self.in_use -= 1
+            self.closed += 1
+            if error:
+                self.errors += 1
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        获取当前上下文的连接
+        Flask 请求内返回请求级连接（请求结束时归还），其他线程返回线程本地连接
+        """
+        self._check_pid()
+        if has_app_context():
+            conn = getattr(g, _REQUEST_ATTR, None)
+            if conn is None:
+                conn = self.acquire()
+                setattr(g, _REQUEST_ATTR, conn)
+            return conn
+
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            conn = self.acquire()
+            holder = _ThreadConnection(conn)
+            weakref.finalize(holder, self._release_thread_connection, conn, self._pid)
+            self._local.holder = holder
+            with self.lock:
+                self.thread_local += 1
+        return holder.conn
+
+    def _release_thread_connection(self, conn: sqlite3.Connection, pid: int):
+        """线程结束（或进程退出）时归还线程本地连接；fork 前创建的连接不在子进程中使用"""
+        if pid != os.getpid() or pid != self._pid:
+            return
+        with self.lock:
+            self.thread_local -= 1
+        self.release(conn)
+
+    def release_request_connection(self, exc=None):
+        """Flask teardown 回调：归还请求级连接"""
+        conn = g.pop(_REQUEST_ATTR, None)
+        if conn is not None:
+            self.release(conn)
+
+    def health_check(self) -> Dict:
+        """执行一次简单查询检查数据库是否可用"""
+        started = time.perf_counter()
+        conn = self.acquire()
+        try:
+            conn.execute('SELECT 1').fetchone()
+            ok, error = True, None
+        except sqlite3.Error as e:
+            ok, error = False, str(e)
+            with self.lock:
+                self.errors += 1
+        finally:
+            self.release(conn)
+        return {
+            'ok': ok,
+            'error': error,
+            'latency_ms': round((time.perf_counter() - started) * 1000, 3)
+        }
+
+    def get_stats(self) -> Dict:
+        """获取连接池使用统计"""
+        with self.lock:
+            acquired = self.created + self.reused
+            return {
+                'idle': len(self._idle),
+                'in_use': self.in_use,
+                'thread_local': self.thread_local,
+                'max_idle': self.max_idle,
+                'created': self.created,
+                'reused': self.reused,
+                'closed': self.closed,
+                'errors': self.errors,
+                'reuse_ratio': round(self.reused / acquired, 4) if acquired else 0
+            }
@@ -1,16 +1,82 @@
 import sqlite3
+import hashlib
+import html
 import json
+import re
 import time
 import uuid
 import os
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import config
+from concurrent.futures import Future
+from mailbox_cache import MailboxCache, MISS
+from connection_pool import ConnectionPool
+from storage_writer import StorageWriter
+from body_codec import decode_body, encode_body
+from migrations import LATEST_VERSION, apply_migrations, get_pending_migrations, get_schema_version
+
+# 允许配置的PRAGMA取值
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+# 列表查询只读取的邮件元数据列（正文在 email_bodies 表中，按需读取）
+EMAIL_META_COLUMNS = '''
+    e.id, e.mailbox_id, e.from_address, e.to_address, e.subject, e.preview,
+    e.content_type, e.timestamp, e.sent_formatted, e.is_read, e.size_bytes, e.body_id, e.part_count
+'''
+
+_HTML_BLOCK_RE = re.compile(r'<(script|style|head)[^>]*>.*?</\1>', re.IGNORECASE | re.DOTALL)
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def make_email_preview(body: Optional[str], content_type: str = 'Text', length: int = None) -> str:
+    """生成邮件列表用的纯文本摘要（HTML邮件去掉标签）"""
+    if not body:
+        return ''
+    length = length or getattr(config, 'EMAIL_PREVIEW_LENGTH', 150)
+    # 只处理开头一段，避免对大邮件做全文正则
+    text = body[:length * 20]
+    if content_type == 'HTML' or '<' in text:
+        text = html.unescape(_HTML_TAG_RE.sub(' ', _HTML_BLOCK_RE.sub(' ', text)))
+    text = _WHITESPACE_RE.sub(' ', text).strip()
+    return text[:length] + ('...' if len(text) > length else '')
+
+
+def token_digest(token: Optional[str]) -> Optional[str]:
+    """令牌的SHA-256摘要（64位十六进制），令牌查询统一按摘要走唯一索引"""
+    if not token:
+        return None
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
 
 class DatabaseManager:
     def __init__(self, db_path: str = None):
         """初始化数据库管理器"""
         self.db_path = db_path or getattr(config, 'DATABASE_PATH', 'data/mailbox.db')
+        # 地址 -> 邮箱信息缓存，供SMTP信封阶段检查使用
+        self.mailbox_cache = MailboxCache(
+            ttl=getattr(config, 'MAILBOX_CACHE_TTL', 30),
+            negative_ttl=getattr(config, 'MAILBOX_CACHE_NEGATIVE_TTL', 5),
+            max_entries=getattr(config, 'MAILBOX_CACHE_SIZE', 10000)
+        )
+        # 读连接池：线程本地/请求级复用连接
+        self.pool = ConnectionPool(
+            self.db_path,
+            max_idle=getattr(config, 'DB_POOL_MAX_IDLE', 8),
+            cached_statements=getattr(config, 'DB_STATEMENT_CACHE_SIZE', 256),
+            configure=self._configure_connection
+        )
+        # 所有写操作由单独的写线程批量提交
+        self.writer = StorageWriter(
+            self.db_path,
+            batch_size=getattr(config, 'DB_WRITE_BATCH_SIZE', 64),
+            max_delay=getattr(config, 'DB_WRITE_MAX_DELAY_MS', 5) / 1000,
+            queue_size=getattr(config, 'DB_WRITE_QUEUE_SIZE', 10000),
+            configure=self._configure_connection,
+            write_timeout=getattr(config, 'DB_WRITE_TIMEOUT', 30)
+        )
         self.ensure_database_exists()
         self.init_tables()
     
@@ -20,267 +86,167 @@ class DatabaseManager:
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir, exist_ok=True)
     
-    def get_connection(self) -> sqlite3.Connection:
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # 使结果可以像字典一样访问
-        return conn
-    
-    def init_tables(self):
-        """初始化数据库表"""
-        with self.get_connection() as conn:
-            # 用户表
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    email TEXT,
-                    password_hash TEXT NOT NULL,
-                    created_at INTEGER NOT NULL,
-                    created_by_ip TEXT,
-                    is_active BOOLEAN DEFAULT 1,
-                    last_login INTEGER
-                )
-            ''')
-
-            # 用户邮箱关联表
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS users_mailboxes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    mailbox_id TEXT NOT NULL,
-                    created_at INTEGER NOT NULL,
-                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-                    FOREIGN KEY (mailbox_id) REFERENCES mailboxes (id) ON DELETE CASCADE,
-                    UNIQUE(user_id, mailbox_id)
-                )
-            ''')
-
-            # 邮箱表
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS mailboxes (
-                    id TEXT PRIMARY KEY,
-                    address TEXT UNIQUE NOT NULL,
-                    created_at INTEGER NOT NULL,
-                    expires_at INTEGER NOT NULL,
-                    retention_days INTEGER DEFAULT 7,
-                    is_active BOOLEAN DEFAULT 1,
-                    sender_whitelist TEXT DEFAULT '[]',
-                    whitelist_enabled BOOLEAN DEFAULT 0,
-                    created_by_ip TEXT,
-                    access_token TEXT,
-                    last_accessed INTEGER
-                )
-            ''')
-
-            # 检查并添加邮箱密钥字段（如果不存在）
-            try:
-                conn.execute('ALTER TABLE mailboxes ADD COLUMN mailbox_key TEXT')
-                print("Added mailbox_key column to mailboxes table")
-            except sqlite3.OperationalError:
-                # 字段已存在，忽略错误
-                pass
-
-            # 检查并添加白名单启用字段（如果不存在）
-            try:
-                conn.execute('ALTER TABLE mailboxes ADD COLUMN whitelist_enabled BOOLEAN DEFAULT 0')
-                print("Added whitelist_enabled column to mailboxes table")
-            except sqlite3.OperationalError:
-                # 字段已存在，忽略错误
-                pass
-
-            # 检查并添加创建来源字段（如果不存在）
-            try:
-                conn.execute('ALTER TABLE mailboxes ADD COLUMN created_source TEXT DEFAULT "unknown"')
-                print("Added created_source column to mailboxes table")
-            except sqlite3.OperationalError:
-                # 字段已存在，忽略错误
-                pass
-
-            # 添加管理员更新字段
-            try:
-                conn.execute('ALTER TABLE mailboxes ADD COLUMN updated_by_admin TEXT')
-                print("Added updated_by_admin column to mailboxes table")
-            except sqlite3.OperationalError:
-                pass
-
-            try:
-                conn.execute('ALTER TABLE mailboxes ADD COLUMN updated_at INTEGER')
-                print("Added updated_at column to mailboxes table")
-            except sqlite3.OperationalError:
-                pass
-
-            # 添加允许域名字段
-            try:
-                conn.execute('ALTER TABLE mailboxes ADD COLUMN allowed_domains TEXT DEFAULT "[]"')
-                print("Added allowed_domains column to mailboxes table")
-            except sqlite3.OperationalError:
-                pass
-
-            # 添加容量限制字段
-            try:
-                conn.execute('ALTER TABLE mailboxes ADD COLUMN storage_used INTEGER DEFAULT 0')
-                print("Added storage_used column to mailboxes table")
-            except sqlite3.OperationalError:
-                pass
-
-            try:
-                conn.execute('ALTER TABLE mailboxes ADD COLUMN storage_limit INTEGER DEFAULT 3145728')  # 默认3MB
-                print("Added storage_limit column to mailboxes table")
-            except sqlite3.OperationalError:
-                pass
-
-            # 更新已存在邮箱的容量限制为3MB
-            try:
-                conn.execute('UPDATE mailboxes SET storage_limit = 3145728 WHERE storage_limit = 52428800 OR storage_limit IS NULL')
-                print("Updated existing mailboxes storage_limit to 3MB")
-            except sqlite3.OperationalError:
-                pass
-
-            # 邮件表
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS emails (
-                    id TEXT PRIMARY KEY,
-                    mailbox_id TEXT NOT NULL,
-                    from_address TEXT NOT NULL,
-                    to_address TEXT NOT NULL,
-                    subject TEXT,
-                    body TEXT,
-                    content_type TEXT DEFAULT 'Text',
-                    timestamp INTEGER NOT NULL,
-                    sent_formatted TEXT,
-                    is_read BOOLEAN DEFAULT 0,
-                    FOREIGN KEY (mailbox_id) REFERENCES mailboxes (id) ON DELETE CASCADE
-                )
-            ''')
-
-            # 添加邮件大小字段
+    def _configure_connection(self, conn: sqlite3.Connection):
+        """新建连接时的PRAGMA设置（读连接和写连接共用）"""
+        synchronous = getattr(config, 'DB_SYNCHRONOUS', 'NORMAL')
+        if synchronous not in SYNCHRONOUS_MODES:
+            synchronous = 'NORMAL'
+
+        conn.execute(f'PRAGMA busy_timeout = {int(getattr(config, "DB_BUSY_TIMEOUT_MS", 5000))}')
+        conn.execute(f'PRAGMA synchronous = {synchronous}')
+        conn.execute(f'PRAGMA mmap_size = {int(getattr(config, "DB_MMAP_SIZE", 0))}')
+        # 负数表示以KB为单位
+        conn.execute(f'PRAGMA cache_size = {-int(getattr(config, "DB_CACHE_SIZE_KB", 2000))}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+
+    def _init_journal_mode(self, conn: sqlite3.Connection) -> str:
+        """设置日志模式（WAL模式会持久保存在数据库文件中）"""
+        journal_mode = getattr(config, 'DB_JOURNAL_MODE', 'WAL')
+        if journal_mode not in JOURNAL_MODES:
+            print(f"未知的日志模式 {journal_mode}，使用 WAL")
+            journal_mode = 'WAL'
+
+        current = conn.execute('PRAGMA journal_mode').fetchone()[0].upper()
+        if current != journal_mode:
+            current = conn.execute(f'PRAGMA journal_mode = {journal_mode}').fetchone()[0].upper()
+            print(f"数据库日志模式: {current}")
+        return current
+
+    def get_wal_stats(self) -> Dict:
+        """获取WAL文件大小等指标"""
+        def file_size(path):
             try:
-                conn.execute('ALTER TABLE emails ADD COLUMN size_bytes INTEGER DEFAULT 0')
-                print("Added size_bytes column to emails table")
-            except sqlite3.OperationalError:
-                pass
-            
-            # 邀请码表
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS invite_codes (
-                    id TEXT PRIMARY KEY,
-                    code TEXT UNIQUE NOT NULL,
-                    created_by INTEGER,
-                    created_at INTEGER NOT NULL,
-                    expires_at INTEGER,
-                    is_used BOOLEAN DEFAULT 0,
-                    used_by INTEGER,
-                    used_at INTEGER,
-                    max_uses INTEGER DEFAULT 1,
-                    current_uses INTEGER DEFAULT 0,
-                    FOREIGN KEY (created_by) REFERENCES users (id) ON DELETE SET NULL,
-                    FOREIGN KEY (used_by) REFERENCES users (id) ON DELETE SET NULL
-                )
-            ''')
+                return os.path.getsize(path)
+            except OSError:
+                return 0
 
-            # 审计日志表
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS audit_logs (
-                    id TEXT PRIMARY KEY,
-                    timestamp INTEGER NOT NULL,
-                    action TEXT NOT NULL,
-                    mailbox_id TEXT,
-                    admin_user TEXT,
-                    changes TEXT,
-                    ip_address TEXT,
-                    FOREIGN KEY (mailbox_id) REFERENCES mailboxes (id) ON DELETE SET NULL
-                )
-            ''')
+        conn = self.get_connection()
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        return {
+            'journal_mode': conn.execute('PRAGMA journal_mode').fetchone()[0],
+            'db_size_bytes': file_size(self.db_path),
+            'wal_size_bytes': file_size(self.db_path + '-wal'),
+            'shm_size_bytes': file_size(self.db_path + '-shm'),
+            'page_size': page_size,
+            'wal_autocheckpoint_pages': conn.execute('PRAGMA wal_autocheckpoint').fetchone()[0]
+        }
 
-            # 子管理员表
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS sub_admins (
-                    id TEXT PRIMARY KEY,
-                    token TEXT UNIQUE NOT NULL,
-                    domains TEXT NOT NULL,
-                    sender_whitelist TEXT,
-                    max_retention_days INTEGER DEFAULT 30,
-                    created_at INTEGER NOT NULL,
-                    updated_at INTEGER NOT NULL,
-                    is_active INTEGER DEFAULT 1,
-                    created_by TEXT,
-                    notes TEXT
-                )
-            ''')
+    def get_connection(self) -> sqlite3.Connection:
+        """获取数据库连接（复用当前线程或当前请求的连接，不要手动关闭）"""
+        return self.pool.connection()
 
-            # 创建索引
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_mailboxes_address ON mailboxes (address)')
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_mailboxes_expires ON mailboxes (expires_at)')
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_emails_mailbox ON emails (mailbox_id)')
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_emails_timestamp ON emails (timestamp)')
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_invite_codes_code ON invite_codes (code)')
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_invite_codes_used ON invite_codes (is_used)')
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_audit_logs_mailbox ON audit_logs (mailbox_id)')
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_audit_logs_timestamp ON audit_logs (timestamp)')
-
-            # 数据库迁移：重建 sub_admins 表（去掉 password_hash，添加 sender_whitelist）
-            try:
-                # 检查列是否存在
-                cursor = conn.execute("PRAGMA table_info(sub_admins)")
-                columns = [row[1] for row in cursor.fetchall()]
-
-                # 如果存在 password_hash 列，需要重建表
-                if 'password_hash' in columns:
-                    print("数据库迁移：开始重建 sub_admins 表...")
-
-                    # 1. 备份现有数据
-                    cursor = conn.execute('SELECT id, token, domains, created_at, updated_at, is_active, created_by, notes FROM sub_admins')
-                    old_data = cursor.fetchall()
-
-                    # 2. 删除旧表
-                    conn.execute('DROP TABLE sub_admins')
-
-                    # 3. 创建新表
-                    conn.execute('''
-                        CREATE TABLE sub_admins (
-                            id TEXT PRIMARY KEY,
-                            token TEXT UNIQUE NOT NULL,
-                            domains TEXT NOT NULL,
-                            sender_whitelist TEXT,
-                            max_retention_days INTEGER DEFAULT 30,
-                            created_at INTEGER NOT NULL,
-                            updated_at INTEGER NOT NULL,
-                            is_active INTEGER DEFAULT 1,
-                            created_by TEXT,
-                            notes TEXT
-                        )
-                    ''')
-
-                    # 4. 恢复数据（不包括 password_hash）
-                    for row in old_data:
-                        conn.execute('''
-                            INSERT INTO sub_admins (id, token, domains, sender_whitelist, max_retention_days, created_at, updated_at, is_active, created_by, notes)
-                            VALUES (?, ?, ?, NULL, 30, ?, ?, ?, ?, ?)
-                        ''', row)
-
-                    conn.commit()
-                    print(f"数据库迁移：成功重建 sub_admins 表，迁移了 {len(old_data)} 条记录")
+    def get_health(self) -> Dict:
+        """获取数据库连接池和写线程的健康状态与使用统计"""
+        return {
+            'check': self.pool.health_check(),
+            'pool': self.pool.get_stats(),
+            'writer': self.writer.get_stats(),
+            'wal': self.get_wal_stats(),
+            'schema': self.get_schema_status()
+        }
 
-                else:
-                    # 添加缺少的列
-                    if 'sender_whitelist' not in columns:
-                        conn.execute('ALTER TABLE sub_admins ADD COLUMN sender_whitelist TEXT')
-                        print("数据库迁移：已添加 sender_whitelist 列到 sub_admins 表")
+    def write(self, fn, *args, **kwargs):
+        """
+        在写线程中执行写操作 fn(conn, *args, **kwargs)
+        等待所在批次提交后返回 fn 的结果，fn 中不要调用 commit
+        """
+        return self.writer.execute(fn, *args, **kwargs)
 
-                    if 'max_retention_days' not in columns:
-                        conn.execute('ALTER TABLE sub_admins ADD COLUMN max_retention_days INTEGER DEFAULT 30')
-                        print("数据库迁移：已添加 max_retention_days 列到 sub_admins 表")
+    def submit_write(self, fn, *args, **kwargs) -> Future:
+        """提交写操作但不等待提交完成，返回Future"""
+        return self.writer.submit(fn, *args, **kwargs)
+    
+    def init_tables(self):
+        """
+        初始化数据库：设置日志模式并执行未执行的结构迁移
+        DB_AUTO_MIGRATE 关闭时只检查不执行，由 manage.py migrate 手动升级
+        """
+        conn = self._open_migration_connection()
+        try:
+            self._init_journal_mode(conn)
 
-                    conn.commit()
+            if getattr(config, 'DB_AUTO_MIGRATE', True):
+                apply_migrations(conn, self)
+            else:
+                pending = get_pending_migrations(conn)
+                if pending:
+                    print(f"数据库结构不是最新版本，有 {len(pending)} 个迁移未执行，请运行 python manage.py migrate")
+        finally:
+            conn.close()
+
+    def _open_migration_connection(self) -> sqlite3.Connection:
+        """迁移使用独立的自动提交连接，由迁移步骤自行控制事务"""
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        self._configure_connection(conn)
+        return conn
 
-            except Exception as e:
-                print(f"数据库迁移失败: {e}")
-                import traceback
-                traceback.print_exc()
+    def get_schema_status(self) -> Dict:
+        """获取结构版本和未执行的迁移（只读）"""
+        conn = self._open_migration_connection()
+        try:
+            return {
+                'version': get_schema_version(conn),
+                'latest': LATEST_VERSION,
+                'pending': [{'version': version, 'description': description}
+                            for version, description in get_pending_migrations(conn)]
+            }
+        finally:
+            conn.close()
 
-            conn.commit()
+    def migrate(self) -> List[Dict]:
+        """执行所有未执行的结构迁移，返回执行记录"""
+        conn = self._open_migration_connection()
+        try:
+            applied = apply_migrations(conn, self)
+        finally:
+            conn.close()
+        if applied:
+            self.invalidate_mailbox_cache()
+        return applied
     
+    def _backfill_token_digests(self, conn: sqlite3.Connection):
+        """为还没有摘要的旧数据计算令牌摘要"""
+        rows = conn.execute('''
+            SELECT id, access_token, mailbox_key FROM mailboxes
+            WHERE (access_token IS NOT NULL AND access_token_hash IS NULL)
+               OR (mailbox_key IS NOT NULL AND mailbox_key_hash IS NULL)
+        ''').fetchall()
+        conn.executemany(
+            'UPDATE mailboxes SET access_token_hash = ?, mailbox_key_hash = ? WHERE id = ?',
+            [(token_digest(row[1]), token_digest(row[2]), row[0]) for row in rows]
+        )
+
+        sub_admin_rows = conn.execute(
+            'SELECT id, token FROM sub_admins WHERE token_hash IS NULL'
+        ).fetchall()
+        conn.executemany(
+            'UPDATE sub_admins SET token_hash = ? WHERE id = ?',
+            [(token_digest(row[1]), row[0]) for row in sub_admin_rows]
+        )
+
+        if rows or sub_admin_rows:
+            print(f"已为 {len(rows)} 个邮箱和 {len(sub_admin_rows)} 个子管理员生成令牌摘要")
+
+    def _backfill_email_previews(self, conn: sqlite3.Connection, batch_size: int = 1000) -> int:
+        """为没有摘要的邮件生成摘要，返回处理的邮件数"""
+        total = 0
+        while True:
+            rows = conn.execute('''
+                SELECT e.id, e.content_type, b.body
+                FROM emails e
+                LEFT JOIN email_bodies b ON b.id = e.body_id
+                WHERE e.preview IS NULL
+                LIMIT ?
+            ''', (batch_size,)).fetchall()
+            if not rows:
+                return total
+            conn.executemany(
+                'UPDATE emails SET preview = ? WHERE id = ?',
+                [(make_email_preview(row['body'], row['content_type']), row['id']) for row in rows]
+            )
+            total += len(rows)
+
     def create_mailbox(self, address: str, retention_days: int = 7,
                       sender_whitelist: List[str] = None,
                       created_by_ip: str = None,
@@ -298,17 +264,19 @@ class DatabaseManager:
         # 如果设置了白名单，自动启用白名单功能
         whitelist_enabled = len(sender_whitelist) > 0
 
-        with self.get_connection() as conn:
-            conn.execute('''
-                INSERT INTO mailboxes
-                (id, address, created_at, expires_at, retention_days,
-                 sender_whitelist, whitelist_enabled, created_by_ip, access_token, mailbox_key, last_accessed, created_source)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                mailbox_id, address, current_time, expires_at, retention_days,
-                json.dumps(sender_whitelist), whitelist_enabled, created_by_ip, access_token, mailbox_key, current_time, created_source
-            ))
-            conn.commit()
+        self.write(lambda conn: conn.execute('''
+            INSERT INTO mailboxes
+            (id, address, created_at, expires_at, retention_days,
+             sender_whitelist, whitelist_enabled, created_by_ip, access_token, mailbox_key, last_accessed, created_source,
+             access_token_hash, mailbox_key_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            mailbox_id, address, current_time, expires_at, retention_days,
+            json.dumps(sender_whitelist), whitelist_enabled, created_by_ip, access_token, mailbox_key, current_time, created_source,
+            token_digest(access_token), token_digest(mailbox_key)
+        )))
+
+        self.invalidate_mailbox_cache(address=address)
 
         return {
             'id': mailbox_id,
@@ -347,9 +315,26 @@ class DatabaseManager:
                     'access_token': row['access_token'],
                     'is_active': bool(row['is_active']),
                     'created_by_ip': row['created_by_ip'],
-                    'last_accessed': row['last_accessed']
+                    'last_accessed': row['last_accessed'],
+                    'storage_used': row['storage_used'] or 0,
+                    'storage_limit': row['storage_limit'] or config.MAX_MAILBOX_SIZE_BYTES
                 }
             return None
+
+    def get_mailbox_by_address_cached(self, address: str) -> Optional[Dict]:
+        """根据地址获取邮箱信息（优先读取缓存）"""
+        mailbox = self.mailbox_cache.get(address)
+        if mailbox is MISS:
+            mailbox = self.get_mailbox_by_address(address)
+            self.mailbox_cache.put(address, mailbox)
+        return mailbox
+
+    def invalidate_mailbox_cache(self, address: str = None, mailbox_id: str = None):
+        """邮箱数据变更后使缓存失效，不指定参数时清空全部缓存"""
+        if address is None and mailbox_id is None:
+            self.mailbox_cache.clear()
+        else:
+            self.mailbox_cache.invalidate(address=address, mailbox_id=mailbox_id)
     
     def get_mailbox_by_token(self, access_token: str) -> Optional[Dict]:
         """根据访问令牌获取邮箱信息"""
@@ -358,8 +343,8 @@ class DatabaseManager:
                 SELECT id, address, created_at, expires_at, retention_days, is_active,
                        sender_whitelist, whitelist_enabled, created_by_ip, access_token,
                        mailbox_key, last_accessed, storage_used, storage_limit
-                FROM mailboxes WHERE access_token = ? AND is_active = 1
-            ''', (access_token,))
+                FROM mailboxes WHERE access_token_hash = ? AND is_active = 1
+            ''', (token_digest(access_token),))
             row = cursor.fetchone()
             
             if row:
@@ -378,14 +363,32 @@ class DatabaseManager:
                 }
             return None
     
+    def verify_mailbox_key(self, address: str, mailbox_key: str) -> bool:
+        """校验邮箱密钥（按摘要比较）"""
+        if not mailbox_key:
+            return False
+        with self.get_connection() as conn:
+            row = conn.execute('''
+                SELECT 1 FROM mailboxes WHERE address = ? AND mailbox_key_hash = ? AND is_active = 1
+            ''', (address, token_digest(mailbox_key))).fetchone()
+            return row is not None
+
+    def reset_access_token(self, mailbox_id: str) -> str:
+        """重新生成邮箱访问令牌，返回新令牌"""
+        new_token = str(uuid.uuid4())
+        self.write(lambda conn: conn.execute('''
+            UPDATE mailboxes SET access_token = ?, access_token_hash = ? WHERE id = ?
+        ''', (new_token, token_digest(new_token), mailbox_id)))
+        self.invalidate_mailbox_cache(mailbox_id=mailbox_id)
+        return new_token
+
     def update_mailbox_access(self, mailbox_id: str):
         """更新邮箱最后访问时间"""
         current_time = int(time.time())
-        with self.get_connection() as conn:
-            conn.execute('''
-                UPDATE mailboxes SET last_accessed = ? WHERE id = ?
-            ''', (current_time, mailbox_id))
-            conn.commit()
+        # 访问时间无需等待提交，随下一批写操作一起落盘
+        self.submit_write(lambda conn: conn.execute('''
+            UPDATE mailboxes SET last_accessed = ? WHERE id = ?
+        ''', (current_time, mailbox_id)))
 
     def get_mailbox_by_id(self, mailbox_id: str) -> Optional[Dict]:
         """根据ID获取邮箱信息"""
@@ -416,6 +419,23 @@ class DatabaseManager:
                 }
             return None
 
+    def get_mailbox_versions(self, addresses: List[str]) -> Dict[str, Tuple]:
+        """
+        批量获取邮箱的 (邮件序号, 邮件数)，用于判断邮箱是否有变化：
+        邮件序号在每次插入邮件时加一，即使同时删除旧邮件（达到数量上限）也会变化
+        """
+        conn = self.get_connection()
+        versions = {}
+        # 分批查询，避免超出SQLite参数个数限制
+        for i in range(0, len(addresses), 500):
+            chunk = addresses[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for row in conn.execute(
+                f'SELECT address, email_seq, email_count FROM mailboxes WHERE address IN ({placeholders})', chunk
+            ):
+                versions[row['address']] = (row['email_seq'] or 0, row['email_count'] or 0)
+        return versions
+
     def is_mailbox_expired(self, mailbox: Dict) -> bool:
         """检查邮箱是否过期"""
         current_time = int(time.time())
@@ -445,48 +465,236 @@ class DatabaseManager:
 
     def add_email(self, mailbox_id: str, email_data: Dict) -> str:
         """添加邮件到邮箱"""
-        email_id = email_data.get('id', str(uuid.uuid4()))
+        results = self.add_email_to_mailboxes([(mailbox_id, email_data['To'])], email_data)
+        email_id, error = results[mailbox_id]
+        if error:
+            raise ValueError(error)
+        return email_id
+
+    def add_email_to_mailboxes(self, deliveries: List[Tuple[str, str]], email_data: Dict,
+                               spool_id: str = None) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """
+        将同一封邮件投递到多个邮箱
+        deliveries: [(mailbox_id, 收件地址), ...]
+        正文只写入一份，各邮箱的邮件记录引用同一正文，全部在一个事务中完成；
+        正文和附件与已有邮件完全相同时（按内容指纹）直接引用已有正文，不再写入
+        spool_id 为落盘队列记录ID：已按该ID投递过的邮箱直接返回已有邮件，重放时不会重复入库
+        返回: {mailbox_id: (邮件ID, 错误信息)}，成功时错误信息为None
+        """
+        results = {}
+        body = email_data.get('Body', '')
+        body_size = len(body.encode('utf-8'))
+        preview = make_email_preview(body, email_data.get('ContentType', 'Text'))
+        # 在调用线程中计算指纹、压缩正文和附件摘要，写线程只负责写入
+        parts = self._prepare_parts(email_data.get('Attachments'))
+        fingerprint = self._content_fingerprint(body, parts)
+        encoded = None if self._find_shared_body(fingerprint) else self._encode_body(body)
+        current_time = int(time.time())
+
+        def _deliver(conn):
+            # 在写事务中再次按指纹查找，已存在时复用（读到的结果可能已过期）
+            shared = conn.execute('''
+                SELECT id, COALESCE(stored_bytes, size_bytes) AS stored_bytes
+                FROM email_bodies WHERE fingerprint = ?
+            ''', (fingerprint,)).fetchone()
+            if shared:
+                stored_bytes = shared['stored_bytes']
+            else:
+                stored = encoded if encoded is not None else self._encode_body(body)
+                stored_bytes = stored[3]
+
+            # 一次查询所有目标邮箱的容量
+            mailbox_ids = [mailbox_id for mailbox_id, _ in deliveries]
+            placeholders = ','.join('?' * len(mailbox_ids))
+            cursor = conn.execute(f'''
+                SELECT id, storage_used, storage_limit, email_count FROM mailboxes WHERE id IN ({placeholders})
+            ''', mailbox_ids)
+            storage = {row['id']: row for row in cursor.fetchall()}
+
+            if spool_id:
+                # 崩溃重放：已投递过的邮箱视为成功
+                for row in conn.execute(f'''
+                    SELECT id, mailbox_id FROM emails WHERE spool_id = ? AND mailbox_id IN ({placeholders})
+                ''', [spool_id] + mailbox_ids):
+                    results[row['mailbox_id']] = (row['id'], None)
+
+            accepted = []
+            for mailbox_id, to_address in deliveries:
+                if mailbox_id in results:
+                    continue
+
+                entry = dict(email_data, To=to_address)
+
+                # 计算邮件大小（字节）
+                email_size = self._calculate_email_size(entry)
+
+                # 检查单封邮件大小限制
+                if email_size > config.MAX_EMAIL_SIZE_BYTES:
+                    results[mailbox_id] = (None, f"邮件大小 ({email_size / 1024 / 1024:.2f}MB) 超过限制 ({config.MAX_EMAIL_SIZE_MB}MB)")
+                    continue
 
-        # 计算邮件大小（字节）
-        email_size = self._calculate_email_size(email_data)
+                # 邮箱容量按正文压缩后的实际存储大小计算
+                email_size = email_size - body_size + stored_bytes
 
-        # 检查单封邮件大小限制
-        if email_size > config.MAX_EMAIL_SIZE_BYTES:
-            raise ValueError(f"邮件大小 ({email_size / 1024 / 1024:.2f}MB) 超过限制 ({config.MAX_EMAIL_SIZE_MB}MB)")
+                # 检查邮箱容量
+                row = storage.get(mailbox_id)
+                if row:
+                    storage_used = row['storage_used'] or 0
+                    storage_limit = row['storage_limit'] or config.MAX_MAILBOX_SIZE_BYTES
 
-        # 检查邮箱容量
-        mailbox = self.get_mailbox_by_id(mailbox_id)
-        if mailbox:
-            storage_used = mailbox.get('storage_used', 0)
-            storage_limit = mailbox.get('storage_limit', config.MAX_MAILBOX_SIZE_BYTES)
+                    if storage_used + email_size > storage_limit:
+                        results[mailbox_id] = (None, f"邮箱容量不足，当前已用 {storage_used / 1024 / 1024:.2f}MB，限制 {storage_limit / 1024 / 1024:.2f}MB")
+                        continue
 
-            if storage_used + email_size > storage_limit:
-                raise ValueError(f"邮箱容量不足，当前已用 {storage_used / 1024 / 1024:.2f}MB，限制 {storage_limit / 1024 / 1024:.2f}MB")
+                # 单收件人时沿用解析器生成的ID，多收件人时每份单独生成
+                email_id = email_data.get('id') if len(deliveries) == 1 and email_data.get('id') else str(uuid.uuid4())
+                accepted.append((mailbox_id, email_id, entry, email_size))
+                results[mailbox_id] = (email_id, None)
 
+            if not accepted:
+                return accepted
+
+            if shared:
+                body_id = shared['id']
+            else:
+                body_id = self._insert_body(conn, fingerprint, stored, body_size, parts, current_time)
+
+            for mailbox_id, email_id, entry, email_size in accepted:
+                # 插入邮件（正文和附件通过body_id引用）
+                conn.execute('''
+                    INSERT OR IGNORE INTO emails
+                    (id, mailbox_id, from_address, to_address, subject, preview, body_id,
+                     content_type, timestamp, sent_formatted, size_bytes, part_count, spool_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    email_id, mailbox_id, entry['From'], entry['To'],
+                    entry.get('Subject', ''), preview, body_id,
+                    entry.get('ContentType', 'Text'), entry['Timestamp'],
+                    entry.get('Sent', ''), email_size, len(parts), spool_id
+                ))
+                # 邮箱计数和已用容量由触发器更新
+
+            # 超出每个邮箱邮件数上限时，在同一事务中删除最旧的邮件
+            keep = config.MAX_EMAILS_PER_ADDRESS
+            if keep > 0:
+                for mailbox_id, _, _, _ in accepted:
+                    row = storage.get(mailbox_id)
+                    if row is None or (row['email_count'] or 0) + 1 > keep:
+                        self._trim_mailbox_emails(conn, mailbox_id, keep)
+
+            return accepted
+
+        # 容量检查和写入在写线程的同一事务中完成
+        accepted = self.write(_deliver)
+
+        for mailbox_id, _, _, _ in accepted:
+            self.invalidate_mailbox_cache(mailbox_id=mailbox_id)
+        return results
+
+    def _content_fingerprint(self, body: str, parts: List[Tuple]) -> str:
+        """邮件内容指纹：正文和各附件（文件名、类型、内容摘要）的 SHA-256"""
+        digest = hashlib.sha256(body.encode('utf-8'))
+        for index, filename, content_type, content_id, disposition, size, sha256, _ in parts:
+            digest.update(b'\0')
+            digest.update(json.dumps([filename, content_type, content_id, disposition, sha256]).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _find_shared_body(self, fingerprint: str) -> Optional[str]:
+        """按内容指纹查找已存储的正文ID"""
         with self.get_connection() as conn:
-            # 插入邮件
+            row = conn.execute('SELECT id FROM email_bodies WHERE fingerprint = ?', (fingerprint,)).fetchone()
+            return row['id'] if row else None
+
+    def _insert_body(self, conn: sqlite3.Connection, fingerprint: str, stored: Tuple,
+                     body_size: int, parts: List[Tuple], current_time: int) -> str:
+        """写入新的共享正文及其附件，返回正文ID（引用计数由插入邮件时的触发器维护）"""
+        codec, stored_text, stored_data, stored_bytes = stored
+        body_id = str(uuid.uuid4())
+        conn.execute('''
+            INSERT INTO email_bodies
+            (id, body, data, codec, size_bytes, stored_bytes, fingerprint, ref_count, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)
+        ''', (body_id, stored_text, stored_data, codec, body_size, stored_bytes, fingerprint, current_time))
+
+        # 写入附件：相同内容只保存一份，引用计数由触发器维护
+        for index, filename, content_type, content_id, disposition, size, digest, data in parts:
             conn.execute('''
-                INSERT INTO emails
-                (id, mailbox_id, from_address, to_address, subject, body,
-                 content_type, timestamp, sent_formatted, size_bytes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                email_id, mailbox_id, email_data['From'], email_data['To'],
-                email_data.get('Subject', ''), email_data.get('Body', ''),
-                email_data.get('ContentType', 'Text'), email_data['Timestamp'],
-                email_data.get('Sent', ''), email_size
-            ))
-
-            # 更新邮箱已用容量
+                INSERT OR IGNORE INTO blobs (sha256, data, size_bytes, ref_count, created_at)
+                VALUES (?, ?, ?, 0, ?)
+            ''', (digest, data, size, current_time))
             conn.execute('''
-                UPDATE mailboxes
-                SET storage_used = storage_used + ?
-                WHERE id = ?
-            ''', (email_size, mailbox_id))
+                INSERT INTO email_parts
+                (body_id, part_index, filename, content_type, content_id, disposition, size_bytes, sha256)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (body_id, index, filename, content_type, content_id, disposition, size, digest))
+        return body_id
+
+    def get_dedup_stats(self) -> Dict:
+        """
+        正文和附件的去重统计
+        logical_bytes 为不去重时需要存储的字节数（每个引用各存一份），physical_bytes 为实际存储的字节数
+        """
+        with self.get_connection() as conn:
+            bodies = conn.execute('''
+                SELECT COUNT(*) AS rows_count,
+                       COALESCE(SUM(ref_count), 0) AS refs,
+                       COALESCE(SUM(COALESCE(stored_bytes, size_bytes)), 0) AS physical,
+                       COALESCE(SUM(ref_count * COALESCE(stored_bytes, size_bytes)), 0) AS logical
+                FROM email_bodies
+            ''').fetchone()
+            blobs = conn.execute('''
+                SELECT COUNT(*) AS rows_count,
+                       COALESCE(SUM(size_bytes), 0) AS physical
+                FROM blobs
+            ''').fetchone()
+            parts = conn.execute('''
+                SELECT COALESCE(SUM(b.ref_count), 0) AS refs,
+                       COALESCE(SUM(b.ref_count * p.size_bytes), 0) AS logical
+                FROM email_parts p
+                JOIN email_bodies b ON b.id = p.body_id
+            ''').fetchone()
+
+        def _summary(rows_count, refs, physical, logical):
+            return {
+                'rows': rows_count,
+                'references': refs,
+                'physical_bytes': physical,
+                'logical_bytes': logical,
+                'saved_bytes': logical - physical,
+                'dedupe_ratio': round(logical / physical, 4) if physical else 1.0
+            }
 
-            conn.commit()
+        return {
+            'bodies': _summary(bodies['rows_count'], bodies['refs'], bodies['physical'], bodies['logical']),
+            'attachments': _summary(blobs['rows_count'], parts['refs'], blobs['physical'], parts['logical'])
+        }
 
-        return email_id
+    def _trim_mailbox_emails(self, conn: sqlite3.Connection, mailbox_id: str, keep: int) -> int:
+        """
+        只保留邮箱中最新的 keep 封邮件，返回删除的数量
+        一条语句按 (mailbox_id, timestamp, id) 索引跳过最新的邮件并删除其余邮件，
+        邮箱计数、已用容量和正文引用计数由触发器在同一事务中更新
+        """
+        cursor = conn.execute('''
+            DELETE FROM emails
+            WHERE id IN (
+                SELECT id FROM emails
+                WHERE mailbox_id = ?
+                ORDER BY timestamp DESC, id DESC
+                LIMIT -1 OFFSET ?
+            )
+        ''', (mailbox_id, keep))
+        return cursor.rowcount
+
+    def trim_mailbox_emails(self, mailbox_id: str, keep: int = None) -> int:
+        """按邮件数上限裁剪邮箱，返回删除的数量"""
+        keep = config.MAX_EMAILS_PER_ADDRESS if keep is None else keep
+        if keep <= 0:
+            return 0
+        deleted = self.write(self._trim_mailbox_emails, mailbox_id, keep)
+        if deleted:
+            self.invalidate_mailbox_cache(mailbox_id=mailbox_id)
+        return deleted
 
     def _calculate_email_size(self, email_data: Dict) -> int:
         """计算邮件大小（字节）"""
@@ -499,14 +707,33 @@ class DatabaseManager:
         size += len(email_data.get('Body', '').encode('utf-8'))
         size += len(email_data.get('Sent', '').encode('utf-8'))
 
+        # 附件按原始大小计算（只有元数据没有内容的附件不计入）
+        size += sum(len(item['Data']) for item in email_data.get('Attachments') or [] if item.get('Data'))
+
         return size
 
-    def get_emails_by_mailbox(self, mailbox_id: str, limit: int = None) -> List[Dict]:
-        """获取邮箱的所有邮件"""
-        query = '''
-            SELECT * FROM emails
-            WHERE mailbox_id = ?
-            ORDER BY timestamp DESC
+    def _prepare_parts(self, attachments: Optional[List[Dict]]) -> List[Tuple]:
+        """计算附件的 SHA-256，返回写入 email_parts 所需的行（没有内容的附件跳过）"""
+        parts = []
+        for item in attachments or []:
+            data = item.get('Data')
+            if not data:
+                continue
+            parts.append((
+                len(parts), item.get('Filename', ''), item.get('ContentType', 'application/octet-stream'),
+                item.get('ContentId', ''), item.get('Disposition', ''), len(data),
+                hashlib.sha256(data).hexdigest(), data
+            ))
+        return parts
+
+    def get_emails_by_mailbox(self, mailbox_id: str, limit: int = None,
+                              include_body: bool = False) -> List[Dict]:
+        """获取邮箱的所有邮件（默认只读元数据，include_body 为True时批量读取正文）"""
+        query = f'''
+            SELECT {EMAIL_META_COLUMNS}
+            FROM emails e
+            WHERE e.mailbox_id = ?
+            ORDER BY e.timestamp DESC
         '''
         params = [mailbox_id]
 
@@ -515,52 +742,240 @@ class DatabaseManager:
             params.append(limit)
 
         with self.get_connection() as conn:
-            cursor = conn.execute(query, params)
-            rows = cursor.fetchall()
+            rows = conn.execute(query, params).fetchall()
+            bodies = self._load_bodies(conn, rows) if include_body else None
+            parts = self._load_parts(conn, rows)
+
+        return [self._format_email_row(row, bodies, parts) for row in rows]
+
+    def get_emails_page(self, mailbox_id: str, limit: int, after: Optional[Tuple] = None,
+                        include_body: bool = False) -> Tuple[List[Dict], Optional[Tuple]]:
+        """
+        按 (timestamp, id) 倒序分页获取邮件
+        after 为上一页最后一封邮件的 (timestamp, id)，返回 (邮件列表, 下一页的起始键)
+        """
+        query = f'''
+            SELECT {EMAIL_META_COLUMNS}
+            FROM emails e
+            WHERE e.mailbox_id = ?
+        '''
+        params = [mailbox_id]
 
-            emails = []
-            for row in rows:
-                emails.append({
-                    'id': row['id'],
-                    'From': row['from_address'],
-                    'To': row['to_address'],
-                    'Subject': row['subject'],
-                    'Body': row['body'],
-                    'ContentType': row['content_type'],
-                    'Timestamp': row['timestamp'],
-                    'Sent': row['sent_formatted'],
-                    'is_read': bool(row['is_read'])
-                })
+        if after is not None:
+            query += ' AND (e.timestamp, e.id) < (?, ?)'
+            params.extend(after)
 
-            return emails
+        # 多取一行用于判断是否还有下一页
+        query += ' ORDER BY e.timestamp DESC, e.id DESC LIMIT ?'
+        params.append(limit + 1)
 
-    def get_email_by_id(self, email_id: str) -> Optional[Dict]:
-        """根据ID获取邮件"""
         with self.get_connection() as conn:
-            cursor = conn.execute('''
-                SELECT * FROM emails WHERE id = ?
-            ''', (email_id,))
-            row = cursor.fetchone()
+            rows = conn.execute(query, params).fetchall()
+            page = rows[:limit]
+            bodies = self._load_bodies(conn, page) if include_body else None
+            parts = self._load_parts(conn, page)
+
+        emails = [self._format_email_row(row, bodies, parts) for row in page]
+        next_key = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_key = (last['timestamp'], last['id'])
+        return emails, next_key
+
+    def _load_bodies(self, conn: sqlite3.Connection, rows: List[sqlite3.Row]) -> Dict[str, str]:
+        """按 body_id 批量读取正文，返回 {body_id: 正文}"""
+        body_ids = list({row['body_id'] for row in rows if row['body_id']})
+        bodies = {}
+        # 分批查询，避免超出SQLite参数个数限制
+        for i in range(0, len(body_ids), 500):
+            chunk = body_ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for body_row in conn.execute(
+                f'SELECT id, body, data, codec FROM email_bodies WHERE id IN ({placeholders})', chunk
+            ):
+                bodies[body_row['id']] = decode_body(body_row['codec'], body_row['body'], body_row['data'])
+        return bodies
+
+    def _load_parts(self, conn: sqlite3.Connection, rows: List[sqlite3.Row]) -> Dict[str, List[Dict]]:
+        """按 body_id 批量读取附件元数据（不读取内容），返回 {body_id: [附件, ...]}"""
+        body_ids = list({row['body_id'] for row in rows if row['body_id'] and row['part_count']})
+        parts = {}
+        for i in range(0, len(body_ids), 500):
+            chunk = body_ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for part_row in conn.execute(f'''
+                SELECT id, body_id, filename, content_type, content_id, disposition, size_bytes
+                FROM email_parts WHERE body_id IN ({placeholders})
+                ORDER BY body_id, part_index
+            ''', chunk):
+                parts.setdefault(part_row['body_id'], []).append(self._format_part_row(part_row))
+        return parts
+
+    def _format_part_row(self, row: sqlite3.Row) -> Dict:
+        """把附件行转换为接口返回的格式"""
+        return {
+            'id': row['id'],
+            'Filename': row['filename'] or '',
+            'ContentType': row['content_type'],
+            'ContentId': row['content_id'] or '',
+            'Disposition': row['disposition'] or '',
+            'Size': row['size_bytes']
+        }
 
-            if row:
-                return {
-                    'id': row['id'],
-                    'mailbox_id': row['mailbox_id'],
-                    'From': row['from_address'],
-                    'To': row['to_address'],
-                    'Subject': row['subject'],
-                    'Body': row['body'],
-                    'ContentType': row['content_type'],
-                    'Timestamp': row['timestamp'],
-                    'Sent': row['sent_formatted'],
-                    'is_read': bool(row['is_read'])
-                }
+    def get_email_part(self, email_id: str, part_id: int) -> Optional[Dict]:
+        """获取邮件的一个附件的元数据和内容摘要，附件不属于该邮件时返回None"""
+        with self.get_connection() as conn:
+            row = conn.execute('''
+                SELECT p.id, p.filename, p.content_type, p.content_id, p.disposition,
+                       p.size_bytes, p.sha256, e.mailbox_id
+                FROM emails e
+                JOIN email_parts p ON p.body_id = e.body_id
+                WHERE e.id = ? AND p.id = ?
+            ''', (email_id, part_id)).fetchone()
+
+        if not row:
             return None
+        part = self._format_part_row(row)
+        part['sha256'] = row['sha256']
+        part['mailbox_id'] = row['mailbox_id']
+        return part
+
+    def iter_blob(self, sha256: str, chunk_size: int = 64 * 1024):
+        """
+        分块读取附件内容（生成器），用于流式响应
+        使用独立连接和增量BLOB读取，内容不会一次载入内存
+        """
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            self._configure_connection(conn)
+            row = conn.execute('SELECT rowid FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()
+            if not row:
+                return
+            with conn.blobopen('blobs', 'data', row[0], readonly=True) as blob:
+                while True:
+                    chunk = blob.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            conn.close()
+
+    def _encode_body(self, body: str, codec: str = None):
+        """按配置压缩正文，返回 (编码名, 明文, 压缩数据, 存储字节数)"""
+        return encode_body(
+            body,
+            codec or getattr(config, 'BODY_CODEC', 'zlib'),
+            level=getattr(config, 'BODY_COMPRESSION_LEVEL', 6),
+            min_bytes=getattr(config, 'BODY_COMPRESS_MIN_BYTES', 256)
+        )
+
+    def _recompress_batch(self, conn: sqlite3.Connection, codec: str, after_id: str, limit: int) -> Dict:
+        """
+        按目标编码重写一批正文（按 id 顺序），返回处理数量、节省字节数和本批最后的 id
+        引用该正文的邮件的 size_bytes 同步调整，邮箱已用容量由触发器更新
+        """
+        rows = conn.execute('''
+            SELECT id, body, data, codec, stored_bytes FROM email_bodies
+            WHERE id > ? AND COALESCE(codec, 'raw') != ?
+            ORDER BY id
+            LIMIT ?
+        ''', (after_id, codec, limit)).fetchall()
+
+        saved = 0
+        for row in rows:
+            text = decode_body(row['codec'], row['body'], row['data'])
+            old_stored = row['stored_bytes'] if row['stored_bytes'] is not None else len(text.encode('utf-8'))
+            new_codec, new_text, new_data, new_stored = self._encode_body(text, codec)
+
+            conn.execute('''
+                UPDATE email_bodies SET codec = ?, body = ?, data = ?, stored_bytes = ? WHERE id = ?
+            ''', (new_codec, new_text, new_data, new_stored, row['id']))
+
+            delta = new_stored - old_stored
+            if delta:
+                conn.execute('''
+                    UPDATE emails SET size_bytes = MAX(0, size_bytes + ?) WHERE body_id = ?
+                ''', (delta, row['id']))
+            saved -= delta
+
+        return {
+            'processed': len(rows),
+            'saved_bytes': saved,
+            'last_id': rows[-1]['id'] if rows else None
+        }
+
+    def recompress_bodies(self, codec: str = None, batch_size: int = 500, pause: float = 0.02) -> Dict:
+        """
+        把已有正文重新编码为目标编码（默认 BODY_CODEC），分批在写线程中执行，
+        批次之间暂停让出写线程，可在服务运行时执行
+        """
+        codec = codec or getattr(config, 'BODY_CODEC', 'zlib')
+        started = time.time()
+        processed = 0
+        saved = 0
+        after_id = ''
+
+        while True:
+            result = self.write(self._recompress_batch, codec, after_id, batch_size)
+            processed += result['processed']
+            saved += result['saved_bytes']
+            if result['last_id'] is None:
+                break
+            after_id = result['last_id']
+            if pause:
+                time.sleep(pause)
+
+        if processed:
+            self.invalidate_mailbox_cache()
+        return {
+            'codec': codec,
+            'processed': processed,
+            'saved_bytes': saved,
+            'duration': round(time.time() - started, 3)
+        }
+
+    def _format_email_row(self, row: sqlite3.Row, bodies: Dict[str, str] = None,
+                          parts: Dict[str, List[Dict]] = None) -> Dict:
+        """把邮件行转换为接口返回的格式，bodies 为None时不返回正文，parts 为附件元数据"""
+        email = {
+            'id': row['id'],
+            'From': row['from_address'],
+            'To': row['to_address'],
+            'Subject': row['subject'],
+            'Preview': row['preview'] or '',
+            'ContentType': row['content_type'],
+            'Timestamp': row['timestamp'],
+            'Sent': row['sent_formatted'],
+            'is_read': bool(row['is_read'])
+        }
+        if bodies is not None:
+            email['Body'] = bodies.get(row['body_id'], '')
+        if parts is not None:
+            email['Attachments'] = parts.get(row['body_id'], [])
+        return email
+
+    def get_email_by_id(self, email_id: str, include_body: bool = True) -> Optional[Dict]:
+        """根据ID获取邮件，正文按需从 email_bodies 读取"""
+        with self.get_connection() as conn:
+            row = conn.execute(f'''
+                SELECT {EMAIL_META_COLUMNS}
+                FROM emails e
+                WHERE e.id = ?
+            ''', (email_id,)).fetchone()
+
+            if not row:
+                return None
+
+            bodies = self._load_bodies(conn, [row]) if include_body else None
+            email = self._format_email_row(row, bodies, self._load_parts(conn, [row]))
+            email['mailbox_id'] = row['mailbox_id']
+            return email
 
     def clean_expired_mailboxes(self):
         """清理过期的邮箱"""
         current_time = int(time.time())
-        with self.get_connection() as conn:
+
+        def _clean(conn):
             # 删除过期邮箱的邮件
             conn.execute('''
                 DELETE FROM emails
@@ -573,11 +988,13 @@ class DatabaseManager:
             cursor = conn.execute('''
                 DELETE FROM mailboxes WHERE expires_at < ?
             ''', (current_time,))
+            return cursor.rowcount
 
-            deleted_count = cursor.rowcount
-            conn.commit()
+        deleted_count = self.write(_clean)
 
-            return deleted_count
+        if deleted_count:
+            self.invalidate_mailbox_cache()
+        return deleted_count
 
     def clean_old_emails(self, retention_days: int = None):
         """清理旧邮件"""
@@ -586,49 +1003,123 @@ class DatabaseManager:
 
         cutoff_time = int(time.time()) - (retention_days * 24 * 60 * 60)
 
-        with self.get_connection() as conn:
+        return self.write(lambda conn: conn.execute('''
+            DELETE FROM emails WHERE timestamp < ?
+        ''', (cutoff_time,)).rowcount)
+
+    def reap_expired_mailboxes(self, current_time: int, limit: int = 500) -> Tuple[int, int]:
+        """
+        分批清理过期邮箱：先删除过期邮箱中的邮件（每批最多limit封），
+        邮件删完后再删除邮箱本身
+        返回: (删除的邮箱数, 删除的邮件数)
+        """
+        def _reap(conn):
             cursor = conn.execute('''
-                DELETE FROM emails WHERE timestamp < ?
-            ''', (cutoff_time,))
+                DELETE FROM emails WHERE id IN (
+                    SELECT e.id FROM mailboxes m
+                    JOIN emails e ON e.mailbox_id = m.id
+                    WHERE m.expires_at < ?
+                    LIMIT ?
+                )
+            ''', (current_time, limit))
+            emails_deleted = cursor.rowcount
+            if emails_deleted >= limit:
+                return 0, emails_deleted
 
-            deleted_count = cursor.rowcount
-            conn.commit()
+            cursor = conn.execute('''
+                DELETE FROM mailboxes WHERE id IN (
+                    SELECT m.id FROM mailboxes m
+                    WHERE m.expires_at < ?
+                    AND NOT EXISTS (SELECT 1 FROM emails e WHERE e.mailbox_id = m.id)
+                    LIMIT ?
+                )
+            ''', (current_time, limit))
+            return cursor.rowcount, emails_deleted
+
+        mailboxes_deleted, emails_deleted = self.write(_reap)
+        if mailboxes_deleted:
+            self.invalidate_mailbox_cache()
+        return mailboxes_deleted, emails_deleted
+
+    def reap_old_emails(self, cutoff_time: int, limit: int = 500) -> int:
+        """分批删除早于cutoff_time的邮件（每批最多limit封），返回删除的数量"""
+        def _reap(conn):
+            rows = conn.execute('''
+                SELECT id, mailbox_id FROM emails
+                WHERE timestamp < ?
+                ORDER BY timestamp
+                LIMIT ?
+            ''', (cutoff_time, limit)).fetchall()
+            if not rows:
+                return {}
 
-            return deleted_count
+            # 邮箱计数和已用容量由触发器扣减
+            conn.executemany('DELETE FROM emails WHERE id = ?', [(row['id'],) for row in rows])
+            return {'deleted': len(rows), 'mailbox_ids': list({row['mailbox_id'] for row in rows})}
+
+        result = self.write(_reap)
+        for mailbox_id in result.get('mailbox_ids', []):
+            self.invalidate_mailbox_cache(mailbox_id=mailbox_id)
+        return result.get('deleted', 0)
 
     def get_mailbox_stats(self, mailbox_id: str) -> Dict:
-        """获取邮箱统计信息"""
+        """获取邮箱统计信息（读取触发器维护的计数字段）"""
         with self.get_connection() as conn:
-            # 获取邮件统计
-            cursor = conn.execute('''
-                SELECT
-                    COUNT(*) as total_emails,
-                    COUNT(CASE WHEN is_read = 0 THEN 1 END) as unread_emails,
-                    MAX(timestamp) as last_email_time,
-                    COALESCE(SUM(size_bytes), 0) as total_size
-                FROM emails
-                WHERE mailbox_id = ?
-            ''', (mailbox_id,))
-            email_stats = cursor.fetchone()
-
-            # 获取邮箱容量信息
-            cursor = conn.execute('''
-                SELECT storage_used, storage_limit
+            row = conn.execute('''
+                SELECT email_count, unread_count, last_email_time, storage_used, storage_limit
                 FROM mailboxes
                 WHERE id = ?
-            ''', (mailbox_id,))
-            storage_stats = cursor.fetchone()
+            ''', (mailbox_id,)).fetchone()
+            return self._format_mailbox_stats(row)
 
-            return {
-                'total_emails': email_stats['total_emails'],
-                'unread_emails': email_stats['unread_emails'],
-                'last_email_time': email_stats['last_email_time'],
-                'storage_used': storage_stats['storage_used'] if storage_stats else 0,
-                'storage_limit': storage_stats['storage_limit'] if storage_stats else config.MAX_MAILBOX_SIZE_BYTES,
-                'storage_used_mb': (storage_stats['storage_used'] if storage_stats else 0) / 1024 / 1024,
-                'storage_limit_mb': (storage_stats['storage_limit'] if storage_stats else config.MAX_MAILBOX_SIZE_BYTES) / 1024 / 1024,
-                'storage_percent': (storage_stats['storage_used'] / storage_stats['storage_limit'] * 100) if (storage_stats and storage_stats['storage_limit'] > 0) else 0
-            }
+    def _format_mailbox_stats(self, row) -> Dict:
+        """根据邮箱行中的计数字段生成统计信息"""
+        storage_used = (row['storage_used'] or 0) if row else 0
+        storage_limit = row['storage_limit'] if row and row['storage_limit'] is not None else config.MAX_MAILBOX_SIZE_BYTES
+        return {
+            'total_emails': (row['email_count'] or 0) if row else 0,
+            'unread_emails': (row['unread_count'] or 0) if row else 0,
+            'last_email_time': row['last_email_time'] if row else None,
+            'storage_used': storage_used,
+            'storage_limit': storage_limit,
+            'storage_used_mb': storage_used / 1024 / 1024,
+            'storage_limit_mb': storage_limit / 1024 / 1024,
+            'storage_percent': (storage_used / storage_limit * 100) if storage_limit > 0 else 0
+        }
+
+    def _reconcile_counters(self, conn: sqlite3.Connection) -> int:
+        """按邮件表重新计算所有邮箱的计数字段，返回修正的邮箱数"""
+        rows = conn.execute('''
+            SELECT m.id, m.email_count, m.unread_count, m.last_email_time, m.storage_used,
+                   COUNT(e.id) AS actual_count,
+                   COALESCE(SUM(e.is_read = 0), 0) AS actual_unread,
+                   MAX(e.timestamp) AS actual_last,
+                   COALESCE(SUM(e.size_bytes), 0) AS actual_storage
+            FROM mailboxes m
+            LEFT JOIN emails e ON e.mailbox_id = m.id
+            GROUP BY m.id
+        ''').fetchall()
+
+        drifted = [
+            (row['actual_count'], row['actual_unread'], row['actual_last'], row['actual_storage'], row['id'])
+            for row in rows
+            if (row['email_count'], row['unread_count'], row['last_email_time'], row['storage_used'])
+            != (row['actual_count'], row['actual_unread'], row['actual_last'], row['actual_storage'])
+        ]
+        conn.executemany('''
+            UPDATE mailboxes
+            SET email_count = ?, unread_count = ?, last_email_time = ?, storage_used = ?
+            WHERE id = ?
+        ''', drifted)
+        return len(drifted)
+
+    def reconcile_mailbox_counters(self) -> Dict:
+        """离线校正邮箱计数字段（触发器维护的计数与邮件表不一致时使用）"""
+        started = time.time()
+        fixed = self.write(self._reconcile_counters)
+        if fixed:
+            self.invalidate_mailbox_cache()
+        return {'fixed_mailboxes': fixed, 'duration': round(time.time() - started, 3)}
 
     def migrate_from_json(self, json_file_path: str) -> Dict:
         """从JSON文件迁移数据到数据库"""
@@ -680,13 +1171,12 @@ class DatabaseManager:
                 )
 
                 # 更新创建时间和过期时间
-                with self.get_connection() as conn:
-                    conn.execute('''
-                        UPDATE mailboxes
-                        SET created_at = ?, expires_at = ?
-                        WHERE id = ?
-                    ''', (mailbox_info['created_at'], mailbox_info['expires_at'], mailbox['id']))
-                    conn.commit()
+                self.write(lambda conn: conn.execute('''
+                    UPDATE mailboxes
+                    SET created_at = ?, expires_at = ?
+                    WHERE id = ?
+                ''', (mailbox_info['created_at'], mailbox_info['expires_at'], mailbox['id'])))
+                self.invalidate_mailbox_cache(address=address)
 
                 migrated_mailboxes += 1
 
@@ -723,7 +1213,7 @@ class DatabaseManager:
 
                 for mailbox in mailboxes:
                     # 获取邮箱的邮件
-                    emails = self.get_emails_by_mailbox(mailbox['id'])
+                    emails = self.get_emails_by_mailbox(mailbox['id'], include_body=True)
 
                     export_data[mailbox['address']] = {
                         'created_at': mailbox['created_at'],
@@ -744,58 +1234,44 @@ class DatabaseManager:
 
     def mark_email_as_read(self, email_id: str):
         """标记邮件为已读"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                UPDATE emails SET is_read = 1 WHERE id = ?
-            ''', (email_id,))
-            conn.commit()
+        self.write(lambda conn: conn.execute('''
+            UPDATE emails SET is_read = 1 WHERE id = ?
+        ''', (email_id,)))
 
     def mark_email_as_unread(self, email_id: str):
         """标记邮件为未读"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                UPDATE emails SET is_read = 0 WHERE id = ?
-            ''', (email_id,))
-            conn.commit()
+        self.write(lambda conn: conn.execute('''
+            UPDATE emails SET is_read = 0 WHERE id = ?
+        ''', (email_id,)))
 
     def delete_email(self, email_id: str) -> int:
         """删除邮件，返回删除的数量"""
-        with self.get_connection() as conn:
-            # 先获取邮件大小和邮箱ID
+        def _delete(conn):
+            # 先获取邮箱ID
             cursor = conn.execute('''
-                SELECT mailbox_id, size_bytes FROM emails WHERE id = ?
+                SELECT mailbox_id FROM emails WHERE id = ?
             ''', (email_id,))
             row = cursor.fetchone()
 
-            if row:
-                mailbox_id = row['mailbox_id']
-                size_bytes = row['size_bytes'] or 0
-
-                # 删除邮件
-                cursor = conn.execute('''
-                    DELETE FROM emails WHERE id = ?
-                ''', (email_id,))
-
-                # 更新邮箱已用容量
-                conn.execute('''
-                    UPDATE mailboxes
-                    SET storage_used = MAX(0, storage_used - ?)
-                    WHERE id = ?
-                ''', (size_bytes, mailbox_id))
+            if not row:
+                return None, 0
 
-                conn.commit()
-                return cursor.rowcount
+            # 删除邮件（邮箱计数和已用容量由触发器扣减）
+            cursor = conn.execute('''
+                DELETE FROM emails WHERE id = ?
+            ''', (email_id,))
+            return row['mailbox_id'], cursor.rowcount
 
-            return 0
+        mailbox_id, deleted = self.write(_delete)
+        if mailbox_id:
+            self.invalidate_mailbox_cache(mailbox_id=mailbox_id)
+        return deleted
 
     def mark_all_emails_read(self, mailbox_id: str) -> int:
         """标记邮箱所有邮件为已读，返回更新的数量"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute('''
-                UPDATE emails SET is_read = 1 WHERE mailbox_id = ? AND is_read = 0
-            ''', (mailbox_id,))
-            conn.commit()
-            return cursor.rowcount
+        return self.write(lambda conn: conn.execute('''
+            UPDATE emails SET is_read = 1 WHERE mailbox_id = ? AND is_read = 0
+        ''', (mailbox_id,)).rowcount)
 
     def add_sender_to_whitelist(self, address: str, sender: str) -> bool:
         """添加发件人到白名单"""
@@ -810,11 +1286,10 @@ class DatabaseManager:
                 whitelist.append(sender)
 
                 # 更新数据库
-                with sqlite3.connect(self.db_path) as conn:
-                    conn.execute('''
-                        UPDATE mailboxes SET sender_whitelist = ? WHERE address = ?
-                    ''', (json.dumps(whitelist), address))
-                    conn.commit()
+                self.write(lambda conn: conn.execute('''
+                    UPDATE mailboxes SET sender_whitelist = ? WHERE address = ?
+                ''', (json.dumps(whitelist), address)))
+                self.invalidate_mailbox_cache(address=address)
 
             return True
         except Exception:
@@ -833,11 +1308,10 @@ class DatabaseManager:
                 whitelist.remove(sender)
 
                 # 更新数据库
-                with sqlite3.connect(self.db_path) as conn:
-                    conn.execute('''
-                        UPDATE mailboxes SET sender_whitelist = ? WHERE address = ?
-                    ''', (json.dumps(whitelist), address))
-                    conn.commit()
+                self.write(lambda conn: conn.execute('''
+                    UPDATE mailboxes SET sender_whitelist = ? WHERE address = ?
+                ''', (json.dumps(whitelist), address)))
+                self.invalidate_mailbox_cache(address=address)
 
             return True
         except Exception:
@@ -850,32 +1324,29 @@ class DatabaseManager:
             current_time = int(time.time())
             new_expires_at = current_time + (retention_days * 24 * 60 * 60)
 
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute('''
-                    UPDATE mailboxes
-                    SET retention_days = ?, expires_at = ?
-                    WHERE address = ?
-                ''', (retention_days, new_expires_at, address))
-                conn.commit()
-                return cursor.rowcount > 0
+            updated = self.write(lambda conn: conn.execute('''
+                UPDATE mailboxes
+                SET retention_days = ?, expires_at = ?
+                WHERE address = ?
+            ''', (retention_days, new_expires_at, address)).rowcount)
+            self.invalidate_mailbox_cache(address=address)
+            return updated > 0
         except Exception:
             return False
 
     def regenerate_mailbox_key(self, address: str, current_key: str) -> Optional[str]:
         """重新生成邮箱密钥"""
         try:
-            mailbox = self.get_mailbox_by_address(address)
-            if not mailbox or mailbox.get('mailbox_key') != current_key:
+            if not self.verify_mailbox_key(address, current_key):
                 return None
 
             # 生成新密钥
             new_key = str(uuid.uuid4())
 
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute('''
-                    UPDATE mailboxes SET mailbox_key = ? WHERE address = ?
-                ''', (new_key, address))
-                conn.commit()
+            self.write(lambda conn: conn.execute('''
+                UPDATE mailboxes SET mailbox_key = ?, mailbox_key_hash = ? WHERE address = ?
+            ''', (new_key, token_digest(new_key), address)))
+            self.invalidate_mailbox_cache(address=address)
 
             return new_key
         except Exception:
@@ -889,14 +1360,10 @@ class DatabaseManager:
         """创建新用户"""
         current_time = int(time.time())
 
-        with self.get_connection() as conn:
-            cursor = conn.execute('''
-                INSERT INTO users (username, email, password_hash, created_at, created_by_ip)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (username, email, password_hash, current_time, created_by_ip))
-
-            user_id = cursor.lastrowid
-            conn.commit()
+        user_id = self.write(lambda conn: conn.execute('''
+            INSERT INTO users (username, email, password_hash, created_at, created_by_ip)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (username, email, password_hash, current_time, created_by_ip)).lastrowid)
 
         return {
             'id': user_id,
@@ -952,45 +1419,41 @@ class DatabaseManager:
         """关联用户和邮箱"""
         try:
             current_time = int(time.time())
-            with self.get_connection() as conn:
-                conn.execute('''
-                    INSERT OR IGNORE INTO users_mailboxes (user_id, mailbox_id, created_at)
-                    VALUES (?, ?, ?)
-                ''', (user_id, mailbox_id, current_time))
-                conn.commit()
+            self.write(lambda conn: conn.execute('''
+                INSERT OR IGNORE INTO users_mailboxes (user_id, mailbox_id, created_at)
+                VALUES (?, ?, ?)
+            ''', (user_id, mailbox_id, current_time)))
             return True
         except Exception:
             return False
 
     def get_user_mailboxes(self, user_id: int) -> List[Dict]:
-        """获取用户的所有邮箱"""
+        """获取用户的所有邮箱（包含邮件计数，一次查询完成）"""
         with self.get_connection() as conn:
             cursor = conn.execute('''
                 SELECT m.id, m.address, m.created_at, m.expires_at, m.retention_days, m.is_active,
                        m.sender_whitelist, m.whitelist_enabled, m.created_by_ip, m.access_token,
-                       m.mailbox_key, m.last_accessed
+                       m.mailbox_key, m.last_accessed, m.email_count, m.unread_count, m.last_email_time
                 FROM mailboxes m
                 INNER JOIN users_mailboxes um ON m.id = um.mailbox_id
                 WHERE um.user_id = ? AND m.is_active = 1
                 ORDER BY m.created_at DESC
             ''', (user_id,))
-            rows = cursor.fetchall()
-
-            mailboxes = []
-            for row in rows:
-                mailboxes.append({
-                    'id': row['id'],
-                    'address': row['address'],
-                    'created_at': row['created_at'],
-                    'expires_at': row['expires_at'],
-                    'retention_days': row['retention_days'],
-                    'sender_whitelist': json.loads(row['sender_whitelist'] or '[]'),
-                    'whitelist_enabled': bool(row.get('whitelist_enabled', 0)),
-                    'access_token': row['access_token'],
-                    'is_active': bool(row['is_active'])
-                })
 
-            return mailboxes
+            return [{
+                'id': row['id'],
+                'address': row['address'],
+                'created_at': row['created_at'],
+                'expires_at': row['expires_at'],
+                'retention_days': row['retention_days'],
+                'sender_whitelist': json.loads(row['sender_whitelist'] or '[]'),
+                'whitelist_enabled': bool(row['whitelist_enabled'] or 0),
+                'access_token': row['access_token'],
+                'is_active': bool(row['is_active']),
+                'email_count': row['email_count'] or 0,
+                'unread_count': row['unread_count'] or 0,
+                'last_email_time': row['last_email_time']
+            } for row in cursor]
 
     def create_invite_code(self, created_by: int = None, expires_at: int = None,
                           max_uses: int = 1) -> str:
@@ -1005,15 +1468,13 @@ class DatabaseManager:
 
         current_time = int(time.time())
 
-        with self.get_connection() as conn:
-            conn.execute('''
-                INSERT INTO invite_codes (id, code, created_by, created_at, expires_at, max_uses)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                str(uuid.uuid4()), invite_code, created_by, current_time,
-                expires_at, max_uses
-            ))
-            conn.commit()
+        self.write(lambda conn: conn.execute('''
+            INSERT INTO invite_codes (id, code, created_by, created_at, expires_at, max_uses)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (
+            str(uuid.uuid4()), invite_code, created_by, current_time,
+            expires_at, max_uses
+        )))
 
         return invite_code
 
@@ -1034,17 +1495,14 @@ class DatabaseManager:
         """标记邀请码为已使用"""
         current_time = int(time.time())
 
-        with self.get_connection() as conn:
-            cursor = conn.execute('''
-                UPDATE invite_codes
-                SET is_used = 1, used_by = ?, used_at = ?, current_uses = current_uses + 1
-                WHERE code = ? AND is_used = 0
-                AND (expires_at IS NULL OR expires_at > ?)
-                AND (max_uses IS NULL OR current_uses < max_uses)
-            ''', (used_by, current_time, code, current_time))
-
-            conn.commit()
-            return cursor.rowcount > 0
+        updated = self.write(lambda conn: conn.execute('''
+            UPDATE invite_codes
+            SET is_used = 1, used_by = ?, used_at = ?, current_uses = current_uses + 1
+            WHERE code = ? AND is_used = 0
+            AND (expires_at IS NULL OR expires_at > ?)
+            AND (max_uses IS NULL OR current_uses < max_uses)
+        ''', (used_by, current_time, code, current_time)).rowcount)
+        return updated > 0
 
     def get_invite_codes(self, limit: int = 50) -> List[Dict]:
         """获取邀请码列表"""
@@ -1098,11 +1556,10 @@ class DatabaseManager:
         else:
             sender_whitelist_str = None
 
-        with self.get_connection() as conn:
-            conn.execute('''
-                INSERT INTO sub_admins (id, token, domains, sender_whitelist, max_retention_days, created_at, updated_at, created_by, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (sub_admin_id, token, domains_str, sender_whitelist_str, max_retention_days, current_time, current_time, created_by, notes))
+        self.write(lambda conn: conn.execute('''
+            INSERT INTO sub_admins (id, token, token_hash, domains, sender_whitelist, max_retention_days, created_at, updated_at, created_by, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (sub_admin_id, token, token_digest(token), domains_str, sender_whitelist_str, max_retention_days, current_time, current_time, created_by, notes)))
 
         return sub_admin_id
 
@@ -1111,8 +1568,8 @@ class DatabaseManager:
         with self.get_connection() as conn:
             cursor = conn.execute('''
                 SELECT id, token, domains, sender_whitelist, max_retention_days, created_at, updated_at, is_active, created_by, notes
-                FROM sub_admins WHERE token = ? AND is_active = 1
-            ''', (token,))
+                FROM sub_admins WHERE token_hash = ? AND is_active = 1
+            ''', (token_digest(token),))
 
             row = cursor.fetchone()
             if row:
@@ -1211,15 +1668,13 @@ class DatabaseManager:
 
         params.append(sub_admin_id)
 
-        with self.get_connection() as conn:
-            conn.execute(f'''
-                UPDATE sub_admins SET {', '.join(updates)} WHERE id = ?
-            ''', params)
+        self.write(lambda conn: conn.execute(f'''
+            UPDATE sub_admins SET {', '.join(updates)} WHERE id = ?
+        ''', params))
 
     def delete_sub_admin(self, sub_admin_id):
         """删除子管理员"""
-        with self.get_connection() as conn:
-            conn.execute('DELETE FROM sub_admins WHERE id = ?', (sub_admin_id,))
+        self.write(lambda conn: conn.execute('DELETE FROM sub_admins WHERE id = ?', (sub_admin_id,)))
 
 # 全局数据库实例
 db_manager = DatabaseManager()
@@ -0,0 +1,165 @@
+"""
+WAL 检查点调度
+有写入时执行 PASSIVE 检查点（不等待读者、不阻塞写入），
+持续空闲一段时间后执行 TRUNCATE 检查点，把WAL文件截断回零
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+import config
+from database import db_manager
+
+
+class WalCheckpointer:
+    def __init__(self, interval: int = None, idle_seconds: int = None):
+        """初始化检查点任务"""
+        self.interval = max(1, interval or config.DB_CHECKPOINT_INTERVAL)
+        self.idle_seconds = max(0, config.DB_CHECKPOINT_IDLE_SECONDS if idle_seconds is None else idle_seconds)
+
+        self.lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._conn = None
+
+        # 用于判断是否有写入
+        self._last_operations = None
+        self._last_wal_size = None
+        self.last_write_seen_at = time.time()
+
+        # 统计
+        self.passive_checkpoints = 0
+        self.truncate_checkpoints = 0
+        self.busy_checkpoints = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_checkpoint_at = None
+        self.last_mode = None
+        self.last_result = None
+
+    def start(self):
+        """启动后台检查点线程"""
+        if not self._is_wal():
+            print("[Checkpoint] 数据库未使用WAL模式，不启动检查点任务")
+            return
+
+        with self.lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._loop, name='wal-checkpointer', daemon=True)
+            self._thread.start()
+        print(f"[Checkpoint] 已启动 - 间隔: {self.interval}秒, 空闲阈值: {self.idle_seconds}秒")
+
+    def stop(self):
+        """停止后台检查点线程"""
+        self._stop_event.set()
+
+    def _is_wal(self) -> bool:
+        """当前数据库是否为WAL模式"""
+        mode = db_manager.get_connection().execute('PRAGMA journal_mode').fetchone()[0]
+        return mode.lower() == 'wal'
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """检查点使用独立连接（不能在写线程的事务中执行）"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(db_manager.db_path, isolation_level=None, check_same_thread=False)
+            db_manager._configure_connection(self._conn)
+        return self._conn
+
+    def _wal_size(self) -> int:
+        """WAL文件大小（字节）"""
+        try:
+            return os.path.getsize(db_manager.db_path + '-wal')
+        except OSError:
+            return 0
+
+    def _loop(self):
+        """检查点线程主循环"""
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                    self.last_error = str(e)
+                print(f"[Checkpoint] 检查点失败: {e}")
+
+    def tick(self) -> Optional[Dict]:
+        """根据写入情况执行一次检查点，没有需要处理的内容时返回None"""
+        now = time.time()
+        operations = db_manager.writer.get_stats()['operations']
+        wal_size = self._wal_size()
+
+        # 本进程写线程有新操作，或WAL文件有变化（其他进程写入），都视为有负载
+        if operations != self._last_operations or wal_size != self._last_wal_size:
+            self.last_write_seen_at = now
+        self._last_operations = operations
+        self._last_wal_size = wal_size
+
+        if wal_size == 0:
+            return None
+
+        if now - self.last_write_seen_at >= self.idle_seconds:
+            result = self.checkpoint('TRUNCATE')
+        else:
+            result = self.checkpoint('PASSIVE')
+
+        self._last_wal_size = self._wal_size()
+        return result
+
+    def checkpoint(self, mode: str = 'PASSIVE') -> Dict:
+        """执行检查点，mode 为 PASSIVE / FULL / RESTART / TRUNCATE"""
+        mode = mode.upper()
+        if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+            raise ValueError(f"Unknown checkpoint mode: {mode}")
+
+        started = time.perf_counter()
+        busy, log_frames, checkpointed_frames = self._get_conn().execute(
+            f'PRAGMA wal_checkpoint({mode})'
+        ).fetchone()
+
+        result = {
+            'mode': mode,
+            'busy': bool(busy),
+            'log_frames': log_frames,
+            'checkpointed_frames': checkpointed_frames,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 3)
+        }
+
+        with self.lock:
+            if mode == 'TRUNCATE':
+                self.truncate_checkpoints += 1
+            else:
+                self.passive_checkpoints += 1
+            if busy:
+                self.busy_checkpoints += 1
+            self.last_checkpoint_at = int(time.time())
+            self.last_mode = mode
+            self.last_result = result
+
+        return result
+
+    def get_stats(self) -> Dict:
+        """获取检查点统计和当前WAL大小"""
+        with self.lock:
+            return {
+                'alive': self._thread is not None and self._thread.is_alive(),
+                'interval': self.interval,
+                'idle_seconds': self.idle_seconds,
+                'wal_size_bytes': self._wal_size(),
+                'passive_checkpoints': self.passive_checkpoints,
+                'truncate_checkpoints': self.truncate_checkpoints,
+                'busy_checkpoints': self.busy_checkpoints,
+                'errors': self.errors,
+                'last_error': self.last_error,
+                'last_checkpoint_at': self.last_checkpoint_at,
+                'last_mode': self.last_mode,
+                'last_result': self.last_result
+            }
+
+
+# 全局检查点任务实例
+checkpointer = WalCheckpointer()
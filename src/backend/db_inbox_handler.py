@@ -8,7 +8,9 @@ import json
 import ipaddress
 import config
 from database import db_manager
-from typing import Dict, List, Optional
+from pagination import encode_cursor, decode_cursor
+from .inbox_store import compact_inbox_file
+from typing import Dict, List, Optional, Tuple
 
 def is_ip_whitelisted(client_ip: str) -> bool:
     """检查IP是否在白名单中"""
@@ -72,54 +74,107 @@ def create_or_get_mailbox(address: str, retention_days: int = None,
             created_source=created_source
         )
 
+def check_mailbox_policy(mailbox: Optional[Dict], address: str, sender: str = None) -> Optional[str]:
+    """检查邮箱是否可以接收邮件，返回拒绝原因；可以接收时返回None"""
+    # 如果邮箱不存在，拒绝接收
+    if not mailbox:
+        return f"Mailbox {address} does not exist"
+
+    # 检查邮箱是否过期
+    if db_manager.is_mailbox_expired(mailbox):
+        return f"Mailbox {address} has expired"
+
+    # 检查邮箱是否激活
+    if not mailbox.get('is_active', True):
+        return f"Mailbox {address} is disabled"
+
+    # 检查发件人白名单
+    if sender is not None and not db_manager.is_sender_allowed(mailbox, sender):
+        return f"Sender {sender} not allowed for mailbox {address}"
+
+    # 检查邮箱容量
+    storage_limit = mailbox.get('storage_limit', config.MAX_MAILBOX_SIZE_BYTES)
+    if mailbox.get('storage_used', 0) >= storage_limit:
+        return f"Mailbox {address} is full"
+
+    return None
+
+def check_recipient(address: str, sender: str = None) -> Optional[str]:
+    """SMTP信封阶段检查收件人（使用邮箱缓存），返回拒绝原因；可以投递时返回None"""
+    mailbox = db_manager.get_mailbox_by_address_cached(address)
+    return check_mailbox_policy(mailbox, address, sender)
+
 def recv_email(email_json: Dict) -> str:
     """接收邮件"""
     recipient = email_json.get('To')
-    sender = email_json.get('From')
 
     if not recipient:
         return "No recipient specified"
 
+    return deliver_email(email_json, [recipient])[recipient]
+
+def deliver_email(email_json: Dict, recipients: List[str], spool_id: str = None) -> Dict[str, str]:
+    """
+    将一封邮件投递给多个收件人（邮件正文只保存一份）
+    spool_id 为落盘队列记录ID，重放同一记录时不会重复入库
+    返回每个收件人地址对应的处理结果
+    """
+    sender = email_json.get('From')
+
+    # 去重并保持顺序
+    recipients = list(dict.fromkeys(r for r in recipients if r))
+    if not recipients:
+        return {}
+
     # 检查IP白名单
     client_ip = "127.0.0.1"  # SMTP服务器本地调用，默认为白名单IP
     if not is_ip_whitelisted(client_ip):
-        return "Access denied - IP not whitelisted"
+        return {rcpt: "Access denied - IP not whitelisted" for rcpt in recipients}
 
-    # 清理过期数据
-    clean_expired_data()
+    # 过期数据由后台清理任务（db_reaper）分批删除，不在收件路径中执行
+    results = {}
+    deliveries = []
+    addresses_by_mailbox = {}
+    for rcpt in recipients:
+        # 只获取邮箱，不自动创建
+        mailbox = db_manager.get_mailbox_by_address(rcpt)
 
-    # 只获取邮箱，不自动创建
-    mailbox = db_manager.get_mailbox_by_address(recipient)
+        # 检查邮箱状态、发件人白名单和容量
+        reason = check_mailbox_policy(mailbox, rcpt, sender)
+        if reason:
+            results[rcpt] = reason
+            continue
 
-    # 如果邮箱不存在，拒绝接收
-    if not mailbox:
-        return f"Mailbox {recipient} does not exist"
+        if mailbox['id'] in addresses_by_mailbox:
+            results[rcpt] = "Email accepted"
+            continue
 
-    # 检查邮箱是否过期
-    if db_manager.is_mailbox_expired(mailbox):
-        return f"Mailbox {recipient} has expired"
+        addresses_by_mailbox[mailbox['id']] = rcpt
+        deliveries.append((mailbox['id'], rcpt))
 
-    # 检查邮箱是否激活
-    if not mailbox.get('is_active', True):
-        return f"Mailbox {recipient} is disabled"
+    if not deliveries:
+        return results
 
-    # 检查发件人白名单
-    if not db_manager.is_sender_allowed(mailbox, sender):
-        return f"Sender {sender} not allowed for mailbox {recipient}"
+    # 添加邮件（同一事务内写入所有收件人）
+    try:
+        saved = db_manager.add_email_to_mailboxes(deliveries, email_json, spool_id)
+    except Exception as e:
+        for rcpt in addresses_by_mailbox.values():
+            results[rcpt] = f"Failed to save email: {str(e)}"
+        return results
 
-    # 更新访问时间
-    db_manager.update_mailbox_access(mailbox['id'])
+    for mailbox_id, rcpt in deliveries:
+        email_id, error = saved.get(mailbox_id, (None, "Unknown error"))
+        if error:
+            results[rcpt] = error
+            continue
 
-    # 添加邮件
-    try:
-        email_id = db_manager.add_email(mailbox['id'], email_json)
+        # 更新访问时间（邮件数上限已在写入事务中处理）
+        db_manager.update_mailbox_access(mailbox_id)
 
-        # 限制每个邮箱的邮件数量
-        limit_emails_per_mailbox(mailbox['id'])
+        results[rcpt] = "Email accepted"
 
-        return "Email accepted"
-    except Exception as e:
-        return f"Failed to save email: {str(e)}"
+    return results
 
 def get_inbox_emails(address: str) -> List[Dict]:
     """获取邮箱的邮件列表"""
@@ -200,9 +255,15 @@ def get_mailbox_info(address: str) -> Optional[Dict]:
         'last_email_time': stats['last_email_time']
     }
 
-def get_emails_by_mailbox(mailbox_id: str, limit: int = None) -> List[Dict]:
-    """获取邮箱的所有邮件"""
-    return db_manager.get_emails_by_mailbox(mailbox_id, limit)
+def get_emails_by_mailbox(mailbox_id: str, limit: int = None, include_body: bool = False) -> List[Dict]:
+    """获取邮箱的所有邮件（默认不含正文）"""
+    return db_manager.get_emails_by_mailbox(mailbox_id, limit, include_body)
+
+def get_emails_page(mailbox_id: str, limit: int, cursor: str = None,
+                    include_body: bool = False) -> Tuple[List[Dict], Optional[str]]:
+    """按游标分页获取邮件，返回 (邮件列表, next_cursor)；游标无效时抛出ValueError"""
+    emails, next_key = db_manager.get_emails_page(mailbox_id, limit, decode_cursor(cursor), include_body)
+    return emails, encode_cursor(next_key)
 
 def mark_email_as_read(email_id: str) -> bool:
     """标记邮件为已读"""
@@ -255,6 +316,10 @@ def update_mailbox_retention(address: str, retention_days: int) -> bool:
     except Exception:
         return False
 
+def verify_mailbox_key(address: str, mailbox_key: str) -> bool:
+    """校验邮箱密钥"""
+    return db_manager.verify_mailbox_key(address, mailbox_key)
+
 def regenerate_mailbox_key(address: str, current_key: str) -> Optional[str]:
     """重新生成邮箱密钥"""
     try:
@@ -269,11 +334,10 @@ def update_mailbox_status(address: str, is_active: bool) -> bool:
         if not mailbox:
             return False
 
-        with db_manager.get_connection() as conn:
-            conn.execute('''
-                UPDATE mailboxes SET is_active = ? WHERE id = ?
-            ''', (is_active, mailbox['id']))
-            conn.commit()
+        db_manager.write(lambda conn: conn.execute('''
+            UPDATE mailboxes SET is_active = ? WHERE id = ?
+        ''', (is_active, mailbox['id'])))
+        db_manager.invalidate_mailbox_cache(address=address)
         return True
     except Exception:
         return False
@@ -285,27 +349,17 @@ def update_whitelist_status(address: str, enabled: bool) -> bool:
         if not mailbox:
             return False
 
-        with db_manager.get_connection() as conn:
-            conn.execute('''
-                UPDATE mailboxes SET whitelist_enabled = ? WHERE id = ?
-            ''', (enabled, mailbox['id']))
-            conn.commit()
+        db_manager.write(lambda conn: conn.execute('''
+            UPDATE mailboxes SET whitelist_enabled = ? WHERE id = ?
+        ''', (enabled, mailbox['id'])))
+        db_manager.invalidate_mailbox_cache(address=address)
         return True
     except Exception:
         return False
 
 def limit_emails_per_mailbox(mailbox_id: str):
-    """限制每个邮箱的邮件数量"""
-    emails = db_manager.get_emails_by_mailbox(mailbox_id)
-    
-    if len(emails) > config.MAX_EMAILS_PER_ADDRESS:
-        # 删除最旧的邮件
-        emails_to_delete = emails[config.MAX_EMAILS_PER_ADDRESS:]
-        
-        with db_manager.get_connection() as conn:
-            for email in emails_to_delete:
-                conn.execute('DELETE FROM emails WHERE id = ?', (email['id'],))
-            conn.commit()
+    """限制每个邮箱的邮件数量，返回删除的数量"""
+    return db_manager.trim_mailbox_emails(mailbox_id)
 
 def clean_expired_data():
     """清理过期数据"""
@@ -323,13 +377,12 @@ def update_sender_whitelist(address: str, sender_whitelist: List[str]) -> bool:
         return False
     
     try:
-        with db_manager.get_connection() as conn:
-            conn.execute('''
-                UPDATE mailboxes 
-                SET sender_whitelist = ? 
-                WHERE id = ?
-            ''', (json.dumps(sender_whitelist), mailbox['id']))
-            conn.commit()
+        db_manager.write(lambda conn: conn.execute('''
+            UPDATE mailboxes 
+            SET sender_whitelist = ? 
+            WHERE id = ?
+        ''', (json.dumps(sender_whitelist), mailbox['id'])))
+        db_manager.invalidate_mailbox_cache(address=address)
         return True
     except Exception:
         return False
@@ -342,12 +395,14 @@ def delete_mailbox(address: str) -> bool:
         return False
     
     try:
-        with db_manager.get_connection() as conn:
+        def _delete(conn):
             # 删除邮件
             conn.execute('DELETE FROM emails WHERE mailbox_id = ?', (mailbox['id'],))
             # 删除邮箱
             conn.execute('DELETE FROM mailboxes WHERE id = ?', (mailbox['id'],))
-            conn.commit()
+
+        db_manager.write(_delete)
+        db_manager.invalidate_mailbox_cache(address=address)
         return True
     except Exception:
         return False
@@ -357,7 +412,9 @@ def migrate_from_json_file(json_file_path: str = None) -> Dict:
     """从JSON文件迁移数据"""
     if json_file_path is None:
         json_file_path = config.INBOX_FILE_NAME
-    
+
+    # JSON模式的修改记录在 .log 日志中，先合并进快照再迁移
+    compact_inbox_file(json_file_path)
     return db_manager.migrate_from_json(json_file_path)
 
 def export_to_json_file(output_file_path: str = None) -> Dict:
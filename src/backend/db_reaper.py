@@ -0,0 +1,129 @@
+"""
+数据库模式下的过期数据清理
+在后台线程中按固定间隔分批删除过期邮箱和过期邮件，
+每批删除行数有限，批次之间让出写线程，避免长时间占用写锁
+"""
+
+import threading
+import time
+from typing import Dict
+import config
+from database import db_manager
+
+
+class ExpiryReaper:
+    def __init__(self, interval: int = None, batch_size: int = None, pause_ms: int = None):
+        """初始化清理任务"""
+        self.interval = max(1, interval or config.DB_REAPER_INTERVAL)
+        self.batch_size = max(1, batch_size or config.DB_REAPER_BATCH_SIZE)
+        self.pause = max(0, config.DB_REAPER_PAUSE_MS if pause_ms is None else pause_ms) / 1000
+
+        self.lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+        # 进度统计
+        self.runs = 0
+        self.batches = 0
+        self.mailboxes_deleted = 0
+        self.emails_deleted = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_run_at = None
+        self.last_run_duration = None
+        self.running = False
+
+    def start(self):
+        """启动后台清理线程"""
+        with self.lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._loop, name='db-reaper', daemon=True)
+            self._thread.start()
+        print(f"[Reaper] 已启动 - 间隔: {self.interval}秒, 每批: {self.batch_size}行")
+
+    def stop(self):
+        """停止后台清理线程（当前批次完成后退出）"""
+        self._stop_event.set()
+
+    def _loop(self):
+        """清理线程主循环"""
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                    self.last_error = str(e)
+                print(f"[Reaper] 清理失败: {e}")
+            self._stop_event.wait(self.interval)
+
+    def run_once(self) -> Dict:
+        """执行一轮清理，直到没有过期数据，返回本轮删除的数量"""
+        started = time.time()
+        with self.lock:
+            self.running = True
+
+        mailboxes_deleted = 0
+        emails_deleted = 0
+        try:
+            # 过期邮箱（连同其中的邮件）
+            while not self._stop_event.is_set():
+                mailboxes, emails = db_manager.reap_expired_mailboxes(int(time.time()), self.batch_size)
+                self._record_batch(mailboxes, emails)
+                mailboxes_deleted += mailboxes
+                emails_deleted += emails
+                if mailboxes + emails == 0:
+                    break
+                self._stop_event.wait(self.pause)
+
+            # 超过保留时间的邮件
+            while not self._stop_event.is_set():
+                cutoff_time = int(time.time()) - config.EMAIL_RETENTION_TIME
+                emails = db_manager.reap_old_emails(cutoff_time, self.batch_size)
+                self._record_batch(0, emails)
+                emails_deleted += emails
+                if emails < self.batch_size:
+                    break
+                self._stop_event.wait(self.pause)
+        finally:
+            with self.lock:
+                self.running = False
+                self.runs += 1
+                self.last_run_at = int(started)
+                self.last_run_duration = round(time.time() - started, 3)
+
+        if mailboxes_deleted or emails_deleted:
+            print(f"[Reaper] 清理完成 - 邮箱: {mailboxes_deleted}, 邮件: {emails_deleted}")
+
+        return {'mailboxes_deleted': mailboxes_deleted, 'emails_deleted': emails_deleted}
+
+    def _record_batch(self, mailboxes: int, emails: int):
+        """累计批次统计"""
+        with self.lock:
+            self.batches += 1
+            self.mailboxes_deleted += mailboxes
+            self.emails_deleted += emails
+
+    def get_stats(self) -> Dict:
+        """获取清理进度统计"""
+        with self.lock:
+            return {
+                'alive': self._thread is not None and self._thread.is_alive(),
+                'running': self.running,
+                'interval': self.interval,
+                'batch_size': self.batch_size,
+                'runs': self.runs,
+                'batches': self.batches,
+                'mailboxes_deleted': self.mailboxes_deleted,
+                'emails_deleted': self.emails_deleted,
+                'errors': self.errors,
+                'last_error': self.last_error,
+                'last_run_at': self.last_run_at,
+                'last_run_duration': self.last_run_duration
+            }
+
+
+# 全局清理任务实例
+reaper = ExpiryReaper()
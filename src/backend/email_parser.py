@@ -2,10 +2,13 @@ import time
 import uuid
 import base64
 from datetime import datetime
-from email.parser import BytesParser
+from email.parser import BytesFeedParser
 from email.message import Message
 from email.header import decode_header
 
+# 增量解析时每次送入解析器的字节数
+FEED_CHUNK_SIZE = 64 * 1024
+
 # Converts a Unix timestamp to a formatted string like this: Jan 01 at 00:00:00
 def format_time(timestamp: float) -> str:
     dt_object = datetime.utcfromtimestamp(timestamp)
@@ -63,9 +66,17 @@ def decode_email_header(header_value: str) -> str:
         # 如果解码失败，返回原始值
         return header_value
 
+# Feeds raw email bytes into BytesFeedParser chunk by chunk instead of parsing one big string
+def parse_message_bytes(data: bytes) -> Message:
+    parser = BytesFeedParser()
+    view = memoryview(data)
+    for start in range(0, len(view), FEED_CHUNK_SIZE):
+        parser.feed(bytes(view[start:start + FEED_CHUNK_SIZE]))
+    return parser.close()
+
 # Parses raw email bytes into a JSON dictionary for easy processing
 def email_bytes_to_json(data: bytes) -> dict:
-    msg = BytesParser().parsebytes(data)
+    msg = parse_message_bytes(data)
     
     to_field = extract_email_address(msg.get("To", ""))
     from_field = extract_email_address(msg.get("From", ""))
@@ -84,18 +95,46 @@ def email_bytes_to_json(data: bytes) -> dict:
         "Timestamp": current_timestamp,
         "Sent": format_time(current_timestamp),
         "Body": "",
-        "ContentType": "Text"
+        "ContentType": "Text",
+        "Attachments": []
     }
 
     # Loop through parts of the message to find the body
     for part in msg.walk():
+        if part.is_multipart():
+            continue
+
         content_type = part.get_content_type()
-        if content_type == "text/plain" or content_type == "text/html":
-            email_dict["Body"] = part.get_payload(decode=True).decode(part.get_content_charset() or "utf-8")
+        disposition = part.get_content_disposition()
+        if (content_type == "text/plain" or content_type == "text/html") and disposition != "attachment":
+            payload = part.get_payload(decode=True) or b""
+            email_dict["Body"] = payload.decode(part.get_content_charset() or "utf-8")
             if content_type == "text/plain":
                 email_dict["ContentType"] = "Text"
             if content_type == "text/html":
                 email_dict["ContentType"] = "HTML"
+            continue
 
+        # 其他部分（附件、内嵌图片等）保留原始字节，由存储层按内容去重保存
+        data = part.get_payload(decode=True)
+        if data is None:
+            continue
+        email_dict["Attachments"].append(part_to_json(part, data))
+
+    return email_dict
+
+# Builds the metadata dictionary for a non-body MIME part
+def part_to_json(part: Message, data: bytes) -> dict:
+    content_id = part.get("Content-ID", "").strip().strip("<>")
+    return {
+        "Filename": decode_email_header(part.get_filename() or ""),
+        "ContentType": part.get_content_type(),
+        "ContentId": content_id,
+        "Disposition": part.get_content_disposition() or "",
+        "Size": len(data),
+        "Data": data
+    }
 
-    return email_dict
\ No newline at end of file
+# Returns the attachment list without the raw bytes (for JSON storage and responses)
+def attachments_metadata(attachments: list) -> list:
+    return [{k: v for k, v in item.items() if k != "Data"} for item in attachments or []]
\ No newline at end of file
@@ -1,5 +1,6 @@
 from flask import Flask
 from .routes import pages, api, admin_api
+from database import db_manager
 
 app = Flask(__name__, template_folder='../frontend/templates', static_folder='../frontend/static')
 
@@ -7,6 +8,9 @@ app.register_blueprint(pages.bp) # load the blueprint for the all of the main we
 app.register_blueprint(api.bp, url_prefix='/api') # load the blueprint for the all of the api routes
 app.register_blueprint(admin_api.bp, url_prefix='/api/admin') # load the blueprint for admin API routes
 
+# Return the request-scoped database connection to the pool when the request ends
+app.teardown_appcontext(db_manager.pool.release_request_connection)
+
 # Runs the main flask app
 def run_flask_server(host, port):
     app.run(host=host, port=port, debug=False)
\ No newline at end of file
@@ -2,44 +2,32 @@ import json
 import re
 import os
 import time
+import uuid
 import ipaddress
 import config
+from .email_parser import attachments_metadata
+from .inbox_store import inbox_store
 
-# Reads the contents of the inbox.json file and returns it as a dictionary
+# Returns a copy of the whole inbox as a dictionary (used for export and bulk processing)
 def read_inbox() -> dict:
     try:
-        with open(config.INBOX_FILE_NAME, "r") as f:
-            data = json.load(f)
-            # Ensure new data structure compatibility
-            if data and isinstance(list(data.values())[0], list):
-                # Old format: convert to new format
-                new_data = {}
-                current_time = int(time.time())
-                for address, emails in data.items():
-                    new_data[address] = {
-                        "created_at": current_time,
-                        "expires_at": current_time + (config.MAILBOX_RETENTION_DAYS * 24 * 60 * 60),
-                        "sender_whitelist": [],
-                        "emails": emails
-                    }
-                write_inbox(new_data)
-                return new_data
-            return data
-    except:
+        return inbox_store.snapshot()
+    except Exception as e:
+        print(f"Error reading inbox: {e}")
         return {}
 
-# Writes a dictionary to the inbox.json file
+# Replaces the whole inbox and writes it out as a snapshot
 def write_inbox(data: dict):
-    with open(config.INBOX_FILE_NAME, "w") as f:
-        json.dump(data, f, indent=4)
+    inbox_store.replace(data)
 
-# Clears inbox if it exceeds maximum
+# Evicts the oldest emails of the least recently used mailboxes when the inbox exceeds its maximum size
+# Returns the eviction report, or None if nothing was evicted
 def check_inbox_size():
-    if not os.path.exists(config.INBOX_FILE_NAME):
-        return
-
-    if os.path.getsize(config.INBOX_FILE_NAME) > config.MAX_INBOX_SIZE:
-        write_inbox({})
+    report = inbox_store.evict(config.MAX_INBOX_SIZE)
+    if report:
+        print(f"Inbox exceeded {config.MAX_INBOX_SIZE} bytes - evicted {report['evicted_emails']} emails and "
+              f"{report['evicted_mailboxes']} mailboxes ({report['freed_bytes']} bytes) from {len(report['mailboxes'])} mailboxes")
+    return report
 
 # Removes emails older than the retention period
 def clean_expired_emails(inbox: dict) -> dict:
@@ -61,6 +49,14 @@ def clean_expired_emails(inbox: dict) -> dict:
 
     return cleaned_inbox
 
+# Returns a copy of one mailbox from memory (None if it does not exist), hiding emails past the retention period
+def get_mailbox(address: str):
+    mailbox_data = inbox_store.get_mailbox(address)
+    if mailbox_data is not None:
+        cutoff_time = int(time.time()) - config.EMAIL_RETENTION_TIME
+        mailbox_data["emails"] = [email for email in mailbox_data.get("emails", []) if email.get('Timestamp', 0) > cutoff_time]
+    return mailbox_data
+
 # Limits the number of emails per address
 def limit_emails_per_address(emails: list) -> list:
     # Sort emails by timestamp (newest first) and keep only the latest ones
@@ -69,20 +65,19 @@ def limit_emails_per_address(emails: list) -> list:
 
 # Create or get mailbox with lifecycle management
 def create_or_get_mailbox(address: str) -> dict:
-    inbox = read_inbox()
-    current_time = int(time.time())
-
-    if address not in inbox:
+    mailbox_data = inbox_store.get_mailbox(address)
+    if mailbox_data is None:
         # Create new mailbox
-        inbox[address] = {
+        current_time = int(time.time())
+        mailbox_data = {
             "created_at": current_time,
             "expires_at": current_time + (config.MAILBOX_RETENTION_DAYS * 24 * 60 * 60),
             "sender_whitelist": [],
             "emails": []
         }
-        write_inbox(inbox)
+        inbox_store.put_mailbox(address, mailbox_data)
 
-    return inbox[address]
+    return mailbox_data
 
 # Check if mailbox is expired
 def is_mailbox_expired(mailbox_data: dict) -> bool:
@@ -124,25 +119,25 @@ def is_sender_allowed(mailbox_data: dict, sender_email: str) -> bool:
 
 # Add sender to whitelist
 def add_sender_to_whitelist(address: str, sender: str) -> bool:
-    inbox = read_inbox()
-    if address in inbox:
-        whitelist = inbox[address].get("sender_whitelist", [])
+    mailbox_data = inbox_store.get_mailbox(address)
+    if mailbox_data is not None:
+        whitelist = mailbox_data.get("sender_whitelist", [])
         if sender not in whitelist:
             whitelist.append(sender)
-            inbox[address]["sender_whitelist"] = whitelist
-            write_inbox(inbox)
+            mailbox_data["sender_whitelist"] = whitelist
+            inbox_store.put_mailbox(address, mailbox_data)
             return True
     return False
 
 # Remove sender from whitelist
 def remove_sender_from_whitelist(address: str, sender: str) -> bool:
-    inbox = read_inbox()
-    if address in inbox:
-        whitelist = inbox[address].get("sender_whitelist", [])
+    mailbox_data = inbox_store.get_mailbox(address)
+    if mailbox_data is not None:
+        whitelist = mailbox_data.get("sender_whitelist", [])
         if sender in whitelist:
             whitelist.remove(sender)
-            inbox[address]["sender_whitelist"] = whitelist
-            write_inbox(inbox)
+            mailbox_data["sender_whitelist"] = whitelist
+            inbox_store.put_mailbox(address, mailbox_data)
             return True
     return False
 
@@ -173,6 +168,19 @@ def is_ip_whitelisted(client_ip: str) -> bool:
     except ValueError:
         return False  # Invalid IP address
 
+# Checks at the SMTP envelope stage whether a recipient can receive mail
+# Returns the rejection reason, or None if the recipient is deliverable
+def check_recipient(address: str, sender: str = None):
+    if config.USE_DATABASE:
+        try:
+            from . import db_inbox_handler
+            return db_inbox_handler.check_recipient(address, sender)
+        except ImportError:
+            print("Warning: Database enabled but db_inbox_handler not available, falling back to JSON")
+
+    # JSON storage creates mailboxes on delivery, so every recipient is accepted here
+    return None
+
 # Adds a new email to the inbox
 def recv_email(email_json: dict):
     recipient = email_json.get('To')
@@ -192,14 +200,44 @@ def recv_email(email_json: dict):
             print(f"Error using database handler: {e}, falling back to JSON")
 
     # Fallback to JSON storage
-    check_inbox_size()
-    inbox = read_inbox()
+    return _recv_email_json(email_json)
+
+def deliver_email(email_json: dict, recipients: list, spool_id: str = None) -> dict:
+    """Deliver one email to every recipient in the SMTP envelope and return the result for each recipient"""
+    recipients = list(dict.fromkeys(r for r in recipients if r))
+    if not recipients and email_json.get('To'):
+        recipients = [email_json['To']]
+    if not recipients:
+        return {}
 
-    # Clean expired emails and mailboxes first
-    inbox = clean_expired_emails(inbox)
-    inbox = clean_expired_mailboxes(inbox)
+    if config.USE_DATABASE:
+        try:
+            from . import db_inbox_handler
+            return db_inbox_handler.deliver_email(email_json, recipients, spool_id)
+        except ImportError:
+            print("Warning: Database enabled but db_inbox_handler not available, falling back to JSON")
+        except Exception as e:
+            print(f"Error using database handler: {e}, falling back to JSON")
 
-    # Create or get mailbox
+    # JSON storage keeps a separate copy for each recipient
+    results = {}
+    for index, rcpt in enumerate(recipients):
+        entry = dict(email_json, To=rcpt)
+        if spool_id:
+            # Spool replays reuse the same id per recipient, so a replayed record is stored only once
+            entry['id'] = str(uuid.uuid5(uuid.NAMESPACE_URL, f"spool:{spool_id}:{rcpt}"))
+        elif index > 0:
+            entry['id'] = str(uuid.uuid4())
+        results[rcpt] = _recv_email_json(entry)
+    return results
+
+def _recv_email_json(email_json: dict):
+    recipient = email_json.get('To')
+    sender = email_json.get('From')
+
+    check_inbox_size()
+
+    # Create or get mailbox (expired data is removed by the background cleanup task, not on receive)
     mailbox_data = create_or_get_mailbox(recipient)
 
     # Check if mailbox is expired
@@ -210,14 +248,13 @@ def recv_email(email_json: dict):
     if not is_sender_allowed(mailbox_data, sender):
         return f"Sender {sender} not allowed for mailbox {recipient}"
 
-    # Add the new email
-    mailbox_data["emails"].append(email_json)
-
-    # Limit emails per address
-    mailbox_data["emails"] = limit_emails_per_address(mailbox_data["emails"])
+    # Already stored by an earlier attempt of the same spool record
+    if any(email.get("id") == email_json.get("id") for email in mailbox_data.get("emails", [])):
+        return "Email accepted"
 
-    # Update inbox
-    inbox[recipient] = mailbox_data
-    write_inbox(inbox)
+    # Add the new email (JSON storage keeps attachment metadata only, not attachment content)
+    # Appends a single record to the log and drops the oldest emails beyond the per-address limit
+    email_json = dict(email_json, Attachments=attachments_metadata(email_json.get("Attachments")))
+    inbox_store.add_email(recipient, email_json, keep=config.MAX_EMAILS_PER_ADDRESS)
 
-    return "Email accepted"
\ No newline at end of file
+    return "Email accepted"
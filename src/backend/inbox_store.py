@@ -0,0 +1,510 @@
+"""
+JSON 模式的收件箱存储
+数据常驻内存（按地址索引），每次修改只向日志文件追加一行 JSON 记录；
+日志由后台线程按 INBOX_FLUSH_INTERVAL 定时刷盘；日志超过阈值时把内存数据整体写成快照
+（即 INBOX_FILE_NAME，格式与原 inbox.json 相同，先写临时文件再替换）。
+合并快照时只在锁内序列化数据并把日志改名为 .compacting，之后的修改写入新日志；
+快照文件在锁外写入和替换，完成后删除改名的日志，写快照期间读写不被阻塞。
+启动时读取快照后按顺序重放改名的日志和当前日志，日志末尾不完整的一行（写入时崩溃）会被忽略；
+快照已包含改名的日志时重放也不会产生重复邮件（按邮件ID去重）。
+读取只访问内存数据，不读磁盘。
+内存中同时维护每个邮箱的近似序列化大小和最近访问顺序，超过容量上限时按 LRU 淘汰（见 evict）。
+
+日志记录（每行一个）：
+    {"op": "mailbox", "address": ..., "mailbox": {除 emails 外的邮箱字段}}
+    {"op": "email", "address": ..., "email": {...}}
+    {"op": "remove_emails", "address": ..., "ids": [...]}
+    {"op": "remove_mailbox", "address": ...}
+"""
+
+import atexit
+import contextlib
+import copy
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import config
+
+# 已加载数据的存储（文件绝对路径 -> 存储实例），避免在其他实例使用中的文件上直接合并
+_loaded_stores = weakref.WeakValueDictionary()
+
+
+def _convert_old_format(data: dict) -> dict:
+    """旧格式（地址 -> 邮件列表）转换为新格式"""
+    if not data or not isinstance(next(iter(data.values())), list):
+        return data
+    current_time = int(time.time())
+    return {
+        address: {
+            "created_at": current_time,
+            "expires_at": current_time + (config.MAILBOX_RETENTION_DAYS * 24 * 60 * 60),
+            "sender_whitelist": [],
+            "emails": emails
+        }
+        for address, emails in data.items()
+    }
+
+
+def _mailbox_meta(mailbox: dict) -> dict:
+    """邮箱字段（不含邮件列表）"""
+    return {key: value for key, value in mailbox.items() if key != "emails"}
+
+
+def _json_size(value) -> int:
+    """近似序列化大小（字节）"""
+    return len(json.dumps(value, separators=(',', ':')))
+
+
+def _mailbox_size(mailbox: dict) -> int:
+    """邮箱的近似序列化大小：邮箱字段加全部邮件"""
+    return _json_size(_mailbox_meta(mailbox)) + sum(_json_size(email) for email in mailbox.get("emails", []))
+
+
+def _last_activity(mailbox: dict) -> int:
+    """邮箱最近活动时间（创建时间和最新邮件时间中较晚者），用于加载时初始化访问顺序"""
+    timestamps = [email.get('Timestamp', 0) for email in mailbox.get("emails", [])]
+    return max([mailbox.get("created_at", 0)] + timestamps)
+
+
+class InboxStore:
+    def __init__(self, path: str = None, compact_bytes: int = None, flush_interval: float = None):
+        """初始化存储（首次使用时才读取文件）"""
+        self.path = path or config.INBOX_FILE_NAME
+        self.log_path = self.path + '.log'
+        self.compacting_path = self.log_path + '.compacting'
+        self.compact_bytes = max(0, config.INBOX_LOG_COMPACT_BYTES if compact_bytes is None else compact_bytes)
+        self.flush_interval = max(0, config.INBOX_FLUSH_INTERVAL if flush_interval is None else flush_interval)
+
+        self.lock = threading.RLock()
+        self._inbox: Optional[Dict[str, dict]] = None
+        self._log = None
+        self._log_size = 0
+        self._snapshot_size = 0
+        self._dirty = False
+
+        # 合并快照：锁内序列化的快照数据，由 _write_pending_snapshot 在锁外写入
+        self._compacting = False
+        self._pending_snapshot: Optional[str] = None
+
+        # 每个邮箱的近似大小和最近访问顺序（最久未访问的在前）
+        self._sizes: Dict[str, int] = {}
+        self._total_size = 0
+        self._lru: OrderedDict = OrderedDict()
+
+        # 后台刷盘线程（首次修改时启动）
+        self._flusher: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        # 统计
+        self.appends = 0
+        self.compactions = 0
+        self.replayed = 0
+        self.flushes = 0
+        self.evicted_emails = 0
+        self.evicted_mailboxes = 0
+        self.last_eviction: Optional[Dict] = None
+
+    def _ensure_loaded(self):
+        """首次访问时加载快照并重放日志（调用方持有锁）"""
+        if self._inbox is not None:
+            return
+
+        inbox = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    inbox = _convert_old_format(json.load(f) or {})
+                self._snapshot_size = os.path.getsize(self.path)
+            except ValueError as e:
+                # 快照损坏时改名保留，便于人工恢复，不直接覆盖
+                corrupt_path = f'{self.path}.corrupt-{int(time.time())}'
+                os.replace(self.path, corrupt_path)
+                print(f"[InboxStore] 快照文件损坏，已改名为 {corrupt_path}，从空数据开始: {e}")
+
+        # 上次合并未完成时先重放改名的日志，再重放当前日志
+        replayed = 0
+        log_exists = False
+        for log_path in (self.compacting_path, self.log_path):
+            if not os.path.exists(log_path) or os.path.getsize(log_path) == 0:
+                continue
+            log_exists = True
+            with open(log_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 只可能是崩溃时未写完的最后一行
+                        print(f"[InboxStore] 忽略日志中不完整的记录: {line[:80]!r}")
+                        break
+                    self._apply(inbox, record, replay=True)
+                    replayed += 1
+
+        self._inbox = inbox
+        self._rebuild_index()
+        self.replayed = replayed
+        _loaded_stores[os.path.abspath(self.path)] = self
+        if log_exists:
+            # 把重放的日志合并进快照并清空日志，之后的记录不会接在不完整的行后面
+            self._compact()
+
+    def _rebuild_index(self):
+        """按当前数据重新计算邮箱大小和访问顺序（调用方持有锁）"""
+        self._sizes = {address: _mailbox_size(mailbox) for address, mailbox in self._inbox.items()}
+        self._total_size = sum(self._sizes.values())
+        ordered = sorted(self._inbox.items(), key=lambda item: _last_activity(item[1]))
+        self._lru = OrderedDict((address, None) for address, _ in ordered)
+
+    def _touch(self, address: str):
+        """记录邮箱被访问（调用方持有锁）"""
+        if address in self._inbox:
+            self._lru[address] = None
+            self._lru.move_to_end(address)
+
+    def _size_delta(self, record: dict) -> int:
+        """一条日志记录对邮箱大小的影响（在应用记录前计算）"""
+        op = record.get('op')
+        mailbox = self._inbox.get(record.get('address'))
+        if op == 'mailbox':
+            old_size = _json_size(_mailbox_meta(mailbox)) if mailbox is not None else 0
+            return _json_size(record['mailbox']) - old_size
+        if op == 'email':
+            return _json_size(record['email'])
+        if mailbox is None:
+            return 0
+        if op == 'remove_emails':
+            ids = set(record['ids'])
+            return -sum(_json_size(email) for email in mailbox.get("emails", []) if email.get("id") in ids)
+        if op == 'remove_mailbox':
+            return -self._sizes.get(record['address'], 0)
+        return 0
+
+    def _apply(self, inbox: Dict[str, dict], record: dict, replay: bool = False):
+        """把一条日志记录应用到内存数据（replay 为True时跳过已存在的邮件，重放已合并的日志不会重复）"""
+        op = record.get('op')
+        address = record.get('address')
+        if op == 'mailbox':
+            mailbox = inbox.setdefault(address, {"emails": []})
+            emails = mailbox.get("emails", [])
+            mailbox.clear()
+            mailbox.update(record['mailbox'])
+            mailbox["emails"] = emails
+        elif op == 'email':
+            emails = inbox.setdefault(address, {"emails": []}).setdefault("emails", [])
+            email_id = record['email'].get("id")
+            if replay and email_id is not None and any(email.get("id") == email_id for email in emails):
+                return
+            emails.append(record['email'])
+        elif op == 'remove_emails':
+            mailbox = inbox.get(address)
+            if mailbox:
+                ids = set(record['ids'])
+                mailbox["emails"] = [email for email in mailbox.get("emails", []) if email.get("id") not in ids]
+        elif op == 'remove_mailbox':
+            inbox.pop(address, None)
+
+    def _append(self, record: dict):
+        """应用修改并写入日志缓冲（调用方持有锁），由后台线程定时刷盘"""
+        address = record.get('address')
+        delta = self._size_delta(record)
+        self._apply(self._inbox, record)
+
+        self._total_size += delta
+        if address in self._inbox:
+            self._sizes[address] = self._sizes.get(address, 0) + delta
+            if address not in self._lru:
+                self._lru[address] = None
+        else:
+            self._sizes.pop(address, None)
+            self._lru.pop(address, None)
+
+        if self._log is None:
+            directory = os.path.dirname(os.path.abspath(self.log_path))
+            os.makedirs(directory, exist_ok=True)
+            self._log = open(self.log_path, 'a')
+            self._log_size = self._log.tell()
+
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        self._log.write(line)
+        self._log_size += len(line)
+        self._dirty = True
+        self.appends += 1
+
+        if self.flush_interval:
+            self._start_flusher()
+        else:
+            self._flush()
+
+    def _start_flusher(self):
+        """启动后台刷盘线程（调用方持有锁）"""
+        if self._flusher is not None:
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name='inbox-flusher', daemon=True)
+        self._flusher.start()
+        atexit.register(self.stop)
+
+    def _flush_loop(self):
+        """按间隔把日志刷到磁盘，日志过大时合并为快照"""
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[InboxStore] 刷盘失败: {e}")
+
+    def _flush(self):
+        """把日志缓冲写入磁盘，日志过大时合并为快照（调用方持有锁）"""
+        if not self._dirty:
+            return
+        if self.compact_bytes and self._log_size > self.compact_bytes and not self._compacting:
+            self._compact()
+        elif self._log is not None:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+        self._dirty = False
+        self.flushes += 1
+
+    def flush(self):
+        """立即刷盘"""
+        with self._locked():
+            self._flush()
+
+    def stop(self):
+        """停止后台刷盘线程并写入剩余的修改（进程退出时自动调用）"""
+        self._stop_event.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=5)
+        with self._locked():
+            self._flush()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """持有锁执行操作，释放锁后写入期间产生的快照"""
+        with self.lock:
+            yield
+        self._write_pending_snapshot()
+
+    def _compact(self):
+        """
+        开始合并快照（调用方持有锁）：序列化内存数据并把日志改名为 .compacting，
+        之后的修改写入新日志；快照由 _write_pending_snapshot 在锁外写入
+        """
+        if self._compacting:
+            return
+        self._pending_snapshot = json.dumps(self._inbox, separators=(',', ':'))
+        self._compacting = True
+
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if os.path.exists(self.log_path):
+            if os.path.exists(self.compacting_path):
+                # 上次合并的快照未写成（已重放或仍在内存中），新快照同样包含其内容
+                with open(self.compacting_path, 'a') as rotated, open(self.log_path, 'r') as log:
+                    rotated.write(log.read())
+                os.remove(self.log_path)
+            else:
+                os.replace(self.log_path, self.compacting_path)
+        self._log_size = 0
+        self._dirty = False
+
+    def _write_pending_snapshot(self):
+        """
+        把已序列化的快照写入文件（先写临时文件再替换），完成后删除改名的日志（不持有 self.lock）
+        取走快照数据的线程负责写入；写完之前不会开始新的合并，因此同一时间只有一个线程写快照
+        """
+        with self.lock:
+            data = self._pending_snapshot
+            self._pending_snapshot = None
+        if data is None:
+            return
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            try:
+                os.remove(self.compacting_path)
+            except FileNotFoundError:
+                pass
+        except Exception:
+            with self.lock:
+                self._compacting = False
+            raise
+        with self.lock:
+            self._compacting = False
+            self._snapshot_size = len(data)
+            self.compactions += 1
+
+    def snapshot(self) -> Dict[str, dict]:
+        """获取全部数据的副本（用于导出和整体处理）"""
+        with self._locked():
+            self._ensure_loaded()
+            return copy.deepcopy(self._inbox)
+
+    def replace(self, inbox: Dict[str, dict]):
+        """整体替换数据并立即写成快照"""
+        with self._locked():
+            self._ensure_loaded()
+            self._inbox = copy.deepcopy(inbox)
+            self._rebuild_index()
+            self._compact()
+
+    def get_mailbox(self, address: str) -> Optional[dict]:
+        """获取邮箱数据的副本，不存在时返回None"""
+        with self._locked():
+            self._ensure_loaded()
+            mailbox = self._inbox.get(address)
+            if mailbox is None:
+                return None
+            self._touch(address)
+            return copy.deepcopy(mailbox)
+
+    def put_mailbox(self, address: str, mailbox: dict):
+        """创建或更新邮箱字段（不影响邮件列表）"""
+        with self._locked():
+            self._ensure_loaded()
+            self._append({'op': 'mailbox', 'address': address, 'mailbox': _mailbox_meta(mailbox)})
+            self._touch(address)
+
+    def add_email(self, address: str, email: dict, keep: int = None):
+        """向邮箱追加一封邮件，超过 keep 封时删除最旧的邮件"""
+        with self._locked():
+            self._ensure_loaded()
+            self._append({'op': 'email', 'address': address, 'email': email})
+            self._touch(address)
+
+            emails = self._inbox[address].get("emails", [])
+            if keep is not None and len(emails) > keep:
+                newest = sorted(emails, key=lambda item: item.get('Timestamp', 0), reverse=True)[:keep]
+                kept = {id(item) for item in newest}
+                removed = [item.get("id") for item in emails if id(item) not in kept]
+                self._append({'op': 'remove_emails', 'address': address, 'ids': removed})
+
+    def remove_emails(self, address: str, ids: List[str]):
+        """删除邮箱中的指定邮件"""
+        with self._locked():
+            self._ensure_loaded()
+            if ids and address in self._inbox:
+                self._append({'op': 'remove_emails', 'address': address, 'ids': list(ids)})
+
+    def remove_mailbox(self, address: str):
+        """删除邮箱及其全部邮件"""
+        with self._locked():
+            self._ensure_loaded()
+            if address in self._inbox:
+                self._append({'op': 'remove_mailbox', 'address': address})
+
+    def clean_expired(self, cutoff_time: int) -> Dict[str, int]:
+        """删除已过期的邮箱和早于 cutoff_time 的邮件，只为有变化的邮箱追加日志"""
+        removed_mailboxes = 0
+        removed_emails = 0
+        with self._locked():
+            self._ensure_loaded()
+            current_time = int(time.time())
+            for address, mailbox in list(self._inbox.items()):
+                emails = mailbox.get("emails", [])
+                if current_time > mailbox.get("expires_at", 0):
+                    self._append({'op': 'remove_mailbox', 'address': address})
+                    removed_mailboxes += 1
+                    removed_emails += len(emails)
+                    continue
+                expired = [email.get("id") for email in emails if email.get('Timestamp', 0) <= cutoff_time]
+                if expired:
+                    self._append({'op': 'remove_emails', 'address': address, 'ids': expired})
+                    removed_emails += len(expired)
+        return {'mailboxes': removed_mailboxes, 'emails': removed_emails}
+
+    def evict(self, max_bytes: int, target_ratio: float = None) -> Optional[Dict]:
+        """
+        数据超过 max_bytes 时淘汰到 max_bytes * target_ratio 以下：
+        先按最久未访问的邮箱顺序删除邮件（每个邮箱从最旧的邮件开始），
+        仍然超出时再删除最久未访问的空邮箱。未超出时返回None，否则返回淘汰报告
+        """
+        if target_ratio is None:
+            target_ratio = config.INBOX_EVICT_TARGET_RATIO
+        with self._locked():
+            self._ensure_loaded()
+            if self._total_size <= max_bytes:
+                return None
+
+            target = int(max_bytes * min(max(target_ratio, 0), 1))
+            size_before = self._total_size
+            report = {'evicted_emails': 0, 'evicted_mailboxes': 0, 'mailboxes': []}
+
+            for address in list(self._lru):
+                if self._total_size <= target:
+                    break
+                emails = sorted(self._inbox[address].get("emails", []), key=lambda item: item.get('Timestamp', 0))
+                if not emails:
+                    continue
+                excess = self._total_size - target
+                ids = []
+                for email in emails:
+                    if excess <= 0:
+                        break
+                    ids.append(email.get("id"))
+                    excess -= _json_size(email)
+                self._append({'op': 'remove_emails', 'address': address, 'ids': ids})
+                report['evicted_emails'] += len(ids)
+                report['mailboxes'].append(address)
+
+            for address in list(self._lru):
+                if self._total_size <= target:
+                    break
+                if not self._inbox[address].get("emails"):
+                    self._append({'op': 'remove_mailbox', 'address': address})
+                    report['evicted_mailboxes'] += 1
+                    if address not in report['mailboxes']:
+                        report['mailboxes'].append(address)
+
+            report['freed_bytes'] = size_before - self._total_size
+            report['size_bytes'] = self._total_size
+            report['time'] = int(time.time())
+            self.evicted_emails += report['evicted_emails']
+            self.evicted_mailboxes += report['evicted_mailboxes']
+            self.last_eviction = report
+            return report
+
+    def get_stats(self) -> Dict:
+        """获取存储统计"""
+        with self.lock:
+            return {
+                'loaded': self._inbox is not None,
+                'mailboxes': len(self._inbox) if self._inbox is not None else 0,
+                'size_bytes': self._total_size,
+                'disk_bytes': self._snapshot_size + self._log_size,
+                'log_size_bytes': self._log_size,
+                'appends': self.appends,
+                'compactions': self.compactions,
+                'flushes': self.flushes,
+                'replayed': self.replayed,
+                'evicted_emails': self.evicted_emails,
+                'evicted_mailboxes': self.evicted_mailboxes,
+                'last_eviction': self.last_eviction
+            }
+
+
+def compact_inbox_file(path: str):
+    """
+    把指定收件箱文件的日志合并进快照（供数据迁移等直接读取文件的场景使用）
+    文件已被本进程中的存储加载时拒绝合并，否则会在其写入期间改动日志
+    """
+    if os.path.abspath(path) in _loaded_stores:
+        raise RuntimeError(f"收件箱文件 {path} 正在被 JSON 存储使用，不能直接合并")
+    store = InboxStore(path)
+    with store.lock:
+        store._ensure_loaded()
+        if os.path.exists(store.log_path):
+            store._compact()
+    store._write_pending_snapshot()
+
+
+# 全局收件箱存储实例
+inbox_store = InboxStore()
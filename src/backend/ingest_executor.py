@@ -0,0 +1,133 @@
+"""
+SMTP 收件处理池
+将邮件解析和入库从 aiosmtpd 事件循环中移出，交给线程池/进程池执行，
+并通过有界队列实现背压：队列满时由调用方返回 451 临时失败
+"""
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import config
+from . import email_parser, inbox_handler
+
+
+def process_email(content: bytes, recipients: List[str], spool_id: str = None) -> Tuple[Dict, Dict[str, str]]:
+    """
+    解析并投递邮件到信封中的所有收件人（在工作线程/进程中执行）
+    spool_id 为落盘队列记录ID，用于重放时去重
+    """
+    parsed_email = email_parser.email_bytes_to_json(content)
+    results = inbox_handler.deliver_email(parsed_email, recipients, spool_id)
+    # 附件内容已写入存储，不再传回调用方（进程池模式下避免序列化大块数据）
+    parsed_email['Attachments'] = email_parser.attachments_metadata(parsed_email.get('Attachments'))
+    return parsed_email, results
+
+
+class IngestExecutor:
+    def __init__(self, mode: str = None, max_workers: int = None, queue_size: int = None):
+        """初始化收件处理池"""
+        self.mode = (mode or config.INGEST_EXECUTOR).lower()
+        self.max_workers = max(1, max_workers or config.INGEST_WORKERS)
+        self.queue_size = max(0, config.INGEST_QUEUE_SIZE if queue_size is None else queue_size)
+
+        if self.mode == 'process' and not config.USE_DATABASE:
+            # JSON存储的数据保存在单个进程的内存中，不能由多个进程同时写入
+            print("[Ingest] JSON存储不支持进程池模式，改用线程池")
+            self.mode = 'thread'
+
+        if self.mode == 'process':
+            # 使用spawn避免在多线程进程中fork带来的锁和连接状态问题
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        else:
+            self.mode = 'thread'
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='smtp-ingest'
+            )
+
+        # 正在执行和排队的任务总数上限
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.queue_size)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+        print(f"[Ingest] 初始化完成 - 模式: {self.mode}, 工作数: {self.max_workers}, 队列长度: {self.queue_size}")
+
+    def submit(self, fn, *args) -> Optional[asyncio.Future]:
+        """
+        提交任务
+        返回可await的future；队列已满时返回None
+        """
+        if not self._slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            return None
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self.lock:
+            self.in_flight += 1
+            self.submitted += 1
+        future.add_done_callback(self._on_done)
+        return asyncio.wrap_future(future)
+
+    def submit_background(self, fn, *args) -> Future:
+        """
+        提交后台任务（落盘队列投递用），不占用SMTP排队名额，并发由调用方控制
+        返回 concurrent.futures.Future
+        """
+        future = self._executor.submit(fn, *args)
+        with self.lock:
+            self.in_flight += 1
+            self.submitted += 1
+        future.add_done_callback(self._on_background_done)
+        return future
+
+    def _on_background_done(self, future):
+        """后台任务完成回调"""
+        with self.lock:
+            self.in_flight -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def _on_done(self, future):
+        """任务完成回调，释放队列位置"""
+        with self.lock:
+            self.in_flight -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+        self._slots.release()
+
+    def get_stats(self) -> Dict:
+        """获取处理池统计信息"""
+        with self.lock:
+            return {
+                'mode': self.mode,
+                'max_workers': self.max_workers,
+                'queue_size': self.queue_size,
+                'in_flight': self.in_flight,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected
+            }
+
+    def shutdown(self, wait: bool = True):
+        """关闭处理池"""
+        self._executor.shutdown(wait=wait)
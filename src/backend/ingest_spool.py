@@ -0,0 +1,414 @@
+"""
+SMTP 收件落盘队列（spool）
+DATA 阶段只把原始邮件和信封顺序追加到本地段文件并 fsync，随后即返回250；
+解析和入库由后台任务从队列中取出执行，完成后写入确认记录。
+进程崩溃后重启时，未确认的记录会重新投递；投递时带上记录ID，
+已按该ID入库的收件人不会重复入库，因此重放不会产生重复邮件。
+内存中只保留记录的信封，原始邮件在投递时再从段文件读取；
+尚未入库的记录总大小超过上限时拒绝追加，由 SMTP 返回451让发件方稍后重试。
+
+文件布局（INGEST_SPOOL_DIR 下）：
+    spool-000001.log  记录段，每条记录为 头部(魔数, 长度, CRC32) + 信封JSON + 原始邮件
+    spool-000001.ack  确认记录，每行一个："偏移" 表示已完成，
+                      "偏移 [收件人, ...]" 表示部分收件人已完成，括号内为仍待投递的收件人
+    failed/           多次重试仍失败的原始邮件
+段文件写满后切换到新段，旧段的记录全部确认后删除
+"""
+
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+import config
+from .mail_notifier import notifier
+
+# 记录头部：魔数、载荷长度、载荷CRC32
+RECORD_MAGIC = b'SPL1'
+RECORD_HEADER = struct.Struct('!4sII')
+META_LENGTH = struct.Struct('!I')
+
+
+def is_retryable_result(result: str) -> bool:
+    """投递结果是否为临时失败（入库出错），需要稍后重试"""
+    return result.startswith('Failed to save email')
+
+
+class SpoolRecord:
+    """队列中的一封邮件（content 为None时按需从段文件读取，size 为记录在段文件中的字节数）"""
+
+    __slots__ = ('segment', 'offset', 'meta', 'content', 'attempts', 'size')
+
+    def __init__(self, segment: int, offset: int, meta: Dict, content: Optional[bytes] = None, size: int = 0):
+        self.segment = segment
+        self.offset = offset
+        self.meta = meta
+        self.content = content
+        self.attempts = 0
+        self.size = size
+
+
+class IngestSpool:
+    def __init__(self, directory: str = None, segment_bytes: int = None, fsync: bool = None,
+                 max_retries: int = None, max_pending_bytes: int = None):
+        """初始化落盘队列（start 之前不会创建任何文件）"""
+        self.directory = directory or config.INGEST_SPOOL_DIR
+        self.segment_bytes = max(1024 * 1024, segment_bytes or config.INGEST_SPOOL_SEGMENT_MB * 1024 * 1024)
+        self.fsync = config.INGEST_SPOOL_FSYNC if fsync is None else fsync
+        self.max_retries = max(1, max_retries or config.INGEST_SPOOL_MAX_RETRIES)
+        self.max_in_flight = max(1, config.INGEST_WORKERS * 2)
+        self.max_pending_bytes = max(1, max_pending_bytes or config.INGEST_SPOOL_MAX_PENDING_MB * 1024 * 1024)
+
+        self.lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._thread = None
+        self._executor = None
+        self._process_fn = None
+
+        # 当前写入的段
+        self._segment = 0
+        self._file = None
+        self._written = 0
+        self._synced = 0
+
+        # 各段的记录数和确认数（段号 -> [记录数, 确认数]）
+        self._segments = {}
+        self._ack_files = {}
+        # 已追加但尚未完成的记录总字节数
+        self._pending_bytes = 0
+
+        # 统计
+        self.appended = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self.replayed = 0
+        self.rejected = 0
+        self.fsyncs = 0
+
+    def _segment_path(self, segment: int, suffix: str = 'log') -> str:
+        return os.path.join(self.directory, f'spool-{segment:06d}.{suffix}')
+
+    def start(self, executor, process_fn):
+        """
+        打开队列并启动后台投递线程
+        executor 为 IngestExecutor，process_fn(content, recipients, spool_id) 为解析入库函数；
+        启动时先把上次未确认的记录重新放入投递队列
+        """
+        with self.lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._executor = executor
+            self._process_fn = process_fn
+
+            os.makedirs(self.directory, exist_ok=True)
+            pending = self._recover()
+            self._pending_bytes += sum(record.size for record in pending)
+            self._open_segment(max(self._segments, default=0) + 1)
+
+        for record in pending:
+            self._queue.put(record)
+        self.replayed += len(pending)
+
+        self._thread = threading.Thread(target=self._drain_loop, name='ingest-spool', daemon=True)
+        self._thread.start()
+        print(f"[Spool] 已启动 - 目录: {self.directory}, fsync: {self.fsync}, 待重放: {len(pending)}")
+
+    def _recover(self) -> List[SpoolRecord]:
+        """扫描已有段文件，返回未确认的记录；全部确认的段直接删除"""
+        pending = []
+        segments = sorted(
+            int(name[6:12]) for name in os.listdir(self.directory)
+            if name.startswith('spool-') and name.endswith('.log')
+        )
+        for segment in segments:
+            acked, partial = self._read_acks(segment)
+            records = list(self._scan_segment(segment))
+            remaining = [record for record in records if record.offset not in acked]
+            for record in remaining:
+                # 只重放上次仍待投递的收件人
+                if record.offset in partial:
+                    record.meta['rcpt_tos'] = partial[record.offset]
+            if remaining:
+                self._segments[segment] = [len(records), len(records) - len(remaining)]
+                pending.extend(remaining)
+            else:
+                self._remove_segment(segment)
+        return pending
+
+    def _read_acks(self, segment: int) -> Tuple[set, Dict[int, List[str]]]:
+        """读取段的确认记录，返回 (已完成的偏移, {部分完成的偏移: 待投递收件人})，忽略不完整的行"""
+        acked = set()
+        partial = {}
+        try:
+            with open(self._segment_path(segment, 'ack'), 'r') as f:
+                for line in f:
+                    offset, _, pending = line.strip().partition(' ')
+                    if not offset.isdigit():
+                        continue
+                    if not pending:
+                        acked.add(int(offset))
+                        continue
+                    try:
+                        partial[int(offset)] = json.loads(pending)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return acked, partial
+
+    def _scan_segment(self, segment: int):
+        """顺序读取段中的完整记录（不读取邮件内容），遇到不完整或损坏的尾部时停止"""
+        with open(self._segment_path(segment), 'rb') as f:
+            while True:
+                offset = f.tell()
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                magic, length, crc = RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if magic != RECORD_MAGIC or len(payload) < length or zlib.crc32(payload) != crc:
+                    print(f"[Spool] 段 {segment} 在偏移 {offset} 处记录不完整，忽略其后的内容")
+                    return
+                meta_length = META_LENGTH.unpack_from(payload)[0]
+                meta = json.loads(payload[META_LENGTH.size:META_LENGTH.size + meta_length].decode('utf-8'))
+                yield SpoolRecord(segment, offset, meta, size=RECORD_HEADER.size + length)
+
+    def _read_content(self, record: SpoolRecord) -> bytes:
+        """从段文件读取记录的原始邮件"""
+        with open(self._segment_path(record.segment), 'rb') as f:
+            f.seek(record.offset)
+            _, length, _ = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            payload = f.read(length)
+        meta_length = META_LENGTH.unpack_from(payload)[0]
+        return payload[META_LENGTH.size + meta_length:]
+
+    def _open_segment(self, segment: int):
+        """切换到新的写入段（调用方持有 self.lock）"""
+        previous = self._segment if self._file is not None else None
+        if previous is not None:
+            # 旧段关闭前先落盘，保证已返回250的记录不会丢失
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._file.close()
+
+        self._segment = segment
+        self._file = open(self._segment_path(segment), 'ab')
+        self._written = 0
+        self._synced = 0
+        self._segments[segment] = [0, 0]
+
+        if previous is not None:
+            self._maybe_remove_segment(previous)
+
+    def append(self, mail_from: str, rcpt_tos: List[str], content: bytes, peer: str = None) -> Optional[SpoolRecord]:
+        """
+        追加一封邮件并落盘，返回后即可向客户端确认
+        多个并发追加共享一次 fsync（组提交）
+        尚未入库的记录总大小超过上限时不追加，返回None
+        """
+        meta = {
+            'id': str(uuid.uuid4()),
+            'mail_from': mail_from,
+            'rcpt_tos': list(rcpt_tos),
+            'peer': peer,
+            'received_at': time.time()
+        }
+        meta_bytes = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+        payload = META_LENGTH.pack(len(meta_bytes)) + meta_bytes + content
+        data = RECORD_HEADER.pack(RECORD_MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+        with self.lock:
+            # 队列为空时总是接受，避免超过上限的单封邮件永远无法投递
+            if self._pending_bytes and self._pending_bytes + len(data) > self.max_pending_bytes:
+                self.rejected += 1
+                return None
+            if self._written and self._written + len(data) > self.segment_bytes:
+                self._open_segment(self._segment + 1)
+            # 不保留邮件内容，投递时再从段文件读取
+            record = SpoolRecord(self._segment, self._written, meta, size=len(data))
+            self._file.write(data)
+            self._file.flush()
+            self._written += len(data)
+            self._segments[self._segment][0] += 1
+            self._pending_bytes += len(data)
+            segment, end = self._segment, self._written
+            self.appended += 1
+
+        self._sync(segment, end)
+        self._queue.put(record)
+        return record
+
+    def _sync(self, segment: int, end: int):
+        """把当前段同步到磁盘；其他线程的 fsync 已覆盖本记录时直接返回"""
+        if not self.fsync:
+            return
+        with self._sync_lock:
+            with self.lock:
+                if segment != self._segment or self._synced >= end:
+                    # 已切换段（切换时旧段已 fsync）或已被其他线程同步
+                    return
+                target = self._written
+                # 复制文件描述符，期间切换段关闭原文件也不影响本次同步
+                fd = os.dup(self._file.fileno())
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            with self.lock:
+                if segment == self._segment:
+                    self._synced = max(self._synced, target)
+                self.fsyncs += 1
+
+    def _write_ack(self, record: SpoolRecord, line: str) -> Optional[int]:
+        """
+        追加一行确认记录（调用方持有 self.lock）
+        需要 fsync 时返回复制的文件描述符，由调用方在锁外同步并关闭，不阻塞追加
+        """
+        ack_file = self._ack_files.get(record.segment)
+        if ack_file is None:
+            ack_file = open(self._segment_path(record.segment, 'ack'), 'a')
+            self._ack_files[record.segment] = ack_file
+        ack_file.write(line)
+        ack_file.flush()
+        return os.dup(ack_file.fileno()) if self.fsync else None
+
+    def _sync_ack(self, fd: Optional[int]):
+        """同步确认记录到磁盘"""
+        if fd is None:
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def ack(self, record: SpoolRecord):
+        """记录已完成并落盘；所在段的记录全部完成且不再写入时删除该段"""
+        with self.lock:
+            fd = self._write_ack(record, f'{record.offset}\n')
+            self._pending_bytes -= record.size
+
+            counts = self._segments.get(record.segment)
+            if counts is not None:
+                counts[1] += 1
+            self._maybe_remove_segment(record.segment)
+        self._sync_ack(fd)
+
+    def ack_partial(self, record: SpoolRecord, pending: List[str]):
+        """记录部分收件人已完成并落盘，崩溃重放时只投递 pending 中的收件人"""
+        with self.lock:
+            fd = self._write_ack(record, f'{record.offset} {json.dumps(pending)}\n')
+        self._sync_ack(fd)
+
+    def _maybe_remove_segment(self, segment: int):
+        """段不再写入且记录全部确认时删除（调用方持有 self.lock）"""
+        counts = self._segments.get(segment)
+        if segment == self._segment or counts is None or counts[1] < counts[0]:
+            return
+        del self._segments[segment]
+        self._remove_segment(segment)
+
+    def _remove_segment(self, segment: int):
+        ack_file = self._ack_files.pop(segment, None)
+        if ack_file is not None:
+            ack_file.close()
+        for suffix in ('log', 'ack'):
+            try:
+                os.remove(self._segment_path(segment, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _drain_loop(self):
+        """投递线程：从队列取出记录交给收件处理池，限制同时处理的数量"""
+        while True:
+            record = self._queue.get()
+            self._slots.acquire()
+            try:
+                content = record.content if record.content is not None else self._read_content(record)
+                future = self._executor.submit_background(self._process_fn, content, record.meta['rcpt_tos'],
+                                                          record.meta['id'])
+            except Exception as e:
+                self._slots.release()
+                self._on_failure(record, e)
+                continue
+            record.content = None
+            future.add_done_callback(lambda f, record=record: self._on_done(record, f))
+
+    def _on_done(self, record: SpoolRecord, future: Future):
+        """处理完成回调：成功则确认，失败则延迟重试"""
+        self._slots.release()
+        error = future.exception()
+        if error is None:
+            # 保存失败（如数据库暂时不可用）的收件人单独重试，其余收件人的结果为最终结果
+            parsed_email, results = future.result()
+            notifier.publish_results(parsed_email, results)
+            retry = [rcpt for rcpt, result in results.items() if is_retryable_result(result)]
+            if not retry:
+                self.ack(record)
+                with self.lock:
+                    self.completed += 1
+                return
+            if len(retry) < len(record.meta['rcpt_tos']):
+                self.ack_partial(record, retry)
+            record.meta['rcpt_tos'] = retry
+            error = RuntimeError(results[retry[0]])
+        self._on_failure(record, error)
+
+    def _on_failure(self, record: SpoolRecord, error: Exception):
+        """投递失败：按指数退避重试，超过重试次数后移到 failed 目录"""
+        record.attempts += 1
+        print(f"[Spool] 邮件 {record.meta['id']} 处理失败（第 {record.attempts} 次）: {error}")
+        if record.attempts < self.max_retries:
+            with self.lock:
+                self.retried += 1
+            timer = threading.Timer(min(60, 2 ** record.attempts), self._queue.put, (record,))
+            timer.daemon = True
+            timer.start()
+            return
+
+        try:
+            failed_dir = os.path.join(self.directory, 'failed')
+            os.makedirs(failed_dir, exist_ok=True)
+            with open(os.path.join(failed_dir, f"{record.meta['id']}.eml"), 'wb') as f:
+                f.write(self._read_content(record))
+            with open(os.path.join(failed_dir, f"{record.meta['id']}.json"), 'w') as f:
+                json.dump(dict(record.meta, error=str(error)), f)
+        except OSError as e:
+            print(f"[Spool] 保存失败邮件 {record.meta['id']} 出错: {e}")
+        self.ack(record)
+        with self.lock:
+            self.failed += 1
+
+    def get_stats(self) -> Dict:
+        """获取队列统计"""
+        with self.lock:
+            pending = sum(total - acked for total, acked in self._segments.values())
+            return {
+                'enabled': self._thread is not None and self._thread.is_alive(),
+                'directory': self.directory,
+                'fsync': self.fsync,
+                'segments': len(self._segments),
+                'pending': pending,
+                'queued': self._queue.qsize(),
+                'pending_bytes': self._pending_bytes,
+                'max_pending_bytes': self.max_pending_bytes,
+                'rejected': self.rejected,
+                'appended': self.appended,
+                'completed': self.completed,
+                'retried': self.retried,
+                'failed': self.failed,
+                'replayed': self.replayed,
+                'fsyncs': self.fsyncs
+            }
+
+
+# 全局落盘队列实例
+spool = IngestSpool()
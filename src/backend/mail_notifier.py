@@ -0,0 +1,154 @@
+"""
+新邮件通知中心
+收件流程在邮件入库后按收件人地址发布事件，/api/stream 的每个连接订阅自己邮箱的事件，
+前端收到事件再拉取列表，用推送代替定时轮询。
+
+SMTP 运行在独立工作进程（SMTP_WORKERS > 0）时，工作进程中的发布无法到达 Web 进程，
+此时由监视线程定期查询已订阅邮箱的邮件序号（每插入一封邮件加一），发现变化再发布事件（只查询有订阅的邮箱）。
+订阅时即记录邮箱当前序号作为基准，订阅之后到达的邮件都会产生事件。
+"""
+
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+import config
+
+
+class MailNotifier:
+    def __init__(self, queue_size: int = 100, poll_interval: float = None):
+        """初始化通知中心"""
+        self.queue_size = queue_size
+        self.poll_interval = max(0.2, config.STREAM_POLL_INTERVAL if poll_interval is None else poll_interval)
+
+        self.lock = threading.Lock()
+        self._subscribers: Dict[str, Set[queue.Queue]] = {}
+
+        # 跨进程监视线程（有订阅时才启动）
+        self._watcher: Optional[threading.Thread] = None
+        self._versions: Dict[str, Tuple] = {}
+
+        # 统计
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, address: str) -> queue.Queue:
+        """订阅邮箱事件，返回事件队列"""
+        subscription = queue.Queue(maxsize=self.queue_size)
+        watching = config.USE_DATABASE and config.SMTP_WORKERS > 0
+        with self.lock:
+            self._subscribers.setdefault(address, set()).add(subscription)
+            need_baseline = watching and address not in self._versions
+            if watching:
+                self._start_watcher()
+
+        if need_baseline:
+            # 在返回前记录基准序号，避免订阅后、监视线程首次查询前到达的邮件没有事件
+            from database import db_manager
+            try:
+                version = db_manager.get_mailbox_versions([address]).get(address, ())
+            except Exception as e:
+                print(f"[Notifier] 查询邮箱状态失败: {e}")
+            else:
+                with self.lock:
+                    if address in self._subscribers:
+                        self._versions.setdefault(address, version)
+        return subscription
+
+    def unsubscribe(self, address: str, subscription: queue.Queue):
+        """取消订阅"""
+        with self.lock:
+            subscriptions = self._subscribers.get(address)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[address]
+                self._versions.pop(address, None)
+
+    def publish(self, address: str, event: Dict):
+        """向邮箱的所有订阅者发布事件；订阅者队列已满（长时间未读取）时丢弃该事件"""
+        with self.lock:
+            subscriptions = list(self._subscribers.get(address, ()))
+            self.published += 1
+        for subscription in subscriptions:
+            try:
+                subscription.put_nowait(event)
+                delivered = True
+            except queue.Full:
+                delivered = False
+            with self.lock:
+                if delivered:
+                    self.delivered += 1
+                else:
+                    self.dropped += 1
+
+    def publish_results(self, parsed_email: Dict, results: Dict[str, str]):
+        """按投递结果向投递成功的收件人发布新邮件事件（多收件人时各自的邮件ID不同，事件中不包含ID）"""
+        event = {
+            'type': 'email',
+            'From': parsed_email.get('From'),
+            'Subject': parsed_email.get('Subject'),
+            'Timestamp': parsed_email.get('Timestamp')
+        }
+        for rcpt, result in results.items():
+            if result == "Email accepted":
+                self.publish(rcpt, dict(event, To=rcpt))
+
+    def subscriber_count(self) -> int:
+        """当前订阅连接数"""
+        with self.lock:
+            return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    def _start_watcher(self):
+        """启动跨进程监视线程（调用方持有锁）"""
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch_loop, name='mail-notifier-watch', daemon=True)
+        self._watcher.start()
+
+    def _watch_loop(self):
+        """定期比较已订阅邮箱的邮件序号和邮件数，有变化时发布事件"""
+        from database import db_manager
+        while True:
+            time.sleep(self.poll_interval)
+            with self.lock:
+                addresses: List[str] = list(self._subscribers)
+            if not addresses:
+                continue
+            try:
+                versions = db_manager.get_mailbox_versions(addresses)
+            except Exception as e:
+                print(f"[Notifier] 查询邮箱状态失败: {e}")
+                continue
+
+            changed = []
+            with self.lock:
+                for address in addresses:
+                    if address not in self._subscribers:
+                        continue
+                    # 邮箱不存在时记为空元组，之后创建并收到邮件也算变化
+                    version = versions.get(address, ())
+                    previous = self._versions.get(address)
+                    self._versions[address] = version
+                    if previous is not None and version != previous:
+                        changed.append(address)
+            for address in changed:
+                self.publish(address, {'type': 'changed', 'To': address})
+
+    def get_stats(self) -> Dict:
+        """获取通知统计"""
+        with self.lock:
+            return {
+                'subscribers': sum(len(subscriptions) for subscriptions in self._subscribers.values()),
+                'addresses': len(self._subscribers),
+                'published': self.published,
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+                'watching': self._watcher is not None
+            }
+
+
+# 全局通知中心实例
+notifier = MailNotifier()
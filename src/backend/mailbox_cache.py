@@ -0,0 +1,92 @@
+"""
+邮箱元数据缓存
+按地址缓存邮箱信息（包括"不存在"的结果），供SMTP信封阶段快速判断收件人是否可投递
+写操作后需要调用 invalidate 使缓存失效
+"""
+
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+# 缓存未命中的标记
+MISS = object()
+
+
+class MailboxCache:
+    def __init__(self, ttl: float = 30, negative_ttl: float = 5, max_entries: int = 10000):
+        """初始化缓存"""
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        # address -> (过期时间, 邮箱信息或None)
+        self.entries: "OrderedDict[str, Tuple[float, Optional[Dict]]]" = OrderedDict()
+        # mailbox_id -> address，用于按ID失效
+        self.addresses_by_id: Dict[str, str] = {}
+        self.lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, address: str):
+        """获取缓存的邮箱信息，未命中时返回 MISS，邮箱不存在时返回 None"""
+        with self.lock:
+            entry = self.entries.get(address)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return MISS
+
+            self.entries.move_to_end(address)
+            self.hits += 1
+            mailbox = entry[1]
+            return dict(mailbox) if mailbox is not None else None
+
+    def put(self, address: str, mailbox: Optional[Dict]):
+        """写入缓存，mailbox为None表示邮箱不存在"""
+        ttl = self.ttl if mailbox is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+
+        with self.lock:
+            self._discard(address)
+            self.entries[address] = (time.monotonic() + ttl, dict(mailbox) if mailbox is not None else None)
+            if mailbox is not None:
+                self.addresses_by_id[mailbox['id']] = address
+
+            # 超出容量时淘汰最久未使用的条目
+            while len(self.entries) > self.max_entries:
+                oldest = next(iter(self.entries))
+                self._discard(oldest)
+
+    def invalidate(self, address: str = None, mailbox_id: str = None):
+        """使指定地址或邮箱ID的缓存失效"""
+        with self.lock:
+            if mailbox_id is not None and address is None:
+                address = self.addresses_by_id.get(mailbox_id)
+            if address is not None:
+                self._discard(address)
+            self.invalidations += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self.entries.clear()
+            self.addresses_by_id.clear()
+            self.invalidations += 1
+
+    def _discard(self, address: str):
+        """删除条目（调用方需持有锁）"""
+        entry = self.entries.pop(address, None)
+        if entry is not None and entry[1] is not None:
+            self.addresses_by_id.pop(entry[1]['id'], None)
+
+    def get_stats(self) -> Dict:
+        """获取缓存统计信息"""
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations
+            }
@@ -9,6 +9,7 @@ import json
 import re
 from typing import Dict, List, Optional, Tuple
 from database import DatabaseManager
+from pagination import encode_cursor, decode_cursor
 import config
 
 class MailboxService:
@@ -75,32 +76,41 @@ class MailboxService:
                 'ip_address': ip_address
             }
             
-            with self.db.get_connection() as conn:
-                conn.execute('''
-                    INSERT INTO audit_logs 
-                    (id, timestamp, action, mailbox_id, admin_user, changes, ip_address)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    str(uuid.uuid4()),
-                    audit_entry['timestamp'],
-                    audit_entry['action'],
-                    audit_entry['mailbox_id'],
-                    audit_entry['admin_user'],
-                    json.dumps(audit_entry['changes']),
-                    audit_entry['ip_address']
-                ))
-                conn.commit()
+            # 审计日志不阻塞调用方，随写线程的下一批次提交
+            future = self.db.submit_write(lambda conn: conn.execute('''
+                INSERT INTO audit_logs 
+                (id, timestamp, action, mailbox_id, admin_user, changes, ip_address)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                str(uuid.uuid4()),
+                audit_entry['timestamp'],
+                audit_entry['action'],
+                audit_entry['mailbox_id'],
+                audit_entry['admin_user'],
+                json.dumps(audit_entry['changes']),
+                audit_entry['ip_address']
+            )))
+            future.add_done_callback(self._on_audit_written)
         except Exception as e:
             print(f"审计日志记录失败: {e}")
+
+    def _on_audit_written(self, future):
+        """审计日志提交完成回调"""
+        if future.exception() is not None:
+            print(f"审计日志记录失败: {future.exception()}")
     
     def list_mailboxes(self, page: int = 1, page_size: int = 20,
-                      search: str = None, status: str = None, source: str = None) -> Dict:
+                      search: str = None, status: str = None, source: str = None,
+                      cursor: str = None) -> Dict:
         """
         获取邮箱列表（分页）
         status: 'active', 'expired', 'disabled', 'all'
         source: 'admin', 'register', 'api_v2', 'unknown', 'all'
+        cursor: 不为None时使用游标分页（按 (created_at, id) 倒序，空字符串表示第一页），
+                不统计总数，返回 next_cursor；游标无效时抛出ValueError
         """
         offset = (page - 1) * page_size
+        after = decode_cursor(cursor) if cursor is not None else None
         current_time = int(time.time())
 
         # 构建查询条件
@@ -124,28 +134,42 @@ class MailboxService:
             where_clauses.append("created_source = ?")
             params.append(source)
 
+        if after is not None:
+            where_clauses.append("(created_at, id) < (?, ?)")
+            params.extend(after)
+
         where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
-        
+
+        if cursor is not None:
+            # 多取一行用于判断是否还有下一页
+            page_sql = "ORDER BY created_at DESC, id DESC LIMIT ?"
+            page_params = [page_size + 1]
+        else:
+            page_sql = "ORDER BY created_at DESC LIMIT ? OFFSET ?"
+            page_params = [page_size, offset]
+
         with self.db.get_connection() as conn:
-            # 获取总数
-            count_query = f"SELECT COUNT(*) as total FROM mailboxes WHERE {where_sql}"
-            total = conn.execute(count_query, params).fetchone()['total']
-            
-            # 获取数据
+            # 获取总数（游标分页不需要）
+            if cursor is None:
+                count_query = f"SELECT COUNT(*) as total FROM mailboxes WHERE {where_sql}"
+                total = conn.execute(count_query, params).fetchone()['total']
+
+            # 获取数据（邮件计数由触发器维护在邮箱行上，与邮箱信息一次查出）
             query = f'''
                 SELECT id, address, created_at, expires_at, retention_days,
                        is_active, sender_whitelist, whitelist_enabled,
                        created_by_ip, last_accessed, updated_by_admin, updated_at,
-                       created_source
+                       created_source, email_count, unread_count
                 FROM mailboxes
                 WHERE {where_sql}
-                ORDER BY created_at DESC
-                LIMIT ? OFFSET ?
+                {page_sql}
             '''
-            params.extend([page_size, offset])
-            
-            cursor = conn.execute(query, params)
-            rows = cursor.fetchall()
+            rows = conn.execute(query, params + page_params).fetchall()
+
+            next_key = None
+            if cursor is not None and len(rows) > page_size:
+                rows = rows[:page_size]
+                next_key = (rows[-1]['created_at'], rows[-1]['id'])
 
             # 安全获取字段值的辅助函数
             def safe_get(row, key, default=None):
@@ -156,9 +180,6 @@ class MailboxService:
 
             mailboxes = []
             for row in rows:
-                # 获取邮件统计
-                stats = self.db.get_mailbox_stats(row['id'])
-
                 mailboxes.append({
                     'id': row['id'],
                     'address': row['address'],
@@ -174,10 +195,17 @@ class MailboxService:
                     'updated_by_admin': safe_get(row, 'updated_by_admin'),
                     'updated_at': safe_get(row, 'updated_at'),
                     'created_source': safe_get(row, 'created_source', 'unknown'),
-                    'email_count': stats['total_emails'],
-                    'unread_count': stats['unread_emails']
+                    'email_count': row['email_count'] or 0,
+                    'unread_count': row['unread_count'] or 0
                 })
-            
+
+            if cursor is not None:
+                return {
+                    'mailboxes': mailboxes,
+                    'page_size': page_size,
+                    'next_cursor': encode_cursor(next_key)
+                }
+
             return {
                 'mailboxes': mailboxes,
                 'total': total,
@@ -197,7 +225,8 @@ class MailboxService:
             if not row:
                 return None
 
-            stats = self.db.get_mailbox_stats(mailbox_id)
+            # 计数字段已在邮箱行上，不再单独查询统计
+            stats = self.db._format_mailbox_stats(row)
             current_time = int(time.time())
 
             # 安全获取字段值，兼容旧数据库
@@ -303,82 +332,82 @@ class MailboxService:
         changes = {}
 
         try:
-            with self.db.get_connection() as conn:
-                update_fields = []
-                params = []
-
-                # 更新保留天数
-                if 'retention_days' in updates:
-                    new_days = updates['retention_days']
-                    valid, msg = self._validate_retention_days(new_days)
-                    if not valid:
-                        return False, msg
-
-                    # 重新计算过期时间
-                    current_time = int(time.time())
-                    new_expires_at = current_time + (new_days * 24 * 60 * 60)
-
-                    update_fields.extend(['retention_days = ?', 'expires_at = ?'])
-                    params.extend([new_days, new_expires_at])
-                    changes['retention_days'] = {'old': mailbox['retention_days'], 'new': new_days}
-
-                # 更新白名单
-                if 'sender_whitelist' in updates:
-                    new_whitelist = updates['sender_whitelist']
-                    valid, msg = self._validate_sender_whitelist(new_whitelist)
-                    if not valid:
-                        return False, msg
-
-                    update_fields.append('sender_whitelist = ?')
-                    params.append(json.dumps(new_whitelist))
-                    changes['sender_whitelist'] = {
-                        'old': mailbox['sender_whitelist'],
-                        'new': new_whitelist
-                    }
-
-                # 更新白名单启用状态
-                if 'whitelist_enabled' in updates:
-                    new_enabled = bool(updates['whitelist_enabled'])
-                    update_fields.append('whitelist_enabled = ?')
-                    params.append(new_enabled)
-                    changes['whitelist_enabled'] = {
-                        'old': mailbox['whitelist_enabled'],
-                        'new': new_enabled
-                    }
-
-                # 更新激活状态
-                if 'is_active' in updates:
-                    new_active = bool(updates['is_active'])
-                    update_fields.append('is_active = ?')
-                    params.append(new_active)
-                    changes['is_active'] = {
-                        'old': mailbox['is_active'],
-                        'new': new_active
-                    }
-
-                # 更新允许的域名
-                if 'allowed_domains' in updates:
-                    new_domains = updates['allowed_domains']
-                    update_fields.append('allowed_domains = ?')
-                    params.append(json.dumps(new_domains))
-                    old_domains = mailbox.get('allowed_domains', [])
-                    changes['allowed_domains'] = {
-                        'old': old_domains,
-                        'new': new_domains
-                    }
-
-                if not update_fields:
-                    return False, "没有需要更新的字段"
-
-                # 添加更新元数据
-                update_fields.extend(['updated_by_admin = ?', 'updated_at = ?'])
-                params.extend([admin_user or 'system', int(time.time())])
-
-                # 执行更新
-                params.append(mailbox_id)
-                sql = f"UPDATE mailboxes SET {', '.join(update_fields)} WHERE id = ?"
-                conn.execute(sql, params)
-                conn.commit()
+            update_fields = []
+            params = []
+
+            # 更新保留天数
+            if 'retention_days' in updates:
+                new_days = updates['retention_days']
+                valid, msg = self._validate_retention_days(new_days)
+                if not valid:
+                    return False, msg
+
+                # 重新计算过期时间
+                current_time = int(time.time())
+                new_expires_at = current_time + (new_days * 24 * 60 * 60)
+
+                update_fields.extend(['retention_days = ?', 'expires_at = ?'])
+                params.extend([new_days, new_expires_at])
+                changes['retention_days'] = {'old': mailbox['retention_days'], 'new': new_days}
+
+            # 更新白名单
+            if 'sender_whitelist' in updates:
+                new_whitelist = updates['sender_whitelist']
+                valid, msg = self._validate_sender_whitelist(new_whitelist)
+                if not valid:
+                    return False, msg
+
+                update_fields.append('sender_whitelist = ?')
+                params.append(json.dumps(new_whitelist))
+                changes['sender_whitelist'] = {
+                    'old': mailbox['sender_whitelist'],
+                    'new': new_whitelist
+                }
+
+            # 更新白名单启用状态
+            if 'whitelist_enabled' in updates:
+                new_enabled = bool(updates['whitelist_enabled'])
+                update_fields.append('whitelist_enabled = ?')
+                params.append(new_enabled)
+                changes['whitelist_enabled'] = {
+                    'old': mailbox['whitelist_enabled'],
+                    'new': new_enabled
+                }
+
+            # 更新激活状态
+            if 'is_active' in updates:
+                new_active = bool(updates['is_active'])
+                update_fields.append('is_active = ?')
+                params.append(new_active)
+                changes['is_active'] = {
+                    'old': mailbox['is_active'],
+                    'new': new_active
+                }
+
+            # 更新允许的域名
+            if 'allowed_domains' in updates:
+                new_domains = updates['allowed_domains']
+                update_fields.append('allowed_domains = ?')
+                params.append(json.dumps(new_domains))
+                old_domains = mailbox.get('allowed_domains', [])
+                changes['allowed_domains'] = {
+                    'old': old_domains,
+                    'new': new_domains
+                }
+
+            if not update_fields:
+                return False, "没有需要更新的字段"
+
+            # 添加更新元数据
+            update_fields.extend(['updated_by_admin = ?', 'updated_at = ?'])
+            params.extend([admin_user or 'system', int(time.time())])
+
+            # 执行更新
+            params.append(mailbox_id)
+            sql = f"UPDATE mailboxes SET {', '.join(update_fields)} WHERE id = ?"
+            self.db.write(lambda conn: conn.execute(sql, params))
+
+            self.db.invalidate_mailbox_cache(address=mailbox['address'])
 
             # 记录审计日志
             self._log_audit(
@@ -408,28 +437,29 @@ class MailboxService:
         try:
             if soft_delete:
                 # 软删除
-                with self.db.get_connection() as conn:
-                    conn.execute('''
-                        UPDATE mailboxes
-                        SET is_active = 0, updated_by_admin = ?, updated_at = ?
-                        WHERE id = ?
-                    ''', (admin_user or 'system', int(time.time()), mailbox_id))
-                    conn.commit()
+                self.db.write(lambda conn: conn.execute('''
+                    UPDATE mailboxes
+                    SET is_active = 0, updated_by_admin = ?, updated_at = ?
+                    WHERE id = ?
+                ''', (admin_user or 'system', int(time.time()), mailbox_id)))
 
                 action = 'SOFT_DELETE'
                 message = "邮箱已禁用"
             else:
                 # 硬删除
-                with self.db.get_connection() as conn:
+                def _delete(conn):
                     # 删除邮件
                     conn.execute('DELETE FROM emails WHERE mailbox_id = ?', (mailbox_id,))
                     # 删除邮箱
                     conn.execute('DELETE FROM mailboxes WHERE id = ?', (mailbox_id,))
-                    conn.commit()
+
+                self.db.write(_delete)
 
                 action = 'HARD_DELETE'
                 message = "邮箱已删除"
 
+            self.db.invalidate_mailbox_cache(address=mailbox['address'])
+
             # 记录审计日志
             self._log_audit(
                 action=action,
@@ -0,0 +1,521 @@
+"""
+数据库结构版本迁移
+每个迁移步骤有一个递增的版本号，已执行的版本记录在 schema_version 表中。
+启动时只执行未执行过的步骤，每个步骤在单独的事务中执行并写入版本记录。
+早于版本表的旧数据库第一次升级时会把所有步骤执行一遍，因此步骤需要能在已有结构上重复执行
+"""
+
+import sqlite3
+import time
+from typing import Callable, Dict, List, Tuple
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    """表的列名"""
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})').fetchall()]
+
+
+def _add_column(conn: sqlite3.Connection, table: str, column: str, definition: str) -> bool:
+    """列不存在时添加，返回是否添加"""
+    if column in _columns(conn, table):
+        return False
+    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    print(f"Added {column} column to {table} table")
+    return True
+
+
+def _create_base_tables(conn: sqlite3.Connection, db):
+    """基础表和索引"""
+    # 用户表
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT,
+            password_hash TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            created_by_ip TEXT,
+            is_active BOOLEAN DEFAULT 1,
+            last_login INTEGER
+        )
+    ''')
+
+    # 用户邮箱关联表
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users_mailboxes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            mailbox_id TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+            FOREIGN KEY (mailbox_id) REFERENCES mailboxes (id) ON DELETE CASCADE,
+            UNIQUE(user_id, mailbox_id)
+        )
+    ''')
+
+    # 邮箱表
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS mailboxes (
+            id TEXT PRIMARY KEY,
+            address TEXT UNIQUE NOT NULL,
+            created_at INTEGER NOT NULL,
+            expires_at INTEGER NOT NULL,
+            retention_days INTEGER DEFAULT 7,
+            is_active BOOLEAN DEFAULT 1,
+            sender_whitelist TEXT DEFAULT '[]',
+            whitelist_enabled BOOLEAN DEFAULT 0,
+            created_by_ip TEXT,
+            access_token TEXT,
+            last_accessed INTEGER
+        )
+    ''')
+
+    # 邮件表
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS emails (
+            id TEXT PRIMARY KEY,
+            mailbox_id TEXT NOT NULL,
+            from_address TEXT NOT NULL,
+            to_address TEXT NOT NULL,
+            subject TEXT,
+            body TEXT,
+            content_type TEXT DEFAULT 'Text',
+            timestamp INTEGER NOT NULL,
+            sent_formatted TEXT,
+            is_read BOOLEAN DEFAULT 0,
+            FOREIGN KEY (mailbox_id) REFERENCES mailboxes (id) ON DELETE CASCADE
+        )
+    ''')
+
+    # 邀请码表
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS invite_codes (
+            id TEXT PRIMARY KEY,
+            code TEXT UNIQUE NOT NULL,
+            created_by INTEGER,
+            created_at INTEGER NOT NULL,
+            expires_at INTEGER,
+            is_used BOOLEAN DEFAULT 0,
+            used_by INTEGER,
+            used_at INTEGER,
+            max_uses INTEGER DEFAULT 1,
+            current_uses INTEGER DEFAULT 0,
+            FOREIGN KEY (created_by) REFERENCES users (id) ON DELETE SET NULL,
+            FOREIGN KEY (used_by) REFERENCES users (id) ON DELETE SET NULL
+        )
+    ''')
+
+    # 审计日志表
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS audit_logs (
+            id TEXT PRIMARY KEY,
+            timestamp INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            mailbox_id TEXT,
+            admin_user TEXT,
+            changes TEXT,
+            ip_address TEXT,
+            FOREIGN KEY (mailbox_id) REFERENCES mailboxes (id) ON DELETE SET NULL
+        )
+    ''')
+
+    # 子管理员表
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sub_admins (
+            id TEXT PRIMARY KEY,
+            token TEXT UNIQUE NOT NULL,
+            domains TEXT NOT NULL,
+            sender_whitelist TEXT,
+            max_retention_days INTEGER DEFAULT 30,
+            created_at INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL,
+            is_active INTEGER DEFAULT 1,
+            created_by TEXT,
+            notes TEXT
+        )
+    ''')
+
+    # 创建索引
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_mailboxes_address ON mailboxes (address)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_mailboxes_expires ON mailboxes (expires_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_emails_mailbox ON emails (mailbox_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_emails_timestamp ON emails (timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_invite_codes_code ON invite_codes (code)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_invite_codes_used ON invite_codes (is_used)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_audit_logs_mailbox ON audit_logs (mailbox_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_audit_logs_timestamp ON audit_logs (timestamp)')
+
+
+def _add_mailbox_columns(conn: sqlite3.Connection, db):
+    """邮箱密钥、白名单、来源、管理员更新、容量限制等字段，以及邮件大小字段"""
+    _add_column(conn, 'mailboxes', 'mailbox_key', 'TEXT')
+    _add_column(conn, 'mailboxes', 'whitelist_enabled', 'BOOLEAN DEFAULT 0')
+    _add_column(conn, 'mailboxes', 'created_source', 'TEXT DEFAULT "unknown"')
+    _add_column(conn, 'mailboxes', 'updated_by_admin', 'TEXT')
+    _add_column(conn, 'mailboxes', 'updated_at', 'INTEGER')
+    _add_column(conn, 'mailboxes', 'allowed_domains', 'TEXT DEFAULT "[]"')
+    _add_column(conn, 'mailboxes', 'storage_used', 'INTEGER DEFAULT 0')
+    _add_column(conn, 'mailboxes', 'storage_limit', 'INTEGER DEFAULT 3145728')  # 默认3MB
+    _add_column(conn, 'emails', 'size_bytes', 'INTEGER DEFAULT 0')
+
+    # 旧版本默认50MB的邮箱容量限制统一改为3MB
+    cursor = conn.execute('UPDATE mailboxes SET storage_limit = 3145728 WHERE storage_limit = 52428800 OR storage_limit IS NULL')
+    if cursor.rowcount:
+        print(f"Updated {cursor.rowcount} mailboxes storage_limit to 3MB")
+
+
+def _rebuild_sub_admins(conn: sqlite3.Connection, db):
+    """重建 sub_admins 表（去掉 password_hash，添加 sender_whitelist、max_retention_days）"""
+    columns = _columns(conn, 'sub_admins')
+
+    if 'password_hash' not in columns:
+        _add_column(conn, 'sub_admins', 'sender_whitelist', 'TEXT')
+        _add_column(conn, 'sub_admins', 'max_retention_days', 'INTEGER DEFAULT 30')
+        return
+
+    print("数据库迁移：开始重建 sub_admins 表...")
+
+    # 1. 备份现有数据
+    old_data = conn.execute(
+        'SELECT id, token, domains, created_at, updated_at, is_active, created_by, notes FROM sub_admins'
+    ).fetchall()
+
+    # 2. 删除旧表
+    conn.execute('DROP TABLE sub_admins')
+
+    # 3. 创建新表
+    conn.execute('''
+        CREATE TABLE sub_admins (
+            id TEXT PRIMARY KEY,
+            token TEXT UNIQUE NOT NULL,
+            domains TEXT NOT NULL,
+            sender_whitelist TEXT,
+            max_retention_days INTEGER DEFAULT 30,
+            created_at INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL,
+            is_active INTEGER DEFAULT 1,
+            created_by TEXT,
+            notes TEXT
+        )
+    ''')
+
+    # 4. 恢复数据（不包括 password_hash）
+    conn.executemany('''
+        INSERT INTO sub_admins (id, token, domains, sender_whitelist, max_retention_days, created_at, updated_at, is_active, created_by, notes)
+        VALUES (?, ?, ?, NULL, 30, ?, ?, ?, ?, ?)
+    ''', [tuple(row) for row in old_data])
+
+    print(f"数据库迁移：成功重建 sub_admins 表，迁移了 {len(old_data)} 条记录")
+
+
+def _add_email_bodies(conn: sqlite3.Connection, db):
+    """邮件正文表：多收件人投递时正文只存一份，由各邮箱的邮件记录引用"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS email_bodies (
+            id TEXT PRIMARY KEY,
+            body TEXT,
+            size_bytes INTEGER DEFAULT 0,
+            ref_count INTEGER DEFAULT 0,
+            created_at INTEGER NOT NULL
+        )
+    ''')
+    _add_column(conn, 'emails', 'body_id', 'TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_emails_body ON emails (body_id)')
+
+    # 正文引用计数：插入邮件时加一，删除邮件时减一，无引用时删除正文
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_emails_body_ref_insert
+        AFTER INSERT ON emails
+        WHEN NEW.body_id IS NOT NULL
+        BEGIN
+            UPDATE email_bodies SET ref_count = ref_count + 1 WHERE id = NEW.body_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_emails_body_ref_delete
+        AFTER DELETE ON emails
+        WHEN OLD.body_id IS NOT NULL
+        BEGIN
+            UPDATE email_bodies SET ref_count = ref_count - 1 WHERE id = OLD.body_id;
+            DELETE FROM email_bodies WHERE id = OLD.body_id AND ref_count <= 0;
+        END
+    ''')
+
+
+def _add_mailbox_counters(conn: sqlite3.Connection, db):
+    """邮箱计数字段及维护计数的触发器"""
+    counters_added = False
+    for column, definition in (('email_count', 'INTEGER DEFAULT 0'),
+                               ('unread_count', 'INTEGER DEFAULT 0'),
+                               ('last_email_time', 'INTEGER')):
+        counters_added = _add_column(conn, 'mailboxes', column, definition) or counters_added
+
+    # 邮件数、未读数、最新邮件时间、已用容量随邮件的增删改在同一事务中更新
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_emails_counters_insert
+        AFTER INSERT ON emails
+        BEGIN
+            UPDATE mailboxes SET
+                email_count = email_count + 1,
+                unread_count = unread_count + (NEW.is_read = 0),
+                last_email_time = MAX(COALESCE(last_email_time, 0), NEW.timestamp),
+                storage_used = storage_used + COALESCE(NEW.size_bytes, 0)
+            WHERE id = NEW.mailbox_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_emails_counters_delete
+        AFTER DELETE ON emails
+        BEGIN
+            UPDATE mailboxes SET
+                email_count = MAX(0, email_count - 1),
+                unread_count = MAX(0, unread_count - (OLD.is_read = 0)),
+                last_email_time = (SELECT MAX(timestamp) FROM emails WHERE mailbox_id = OLD.mailbox_id),
+                storage_used = MAX(0, storage_used - COALESCE(OLD.size_bytes, 0))
+            WHERE id = OLD.mailbox_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_emails_counters_read
+        AFTER UPDATE OF is_read ON emails
+        WHEN (OLD.is_read = 0) != (NEW.is_read = 0)
+        BEGIN
+            UPDATE mailboxes SET
+                unread_count = MAX(0, unread_count + (NEW.is_read = 0) - (OLD.is_read = 0))
+            WHERE id = NEW.mailbox_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_emails_counters_size
+        AFTER UPDATE OF size_bytes ON emails
+        WHEN COALESCE(OLD.size_bytes, 0) != COALESCE(NEW.size_bytes, 0)
+        BEGIN
+            UPDATE mailboxes SET
+                storage_used = MAX(0, storage_used + COALESCE(NEW.size_bytes, 0) - COALESCE(OLD.size_bytes, 0))
+            WHERE id = NEW.mailbox_id;
+        END
+    ''')
+
+    # 首次添加计数字段时，根据现有邮件回填
+    if counters_added:
+        fixed = db._reconcile_counters(conn)
+        print(f"Backfilled counters for {fixed} mailboxes")
+
+
+def _add_pagination_indexes(conn: sqlite3.Connection, db):
+    """游标分页的排序键索引：邮件按 (timestamp, id)，邮箱按 (created_at, id)"""
+    conn.execute('DROP INDEX IF EXISTS idx_emails_mailbox_timestamp')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_emails_mailbox_page ON emails (mailbox_id, timestamp, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_mailboxes_created ON mailboxes (created_at, id)')
+
+
+def _add_token_digests(conn: sqlite3.Connection, db):
+    """令牌摘要列：按摘要查询，唯一索引保证认证是一次B树查找"""
+    _add_column(conn, 'mailboxes', 'access_token_hash', 'TEXT')
+    _add_column(conn, 'mailboxes', 'mailbox_key_hash', 'TEXT')
+    _add_column(conn, 'sub_admins', 'token_hash', 'TEXT')
+
+    # 为已有数据计算摘要
+    db._backfill_token_digests(conn)
+
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_mailboxes_access_token_hash ON mailboxes (access_token_hash)')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_mailboxes_mailbox_key_hash ON mailboxes (mailbox_key_hash)')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_sub_admins_token_hash ON sub_admins (token_hash)')
+
+
+def _move_inline_bodies(conn: sqlite3.Connection, db):
+    """把旧数据中内联在 emails 表的正文移到 email_bodies，并生成列表摘要"""
+    _add_column(conn, 'emails', 'preview', 'TEXT')
+
+    cursor = conn.execute('''
+        INSERT INTO email_bodies (id, body, size_bytes, ref_count, created_at)
+        SELECT 'inline-' || id, body, LENGTH(CAST(body AS BLOB)), 1, timestamp
+        FROM emails
+        WHERE body_id IS NULL AND body IS NOT NULL
+    ''')
+    moved = cursor.rowcount
+    conn.execute('''
+        UPDATE emails SET body_id = 'inline-' || id
+        WHERE body_id IS NULL AND body IS NOT NULL
+    ''')
+    # 正文只保留在 email_bodies 中（旧列保留但置空，空间由 VACUUM 回收）
+    conn.execute('UPDATE emails SET body = NULL WHERE body IS NOT NULL')
+
+    previews = db._backfill_email_previews(conn)
+    print(f"已迁移 {moved} 封邮件的内联正文，生成 {previews} 条邮件摘要")
+
+
+def _add_body_codec(conn: sqlite3.Connection, db):
+    """正文压缩：每行记录编码，压缩后的数据存在 data 列（已有正文由 manage.py recompress 转换）"""
+    _add_column(conn, 'email_bodies', 'codec', "TEXT DEFAULT 'raw'")
+    _add_column(conn, 'email_bodies', 'data', 'BLOB')
+    _add_column(conn, 'email_bodies', 'stored_bytes', 'INTEGER')
+
+
+def _add_email_parts(conn: sqlite3.Connection, db):
+    """附件和内嵌资源：内容按 SHA-256 只存一份，邮件部分通过正文ID引用（同一封邮件的所有收件人共享）"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS blobs (
+            sha256 TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            size_bytes INTEGER DEFAULT 0,
+            ref_count INTEGER DEFAULT 0,
+            created_at INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS email_parts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            body_id TEXT NOT NULL,
+            part_index INTEGER NOT NULL,
+            filename TEXT,
+            content_type TEXT,
+            content_id TEXT,
+            disposition TEXT,
+            size_bytes INTEGER DEFAULT 0,
+            sha256 TEXT NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_email_parts_body ON email_parts (body_id, part_index)')
+    _add_column(conn, 'emails', 'part_count', 'INTEGER DEFAULT 0')
+
+    # 内容引用计数：新增部分时加一，删除部分时减一，无引用时删除内容
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_email_parts_blob_ref_insert
+        AFTER INSERT ON email_parts
+        BEGIN
+            UPDATE blobs SET ref_count = ref_count + 1 WHERE sha256 = NEW.sha256;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_email_parts_blob_ref_delete
+        AFTER DELETE ON email_parts
+        BEGIN
+            UPDATE blobs SET ref_count = ref_count - 1 WHERE sha256 = OLD.sha256;
+            DELETE FROM blobs WHERE sha256 = OLD.sha256 AND ref_count <= 0;
+        END
+    ''')
+    # 正文被删除（最后一封引用它的邮件被删除）时一并删除其邮件部分
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_email_bodies_parts_delete
+        AFTER DELETE ON email_bodies
+        BEGIN
+            DELETE FROM email_parts WHERE body_id = OLD.id;
+        END
+    ''')
+
+
+def _add_body_fingerprint(conn: sqlite3.Connection, db):
+    """跨邮件去重：按正文和附件的内容指纹查找已存储的正文（已有正文不计算指纹）"""
+    _add_column(conn, 'email_bodies', 'fingerprint', 'TEXT')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_email_bodies_fingerprint
+        ON email_bodies (fingerprint) WHERE fingerprint IS NOT NULL
+    ''')
+
+
+def _add_email_spool_id(conn: sqlite3.Connection, db):
+    """落盘队列记录ID：重放同一条记录时按 (邮箱, 记录ID) 去重，不会重复入库"""
+    _add_column(conn, 'emails', 'spool_id', 'TEXT')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_emails_spool_id
+        ON emails (mailbox_id, spool_id) WHERE spool_id IS NOT NULL
+    ''')
+
+
+def _add_mailbox_email_seq(conn: sqlite3.Connection, db):
+    """邮箱邮件序号：每插入一封邮件加一，只增不减，用于判断邮箱是否收到新邮件"""
+    _add_column(conn, 'mailboxes', 'email_seq', 'INTEGER DEFAULT 0')
+    conn.execute('DROP TRIGGER IF EXISTS trg_emails_counters_insert')
+    conn.execute('''
+        CREATE TRIGGER trg_emails_counters_insert
+        AFTER INSERT ON emails
+        BEGIN
+            UPDATE mailboxes SET
+                email_count = email_count + 1,
+                unread_count = unread_count + (NEW.is_read = 0),
+                last_email_time = MAX(COALESCE(last_email_time, 0), NEW.timestamp),
+                storage_used = storage_used + COALESCE(NEW.size_bytes, 0),
+                email_seq = COALESCE(email_seq, 0) + 1
+            WHERE id = NEW.mailbox_id;
+        END
+    ''')
+
+
+# 迁移步骤：(版本号, 说明, 执行函数)，只能在末尾追加，已发布的步骤不要修改
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, '基础表和索引', _create_base_tables),
+    (2, '邮箱扩展字段和邮件大小字段', _add_mailbox_columns),
+    (3, '重建子管理员表', _rebuild_sub_admins),
+    (4, '共享邮件正文表和引用计数触发器', _add_email_bodies),
+    (5, '邮箱计数字段和触发器', _add_mailbox_counters),
+    (6, '游标分页索引', _add_pagination_indexes),
+    (7, '令牌摘要列和唯一索引', _add_token_digests),
+    (8, '正文移出邮件表并生成列表摘要', _move_inline_bodies),
+    (9, '正文压缩编码列', _add_body_codec),
+    (10, '附件内容寻址存储', _add_email_parts),
+    (11, '正文内容指纹', _add_body_fingerprint),
+    (12, '落盘队列记录ID', _add_email_spool_id),
+    (13, '邮箱邮件序号', _add_mailbox_email_seq),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """当前结构版本，没有版本表时为0"""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    ).fetchone()
+    if not exists:
+        return 0
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+
+def get_pending_migrations(conn: sqlite3.Connection) -> List[Tuple[int, str]]:
+    """未执行的迁移步骤 [(版本号, 说明), ...]，只读不修改数据库"""
+    current = get_schema_version(conn)
+    return [(version, description) for version, description, _ in MIGRATIONS if version > current]
+
+
+def apply_migrations(conn: sqlite3.Connection, db) -> List[Dict]:
+    """
+    执行所有未执行的迁移步骤，返回执行记录
+    conn 需要是自动提交模式（isolation_level=None）的连接，每个步骤单独一个事务；
+    多个进程同时启动时，在写事务中重新确认版本，保证每个步骤只执行一次
+    """
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= get_schema_version(conn):
+            continue
+
+        started = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at INTEGER NOT NULL
+                )
+            ''')
+            # 其他进程可能已经执行了这个步骤
+            if version <= get_schema_version(conn):
+                conn.execute('ROLLBACK')
+                continue
+
+            migrate(conn, db)
+            conn.execute(
+                'INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                (version, description, int(time.time()))
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        duration = round(time.time() - started, 3)
+        print(f"数据库迁移：已执行 {version} - {description}（{duration}秒）")
+        applied.append({'version': version, 'description': description, 'duration': duration})
+
+    return applied
@@ -0,0 +1,32 @@
+"""
+游标分页工具
+游标是排序键（如 (created_at, id)）编码后的不透明字符串，
+客户端把上一页返回的 next_cursor 原样传回即可获取下一页
+"""
+
+import base64
+import json
+from typing import Optional, Tuple
+
+
+def encode_cursor(key: Optional[Tuple]) -> Optional[str]:
+    """把排序键编码为游标，没有下一页时返回None"""
+    if key is None:
+        return None
+    raw = json.dumps(list(key), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str], size: int = 2) -> Optional[Tuple]:
+    """解码游标，空游标表示第一页；格式不正确时抛出ValueError"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    if not isinstance(key, list) or len(key) != size:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return tuple(key)
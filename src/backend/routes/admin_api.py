@@ -16,6 +16,10 @@ if backend_dir not in sys.path:
 from database import db_manager
 from mailbox_service import MailboxService
 from ip_blocker import ip_blocker
+from ..db_reaper import reaper
+from ..db_checkpointer import checkpointer
+from ..ingest_spool import spool
+from ..mail_notifier import notifier
 
 bp = Blueprint('admin_api', __name__)
 mailbox_service = MailboxService(db_manager)
@@ -64,19 +68,24 @@ def list_mailboxes():
         search = request.args.get('search', '')
         status = request.args.get('status', 'all')
         source = request.args.get('source', 'all')
+        # 传入cursor参数（可为空）时使用游标分页
+        cursor = request.args.get('cursor')
 
         result = mailbox_service.list_mailboxes(
             page=page,
             page_size=page_size,
             search=search if search else None,
             status=status if status != 'all' else None,
-            source=source if source != 'all' else None
+            source=source if source != 'all' else None,
+            cursor=cursor
         )
 
         return jsonify({
             'success': True,
             'data': result
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -127,11 +136,10 @@ def create_mailbox():
         if success and allowed_domains:
             # 更新允许的域名
             import json
-            with db_manager.get_connection() as conn:
-                conn.execute('''
-                    UPDATE mailboxes SET allowed_domains = ? WHERE id = ?
-                ''', (json.dumps(allowed_domains), mailbox['id']))
-                conn.commit()
+            db_manager.write(lambda conn: conn.execute('''
+                UPDATE mailboxes SET allowed_domains = ? WHERE id = ?
+            ''', (json.dumps(allowed_domains), mailbox['id'])))
+            db_manager.invalidate_mailbox_cache(mailbox_id=mailbox['id'])
 
         if success:
             return jsonify({
@@ -294,12 +302,47 @@ def get_stats():
                     'expired_mailboxes': expired_mailboxes,
                     'disabled_mailboxes': disabled_mailboxes,
                     'total_emails': total_emails,
-                    'unread_emails': unread_emails
+                    'unread_emails': unread_emails,
+                    'reaper': reaper.get_stats(),
+                    'spool': spool.get_stats(),
+                    'stream': notifier.get_stats()
                 }
             })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@bp.route('/db-health', methods=['GET'])
+def get_db_health():
+    """获取数据库连接池、写线程和WAL检查点的健康状态"""
+    auth_ok, error_msg = check_admin_auth()
+    if not auth_ok:
+        return jsonify({'success': False, 'error': error_msg or '未授权'}), 401
+
+    try:
+        health = db_manager.get_health()
+        health['checkpointer'] = checkpointer.get_stats()
+        return jsonify({
+            'success': health['check']['ok'],
+            'data': health
+        }), 200 if health['check']['ok'] else 503
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/storage/dedup', methods=['GET'])
+def get_dedup_stats():
+    """获取邮件正文和附件的去重统计"""
+    auth_ok, error_msg = check_admin_auth()
+    if not auth_ok:
+        return jsonify({'success': False, 'error': error_msg or '未授权'}), 401
+
+    try:
+        return jsonify({
+            'success': True,
+            'data': db_manager.get_dedup_stats()
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @bp.route('/mailboxes/batch-delete', methods=['POST'])
 def batch_delete_mailboxes():
     """批量删除邮箱"""
@@ -351,15 +394,8 @@ def reset_mailbox_token(mailbox_id):
         return jsonify({'success': False, 'error': error_msg or '未授权'}), 401
 
     try:
-        import uuid
-        new_token = str(uuid.uuid4())
-
-        # 更新数据库中的token
-        with db_manager.get_connection() as conn:
-            conn.execute('''
-                UPDATE mailboxes SET access_token = ? WHERE id = ?
-            ''', (new_token, mailbox_id))
-            conn.commit()
+        # 更新数据库中的token（同时更新摘要）
+        new_token = db_manager.reset_access_token(mailbox_id)
 
         # 记录审计日志
         mailbox_service._log_audit(
@@ -389,11 +425,11 @@ def enable_mailbox(mailbox_id):
         return jsonify({'success': False, 'error': error_msg or '未授权'}), 401
 
     try:
-        with db_manager.get_connection() as conn:
-            conn.execute('''
-                UPDATE mailboxes SET is_active = 1 WHERE id = ?
-            ''', (mailbox_id,))
-            conn.commit()
+        db_manager.write(lambda conn: conn.execute('''
+            UPDATE mailboxes SET is_active = 1 WHERE id = ?
+        ''', (mailbox_id,)))
+        # 禁用的邮箱不会进入缓存，按ID无法定位，直接清空
+        db_manager.invalidate_mailbox_cache()
 
         # 记录审计日志
         mailbox_service._log_audit(
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, Response, request, jsonify, render_template
 import config
 
 # 根据配置选择使用数据库还是JSON文件
@@ -22,6 +22,10 @@ import random
 import string
 import os
 import time
+import json
+import queue
+from urllib.parse import quote
+from ..mail_notifier import notifier
 
 bp = Blueprint('api', __name__)
 
@@ -311,7 +315,7 @@ def get_mailbox_token():
                 return jsonify({"error": "Mailbox has expired"}), 410
 
             # 验证邮箱密钥
-            if mailbox_info['mailbox_key'] != mailbox_key:
+            if not inbox_handler.verify_mailbox_key(address, mailbox_key):
                 return jsonify({"error": "Invalid mailbox key"}), 401
 
             return jsonify({
@@ -367,21 +371,17 @@ def user_login():
 
             # 更新最后登录时间
             current_time = int(time.time())
-            with db_manager.get_connection() as conn:
-                conn.execute('''
-                    UPDATE users SET last_login = ? WHERE id = ?
-                ''', (current_time, user['id']))
-                conn.commit()
+            db_manager.write(lambda conn: conn.execute('''
+                UPDATE users SET last_login = ? WHERE id = ?
+            ''', (current_time, user['id'])))
 
-            # 获取用户的所有邮箱
+            # 获取用户的所有邮箱（邮件计数随邮箱一次查出）
             mailboxes = db_manager.get_user_mailboxes(user['id'])
 
             # 过滤掉过期和非活跃的邮箱
             active_mailboxes = []
             for mailbox in mailboxes:
                 if not db_manager.is_mailbox_expired(mailbox) and mailbox.get('is_active', True):
-                    # 获取邮箱统计信息
-                    stats = db_manager.get_mailbox_stats(mailbox['id'])
                     mailbox_info = {
                         'id': mailbox['id'],
                         'address': mailbox['address'],
@@ -392,9 +392,9 @@ def user_login():
                         'sender_whitelist': mailbox['sender_whitelist'],
                         'whitelist_enabled': mailbox.get('whitelist_enabled', False),
                         'is_active': mailbox.get('is_active', True),
-                        'email_count': stats['total_emails'],
-                        'unread_count': stats['unread_emails'],
-                        'last_email_time': stats['last_email_time']
+                        'email_count': mailbox['email_count'],
+                        'unread_count': mailbox['unread_count'],
+                        'last_email_time': mailbox['last_email_time']
                     }
                     active_mailboxes.append(mailbox_info)
 
@@ -914,11 +914,8 @@ def get_inbox():
         if config.USE_DATABASE:
             # 数据库模式 - 支持双重认证
             if access_token:
-                # Token认证模式：直接使用token获取的邮箱信息
-                from database import db_manager
-                mailbox = db_manager.get_mailbox_by_token(access_token)
-                if not mailbox:
-                    return jsonify({"error": "Invalid access token"}), 401
+                # Token认证模式：直接使用认证阶段按令牌查到的邮箱信息
+                pass
             else:
                 # 管理员密码认证模式：通过地址获取邮箱信息
                 mailbox_info = inbox_handler.get_mailbox_info(addr)
@@ -940,20 +937,27 @@ def get_inbox():
                     'is_active': mailbox_info.get('is_active', True)
                 }
 
+            # 列表默认只返回元数据和摘要（Preview），正文通过 /api/get_email 按需获取；
+            # 传入 include_body=true 时一并返回正文
+            include_body = request.args.get('include_body', '').lower() == 'true'
+
+            # 传入cursor或limit参数时按 (timestamp, id) 游标分页，返回 {emails, next_cursor}
+            if 'cursor' in request.args or 'limit' in request.args:
+                try:
+                    limit = int(request.args.get('limit', config.INBOX_PAGE_SIZE))
+                    limit = max(1, min(limit, config.INBOX_PAGE_SIZE_MAX))
+                    emails, next_cursor = inbox_handler.get_emails_page(
+                        mailbox['id'], limit, request.args.get('cursor'), include_body)
+                except ValueError as e:
+                    return jsonify({"error": "Invalid pagination parameters", "message": str(e)}), 400
+                return jsonify({'emails': emails, 'next_cursor': next_cursor}), 200
+
             # 获取邮件列表
-            emails = inbox_handler.get_emails_by_mailbox(mailbox['id'])
+            emails = inbox_handler.get_emails_by_mailbox(mailbox['id'], include_body=include_body)
             return jsonify(emails), 200
         else:
-            # JSON文件模式（原有逻辑）
-            # inbox = inbox_handler.read_inbox()  # 注释掉这行，因为数据库模式不需要
-
-            # Clean expired emails and mailboxes before returning
-            inbox = inbox_handler.clean_expired_emails(inbox)
-            inbox = inbox_handler.clean_expired_mailboxes(inbox)
-            inbox_handler.write_inbox(inbox)
-
-            # Get mailbox data
-            mailbox_data = inbox.get(addr, {})
+            # JSON文件模式：从内存读取，过期数据由后台清理任务删除
+            mailbox_data = inbox_handler.get_mailbox(addr)
             print(f"[DEBUG] Getting inbox for {addr}, found: {type(mailbox_data)}")
 
             if not mailbox_data:
@@ -990,11 +994,22 @@ def get_email():
     if not addr or not email_id:
         return jsonify({"error": "Missing address or email ID"}), 400
 
+    if config.USE_DATABASE:
+        # 数据库模式：与 get_inbox 相同的认证方式，正文按需从正文表读取
+        from database import db_manager
+        mailbox, error = _authorize_db_mailbox(addr, password)
+        if error:
+            return error
+
+        email = db_manager.get_email_by_id(email_id)
+        if not email or email['mailbox_id'] != mailbox['id']:
+            return jsonify({"error": "Email not found"}), 404
+        return jsonify(email), 200
+
     if re.match(config.PROTECTED_ADDRESSES, addr) and password != config.PASSWORD:
         return jsonify({"error": "Unauthorized"}), 401
 
-    inbox = inbox_handler.read_inbox()
-    mailbox_data = inbox.get(addr, {})
+    mailbox_data = inbox_handler.get_mailbox(addr)
 
     if not mailbox_data:
         return jsonify({"error": "Mailbox not found"}), 404
@@ -1029,6 +1044,183 @@ def get_email():
 
     return jsonify({"error": "Email not found"}), 404
 
+def _authorize_db_mailbox(addr: str, password: str):
+    """数据库模式下按访问令牌或管理员密码校验邮箱访问权限，返回 (邮箱, 错误响应)"""
+    from database import db_manager
+    access_token = request.args.get("token", "")
+    if access_token:
+        mailbox = db_manager.get_mailbox_by_token(access_token)
+        if not mailbox or mailbox['address'] != addr:
+            return None, (jsonify({"error": "Invalid access token"}), 401)
+    elif password == config.PASSWORD:
+        mailbox = db_manager.get_mailbox_by_address(addr)
+        if not mailbox:
+            return None, (jsonify({"error": "Mailbox not found"}), 404)
+    else:
+        return None, (jsonify({"error": "Unauthorized"}), 401)
+
+    if db_manager.is_mailbox_expired(mailbox):
+        return None, (jsonify({"error": "Mailbox expired"}), 410)
+    return mailbox, None
+
+# 附件下载：内容从附件存储分块流式读取
+@bp.route('/get_attachment')
+def get_attachment():
+    client_ip = request.environ.get('REMOTE_ADDR', 'unknown')
+    if not inbox_handler.is_ip_whitelisted(client_ip):
+        return jsonify({"error": "Access denied - IP not whitelisted"}), 403
+
+    if not config.USE_DATABASE:
+        return jsonify({"error": "Attachments are only stored in database mode"}), 400
+
+    addr = request.args.get("address", "")
+    email_id = request.args.get("id", "")
+    part_id = request.args.get("part", type=int)
+    if not addr or not email_id or part_id is None:
+        return jsonify({"error": "Missing address, email ID or part"}), 400
+
+    from database import db_manager
+    mailbox, error = _authorize_db_mailbox(addr, request.headers.get("Authorization", None))
+    if error:
+        return error
+
+    part = db_manager.get_email_part(email_id, part_id)
+    if not part or part['mailbox_id'] != mailbox['id']:
+        return jsonify({"error": "Attachment not found"}), 404
+
+    filename = part['Filename'] or f"attachment-{part['id']}"
+    disposition = 'inline' if request.args.get('inline') == 'true' else 'attachment'
+    headers = {
+        'Content-Length': str(part['Size']),
+        'Content-Disposition': f"{disposition}; filename*=UTF-8''{quote(filename)}",
+        'ETag': f'"{part["sha256"]}"',
+        # 内容按摘要寻址，不会改变
+        'Cache-Control': 'private, max-age=86400, immutable'
+    }
+    if request.if_none_match.contains(part['sha256']):
+        return Response(status=304, headers={'ETag': headers['ETag']})
+
+    return Response(db_manager.iter_blob(part['sha256']), mimetype=part['ContentType'],
+                    headers=headers, direct_passthrough=True)
+
+# 新邮件推送（Server-Sent Events），代替定时轮询 get_inbox
+@bp.route('/stream')
+def stream():
+    client_ip = request.environ.get('REMOTE_ADDR', 'unknown')
+    if not inbox_handler.is_ip_whitelisted(client_ip):
+        return jsonify({"error": "Access denied - IP not whitelisted"}), 403
+
+    addr = request.args.get("address", "")
+    password = request.headers.get("Authorization", None)
+    if not addr:
+        return jsonify({"error": "Missing address"}), 400
+
+    # 认证方式与 get_email 相同：数据库模式使用访问令牌（EventSource 不能设置请求头，通过 token 参数传递）
+    if config.USE_DATABASE:
+        mailbox, error = _authorize_db_mailbox(addr, password)
+        if error:
+            return error
+    elif re.match(config.PROTECTED_ADDRESSES, addr) and password != config.PASSWORD:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # 每个连接占用一个服务线程，超过上限时让客户端退回轮询
+    if notifier.subscriber_count() >= config.STREAM_MAX_CLIENTS:
+        return jsonify({"error": "Too many stream connections"}), 503, {'Retry-After': '30'}
+
+    def generate():
+        subscription = notifier.subscribe(addr)
+        try:
+            yield 'retry: 3000\n: connected\n\n'
+            # 连接定期关闭，由浏览器自动重连，避免长期占用线程
+            deadline = time.time() + config.STREAM_MAX_SECONDS
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    event = subscription.get(timeout=min(config.STREAM_HEARTBEAT_SECONDS, remaining))
+                except queue.Empty:
+                    # 心跳注释行，连接断开时写入失败即可结束
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            notifier.unsubscribe(addr, subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# 阻塞等待新邮件（供自动化测试使用），代替循环轮询 get_inbox
+@bp.route('/wait_for_email')
+def wait_for_email():
+    client_ip = request.environ.get('REMOTE_ADDR', 'unknown')
+    if not inbox_handler.is_ip_whitelisted(client_ip):
+        return jsonify({"error": "Access denied - IP not whitelisted"}), 403
+
+    addr = request.args.get("address", "")
+    password = request.headers.get("Authorization", None)
+    if not addr:
+        return jsonify({"error": "Missing address"}), 400
+
+    try:
+        timeout = float(request.args.get("timeout", config.WAIT_FOR_EMAIL_DEFAULT_TIMEOUT))
+        since = int(request.args.get("since", 0))
+        subject_pattern = re.compile(request.args["subject_regex"]) if request.args.get("subject_regex") else None
+    except (ValueError, re.error) as e:
+        return jsonify({"error": "Invalid parameters", "message": str(e)}), 400
+    timeout = max(0, min(timeout, config.WAIT_FOR_EMAIL_MAX_TIMEOUT))
+    sender = request.args.get("from", "").lower()
+
+    # 认证方式与 get_email 相同
+    if config.USE_DATABASE:
+        from database import db_manager
+        mailbox, error = _authorize_db_mailbox(addr, password)
+        if error:
+            return error
+    elif re.match(config.PROTECTED_ADDRESSES, addr) and password != config.PASSWORD:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # 与推送连接共用连接数上限，每个等待中的请求占用一个服务线程
+    if notifier.subscriber_count() >= config.STREAM_MAX_CLIENTS:
+        return jsonify({"error": "Too many waiting requests"}), 503, {'Retry-After': '5'}
+
+    def find_match():
+        """返回最早的一封符合条件的完整邮件"""
+        if config.USE_DATABASE:
+            emails = inbox_handler.get_emails_by_mailbox(mailbox['id'])
+        else:
+            emails = (inbox_handler.get_mailbox(addr) or {}).get("emails", [])
+        for email in sorted(emails, key=lambda item: item.get('Timestamp', 0)):
+            if email.get('Timestamp', 0) < since:
+                continue
+            if subject_pattern and not subject_pattern.search(email.get('Subject') or ''):
+                continue
+            if sender and sender not in (email.get('From') or '').lower():
+                continue
+            return db_manager.get_email_by_id(email['id']) if config.USE_DATABASE else email
+        return None
+
+    # 先订阅再检查已有邮件，检查期间入库的邮件也会收到通知；每次唤醒都重新检查
+    subscription = notifier.subscribe(addr)
+    try:
+        deadline = time.time() + timeout
+        while True:
+            email = find_match()
+            if email:
+                return jsonify(email), 200
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return '', 204
+            # 通知可能丢失（队列已满、跨进程监视延迟），最多等待一个轮询间隔就重新检查
+            try:
+                subscription.get(timeout=min(remaining, config.STREAM_POLL_INTERVAL))
+            except queue.Empty:
+                pass
+    finally:
+        notifier.unsubscribe(addr, subscription)
+
 # Admin login endpoint
 @bp.route('/admin_login', methods=['POST'])
 def admin_login():
@@ -1110,7 +1302,7 @@ def delete_email():
                 return jsonify({"error": "Invalid access token"}), 401
 
             # 验证邮件是否属于该邮箱
-            email = db_manager.get_email_by_id(email_id)
+            email = db_manager.get_email_by_id(email_id, include_body=False)
             if not email:
                 return jsonify({"error": "Email not found", "email_id": email_id}), 404
 
@@ -1165,7 +1357,7 @@ def delete_emails_batch():
             deleted_count = 0
             failed_emails = []
             for email_id in email_ids:
-                email = db_manager.get_email_by_id(email_id)
+                email = db_manager.get_email_by_id(email_id, include_body=False)
                 if not email:
                     failed_emails.append(f"{email_id}: not found")
                     continue
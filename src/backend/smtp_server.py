@@ -1,12 +1,51 @@
-
 import sys
+import asyncio
 import threading
 import time
 from aiosmtpd.controller import Controller
-from . import email_parser, inbox_handler
+import config
+from . import inbox_handler
+from .ingest_executor import IngestExecutor, process_email
+from .ingest_spool import IngestSpool, spool
+from .mail_notifier import notifier
 
 # Class for SMTP server logic
 class SMTPServer:
+    def __init__(self, executor: IngestExecutor = None, spool: IngestSpool = None):
+        # Parsing and storage run in a separate ingest pool so the event loop is never blocked
+        self.executor = executor or IngestExecutor()
+        # With the spool enabled, DATA only appends to the spool; a background task parses and stores the mail
+        self.spool = spool
+
+    # Called on MAIL FROM: reject non-whitelisted clients before anything else is sent
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        client_ip = session.peer[0] if session.peer else "unknown"
+        if not inbox_handler.is_ip_whitelisted(client_ip):
+            print(f"Rejected sender from non-whitelisted IP: {client_ip}")
+            return '550 Access denied - IP not whitelisted'
+
+        envelope.mail_from = address
+        envelope.mail_options.extend(mail_options)
+        return '250 OK'
+
+    # Called on RCPT TO: reject undeliverable recipients before the message body is sent
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        try:
+            # A cache miss queries the database, so run the check in a thread to keep the event loop free
+            loop = asyncio.get_running_loop()
+            reason = await loop.run_in_executor(None, inbox_handler.check_recipient, address, envelope.mail_from)
+        except Exception as e:
+            print(f"Error checking recipient {address}: {e}")
+            return '451 Could not verify recipient - please try again later'
+
+        if reason:
+            print(f"Recipient rejected: {reason}")
+            return f'550 {reason}'
+
+        envelope.rcpt_tos.append(address)
+        envelope.rcpt_options.extend(rcpt_options)
+        return '250 OK'
+
     # This function is called when the server receives an email
     async def handle_DATA(self, server, session, envelope):
         try:
@@ -16,24 +55,71 @@ class SMTPServer:
                 print(f"Rejected email from non-whitelisted IP: {client_ip}")
                 return '550 Access denied - IP not whitelisted'
 
-            parsed_email = email_parser.email_bytes_to_json(envelope.content)
-            result = inbox_handler.recv_email(parsed_email)
+            # aiosmtpd already discards oversize DATA and replies 552; this is a safety net
+            if len(envelope.content) > config.MAX_EMAIL_SIZE_BYTES:
+                print(f"Rejected oversize email from {client_ip}: {len(envelope.content)} bytes")
+                return '552 Message size exceeds fixed maximum message size'
 
-            if result == "Email accepted":
-                print(f"Email accepted from {client_ip} to {parsed_email.get('To', 'unknown')}")
+            if self.spool is not None:
+                # Append and fsync in a thread so the event loop is never blocked
+                loop = asyncio.get_running_loop()
+                record = await loop.run_in_executor(None, self.spool.append, envelope.mail_from,
+                                                    list(envelope.rcpt_tos), envelope.content, client_ip)
+                if record is None:
+                    print(f"Ingest spool full, deferring email from {client_ip}")
+                    return '451 Server busy - please try again later'
+                return '250 Message accepted for delivery'
+
+            future = self.executor.submit(process_email, envelope.content, list(envelope.rcpt_tos))
+            if future is None:
+                print(f"Ingest queue full, deferring email from {client_ip}")
+                return '451 Server busy - please try again later'
+
+            parsed_email, results = await future
+            notifier.publish_results(parsed_email, results)
+
+            accepted = [rcpt for rcpt, result in results.items() if result == "Email accepted"]
+            rejected = {rcpt: result for rcpt, result in results.items() if result != "Email accepted"}
+
+            # DATA has a single reply code: return 250 if any recipient was accepted and log the other failures
+            for rcpt, result in rejected.items():
+                print(f"Email rejected for {rcpt}: {result}")
+
+            if accepted:
+                print(f"Email accepted from {client_ip} to {', '.join(accepted)}")
                 return '250 Message accepted for delivery'
             else:
-                print(f"Email rejected: {result}")
-                return f'550 {result}'
+                reason = '; '.join(dict.fromkeys(rejected.values())) or "No valid recipients"
+                return f'550 {reason}'
 
         except Exception as e:
             print(f"Error processing email: {e}")
             return '500 Could not process email'
 
+# SMTP session parameters shared by the Controller and the SMTP worker processes so both behave the same
+def smtp_parameters() -> dict:
+    return {
+        'hostname': config.SMTP_SERVER_HOSTNAME or None,
+        # data_size_limit advertises SIZE in EHLO and makes DATA discard oversize mail with a 552
+        'data_size_limit': config.MAX_EMAIL_SIZE_BYTES,
+        # Same as the Controller default: accept UTF-8 addresses
+        'enable_SMTPUTF8': True
+    }
+
 # This function sets up and runs the SMTP server
 def run_smtp_server(host: str = "0.0.0.0", port: int = 25):
+    if config.SMTP_WORKERS > 0:
+        if run_smtp_workers(host, port):
+            return
+
     handler = SMTPServer()
-    controller = Controller(handler, hostname=host, port=port, ready_timeout=30)
+    if config.INGEST_SPOOL_ENABLED:
+        # Replay mail left unfinished by the last run before accepting new mail
+        spool.start(handler.executor, process_email)
+        handler.spool = spool
+    parameters = smtp_parameters()
+    controller = Controller(handler, hostname=host, port=port, ready_timeout=30,
+                            server_hostname=parameters.pop('hostname'), **parameters)
 
     print(f"Starting SMTP server on {host}:{port}")
     try:
@@ -51,8 +137,30 @@ def run_smtp_server(host: str = "0.0.0.0", port: int = 25):
         except KeyboardInterrupt:
             print("SMTP server shutting down...")
             controller.stop()
+            handler.executor.shutdown(wait=False)
 
     except Exception as e:
         print(f"Failed to start SMTP server: {e}")
         print(f"Error details: {type(e).__name__}: {str(e)}")
-        return
\ No newline at end of file
+        return
+
+# Runs the SMTP listeners in SO_REUSEPORT worker processes under a supervisor
+# Returns False when workers are not supported, so the caller falls back to a single process
+def run_smtp_workers(host: str, port: int) -> bool:
+    from .smtp_workers import SmtpSupervisor, reuse_port_supported
+
+    if not reuse_port_supported():
+        print("Warning: SO_REUSEPORT is not supported on this platform, running SMTP in a single process")
+        return False
+    if not config.USE_DATABASE:
+        # JSON file storage does not support concurrent writes from multiple processes
+        print("Warning: SMTP_WORKERS requires USE_DATABASE=true, running SMTP in a single process")
+        return False
+
+    supervisor = SmtpSupervisor(host, port)
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        print("SMTP server shutting down...")
+        supervisor.stop()
+    return True
@@ -0,0 +1,167 @@
+"""
+多进程 SMTP 监听
+SMTP_WORKERS 大于 0 时，由监督进程启动多个 SMTP 工作进程，
+各工作进程以 SO_REUSEPORT 绑定同一端口，由内核分配连接；
+每个工作进程有独立的事件循环、收件处理池和数据库连接，崩溃后由监督进程重启
+"""
+
+import asyncio
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from typing import Dict
+from aiosmtpd.smtp import SMTP
+import config
+from .ingest_executor import process_email
+from .ingest_spool import IngestSpool
+from .smtp_server import SMTPServer, smtp_parameters
+
+# 工作进程运行不足该时间就退出视为启动失败，重启等待时间按次数翻倍
+MIN_UPTIME_SECONDS = 5
+MAX_RESTART_DELAY = 30
+# 工作进程检查监督进程是否存活的间隔（秒）
+PARENT_CHECK_INTERVAL = 2
+
+
+def reuse_port_supported() -> bool:
+    """当前平台是否支持 SO_REUSEPORT"""
+    return hasattr(socket, 'SO_REUSEPORT')
+
+
+def disable_mailbox_cache():
+    """
+    工作进程不缓存邮箱信息：Web 进程创建、删除或禁用邮箱时只能清除自己进程的缓存，
+    工作进程每次 RCPT 都查询数据库，避免新建的邮箱被拒收、已删除的邮箱仍被接收
+    """
+    if not config.USE_DATABASE:
+        return
+    from database import db_manager
+    db_manager.mailbox_cache.ttl = 0
+    db_manager.mailbox_cache.negative_ttl = 0
+    db_manager.mailbox_cache.clear()
+
+
+def run_worker(host: str, port: int, index: int):
+    """SMTP 工作进程入口"""
+    disable_mailbox_cache()
+
+    handler = SMTPServer()
+    if config.INGEST_SPOOL_ENABLED:
+        # 每个工作进程使用自己的队列目录，重启后重放自己未完成的邮件
+        worker_spool = IngestSpool(directory=os.path.join(config.INGEST_SPOOL_DIR, f'worker-{index}'))
+        worker_spool.start(handler.executor, process_email)
+        handler.spool = worker_spool
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    parameters = smtp_parameters()
+    server = loop.run_until_complete(loop.create_server(
+        lambda: SMTP(handler, loop=loop, **parameters),
+        host=host, port=port, reuse_port=True
+    ))
+    print(f"[SMTP-{index}] 工作进程 {os.getpid()} 已在 {host}:{port} 上监听")
+
+    # 监督进程退出（工作进程被其他进程收养）时随之退出，避免遗留进程占用端口
+    parent_pid = os.getppid()
+
+    def _watch_parent():
+        if os.getppid() != parent_pid:
+            print(f"[SMTP-{index}] 监督进程已退出，工作进程退出")
+            loop.stop()
+            return
+        loop.call_later(PARENT_CHECK_INTERVAL, _watch_parent)
+
+    loop.call_later(PARENT_CHECK_INTERVAL, _watch_parent)
+
+    try:
+        loop.run_forever()
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        handler.executor.shutdown(wait=False)
+        loop.close()
+
+
+class SmtpSupervisor:
+    def __init__(self, host: str, port: int, workers: int = None):
+        """初始化监督进程"""
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers or config.SMTP_WORKERS)
+
+        # 使用spawn避免在多线程进程中fork带来的锁和连接状态问题
+        self._context = multiprocessing.get_context('spawn')
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._started_at: Dict[int, float] = {}
+        self._failures: Dict[int, int] = {}
+        self._restart_at: Dict[int, float] = {}
+        self._stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+        self.restarts = 0
+
+    def _spawn(self, index: int):
+        """启动（或重启）一个工作进程"""
+        process = self._context.Process(
+            target=run_worker, args=(self.host, self.port, index),
+            name=f'smtp-worker-{index}', daemon=True
+        )
+        process.start()
+        with self.lock:
+            self._processes[index] = process
+            self._started_at[index] = time.time()
+            self._restart_at.pop(index, None)
+
+    def run(self):
+        """启动所有工作进程并持续监控，直到 stop 被调用"""
+        for index in range(self.workers):
+            self._spawn(index)
+        print(f"[SMTP] 已启动 {self.workers} 个工作进程，监听 {self.host}:{self.port}")
+
+        while not self._stop_event.wait(1):
+            self._check_workers()
+
+    def _check_workers(self):
+        """检查工作进程，退出的进程按退避时间重启"""
+        now = time.time()
+        for index, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+
+            restart_at = self._restart_at.get(index)
+            if restart_at is None:
+                # 刚发现退出：运行时间过短视为连续失败，重启等待时间翻倍
+                if now - self._started_at[index] < MIN_UPTIME_SECONDS:
+                    self._failures[index] = self._failures.get(index, 0) + 1
+                else:
+                    self._failures[index] = 0
+                delay = min(MAX_RESTART_DELAY, 2 ** self._failures[index] - 1)
+                self._restart_at[index] = now + delay
+                print(f"[SMTP] 工作进程 {index} (pid {process.pid}) 已退出，退出码 {process.exitcode}，{delay} 秒后重启")
+                continue
+
+            if now >= restart_at:
+                self._spawn(index)
+                with self.lock:
+                    self.restarts += 1
+
+    def stop(self):
+        """停止监控并结束所有工作进程"""
+        self._stop_event.set()
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes.values():
+            process.join(timeout=5)
+
+    def get_stats(self) -> Dict:
+        """获取工作进程状态"""
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'alive': sum(1 for process in self._processes.values() if process.is_alive()),
+                'pids': {index: process.pid for index, process in self._processes.items()},
+                'restarts': self.restarts
+            }
@@ -0,0 +1,245 @@
+"""
+SQLite 单写线程
+所有写操作通过队列交给唯一的写线程执行，写线程持有写连接，
+按批量大小或等待时间将多次写操作合并到一个事务中提交（group commit），
+调用方通过 Future 获取每个写操作的结果
+"""
+
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict
+
+# 停止写线程的标记
+_STOP = object()
+
+
+class StorageWriter:
+    def __init__(self, db_path: str, batch_size: int = 64, max_delay: float = 0.005, queue_size: int = 10000,
+                 configure: Callable[[sqlite3.Connection], None] = None, write_timeout: float = 30):
+        """初始化写线程（首次提交时启动）"""
+        self.db_path = db_path
+        self.configure = configure
+        self.batch_size = max(1, batch_size)
+        self.max_delay = max(0.0, max_delay)
+        self.write_timeout = write_timeout if write_timeout and write_timeout > 0 else None
+        self.queue = queue.Queue(maxsize=max(0, queue_size))
+
+        self.lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._conn = None
+        # 写线程开始退出（不再从队列取写操作）前清除
+        self._running = False
+
+        self.operations = 0
+        self.failed = 0
+        self.batches = 0
+        self.commit_failures = 0
+        self.max_batch = 0
+
+    def start(self):
+        """启动写线程"""
+        with self.lock:
+            # fork出的子进程不会继承线程，需要重新启动
+            if self._running and self._pid == os.getpid():
+                return
+            # 沿用原队列，上一个写线程退出后才提交的写操作由新线程继续执行
+            self._pid = os.getpid()
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self, timeout: float = 5):
+        """提交剩余写操作并停止写线程"""
+        thread = self._thread
+        if thread is None or not thread.is_alive() or self._pid != os.getpid():
+            return
+        self.queue.put(_STOP)
+        thread.join(timeout)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        提交写操作，fn(conn, *args, **kwargs) 在写线程中执行
+        fn 中不要调用 commit，事务由写线程统一提交
+        返回的 Future 在所在批次提交后完成
+        """
+        if not self._running or self._pid != os.getpid():
+            self.start()
+
+        future = Future()
+        self.queue.put((fn, args, kwargs, future))
+        # 写线程可能在入队前已取完剩余写操作并退出，此时重新启动写线程处理
+        if not self._running:
+            self.start()
+        return future
+
+    def execute(self, fn: Callable, *args, **kwargs):
+        """提交写操作并等待提交完成，返回 fn 的结果；超过 write_timeout 未完成时抛出 TimeoutError"""
+        # 写操作内部再次发起写操作时直接在当前事务中执行，避免死锁
+        if threading.current_thread() is self._thread:
+            return fn(self._conn, *args, **kwargs)
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.write_timeout)
+        except FutureTimeoutError:
+            # 尚未执行的写操作直接取消；已在执行的写操作仍可能在之后提交
+            future.cancel()
+            raise TimeoutError(
+                f"数据库写操作等待超过 {self.write_timeout} 秒仍未完成"
+                f"（写线程{'运行中' if self._running else '已停止'}，"
+                f"队列中 {self.queue.qsize()} 个写操作）"
+            ) from None
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开写连接（手动管理事务）"""
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if self.configure:
+            self.configure(conn)
+        return conn
+
+    def _run(self):
+        """写线程主函数：退出时（包括打开写连接失败）让队列中剩余的写操作全部失败，避免调用方一直等待"""
+        error = None
+        try:
+            self._conn = self._connect()
+            self._loop()
+        except Exception as e:
+            error = e
+            print(f"[Writer] 写线程异常退出: {e}")
+        finally:
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                except Exception:
+                    pass
+                self._conn = None
+            with self.lock:
+                self._running = False
+            self._fail_pending(error or RuntimeError("数据库写线程已停止"))
+
+    def _loop(self):
+        """写线程主循环"""
+        stopping = False
+
+        while not stopping:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+
+            # 在批量大小和等待时间内尽量合并更多写操作
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        """在一个事务中执行一批写操作，每个写操作使用独立的保存点"""
+        conn = self._conn
+        outcomes = []
+
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except Exception as e:
+            self._fail_batch(batch, e)
+            return
+
+        try:
+            for fn, args, kwargs, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                conn.execute('SAVEPOINT write_op')
+                try:
+                    result = fn(conn, *args, **kwargs)
+                except Exception as e:
+                    # 只回滚当前写操作，不影响同一批次中的其他写操作
+                    conn.execute('ROLLBACK TO write_op')
+                    outcomes.append((future, None, e))
+                else:
+                    outcomes.append((future, result, None))
+                conn.execute('RELEASE write_op')
+
+            conn.execute('COMMIT')
+        except Exception as e:
+            # 事务无法继续（例如SQLite已整体回滚或提交失败），整批失败
+            if conn.in_transaction:
+                try:
+                    conn.execute('ROLLBACK')
+                except Exception:
+                    pass
+            self._fail_batch(batch, e)
+            return
+
+        with self.lock:
+            self.batches += 1
+            self.operations += len(outcomes)
+            self.failed += sum(1 for _, _, error in outcomes if error is not None)
+            self.max_batch = max(self.max_batch, len(outcomes))
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _fail_batch(self, batch, error: Exception):
+        """整批提交失败时通知所有调用方"""
+        print(f"[Writer] 批量提交失败 ({len(batch)} 个写操作): {error}")
+        with self.lock:
+            self.commit_failures += 1
+            self.failed += len(batch)
+        for _, _, _, future in batch:
+            if future.done():
+                continue
+            if future.running() or future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def _fail_pending(self, error: Exception):
+        """写线程退出时取出队列中尚未执行的写操作，通知调用方失败"""
+        pending = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                pending.append(item)
+        if not pending:
+            return
+        print(f"[Writer] 写线程退出，{len(pending)} 个写操作未执行: {error}")
+        with self.lock:
+            self.failed += len(pending)
+        for _, _, _, future in pending:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def get_stats(self) -> Dict:
+        """获取写线程统计信息"""
+        with self.lock:
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'queue_depth': self.queue.qsize(),
+                'operations': self.operations,
+                'failed': self.failed,
+                'batches': self.batches,
+                'commit_failures': self.commit_failures,
+                'max_batch': self.max_batch,
+                'avg_batch': round(self.operations / self.batches, 2) if self.batches else 0
+            }
@@ -30,6 +30,21 @@ async function getInbox(address, password = null) {
     }
 }
 
+// get a single email (with body) from the server
+async function getEmail(address, id, password = null) {
+    const headers = {};
+
+    if (password) {
+        headers["Authorization"] = password;
+    }
+
+    const response = await fetch(`/api/get_email?address=${encodeURIComponent(address)}&id=${encodeURIComponent(id)}`, { headers });
+    if (!response.ok) {
+        return { error: `HTTP ${response.status}` };
+    }
+    return await response.json();
+}
+
 // get a random email from the server
 async function getRandomAddress() {
     try {
@@ -333,7 +333,7 @@ document.addEventListener('DOMContentLoaded', function() {
                                 <span class="email-time">${formatTime(email.Timestamp)}</span>
                             </div>
                             <div class="email-subject">${email.Subject || '无主题'}</div>
-                            <div class="email-body">${getEmailPreview(email.Body || '无内容')}</div>
+                            <div class="email-body">${email.Preview !== undefined ? (email.Preview || '无内容') : getEmailPreview(email.Body || '无内容')}</div>
                             <div class="email-actions">
                                 <button class="btn btn-secondary view-detail-btn" data-email-id="${emailId}" data-address="${viewEmail.value.trim()}">
                                     <span>查看详情</span>
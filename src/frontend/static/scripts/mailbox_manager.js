@@ -11,6 +11,7 @@ class MailboxManager {
         this.emailSearchQuery = '';
         this.currentEmail = null;
         this.refreshInterval = null;
+        this.eventStream = null;
         this.currentMailboxStatus = true; // 默认状态为开启
 
         this.init();
@@ -595,7 +596,8 @@ class MailboxManager {
                 try {
                     const emailId = email.id || `email-${index}`;
                     const isUnread = !email.is_read;
-                    const preview = this.getEmailPreview(email.Body);
+                    // 列表接口只返回摘要（Preview），正文在打开邮件时获取
+                    const preview = email.Preview !== undefined ? (email.Preview || '无内容') : this.getEmailPreview(email.Body);
 
                     // 调试日志：检查邮件状态
                     console.log(`邮件 ${emailId}: is_read=${email.is_read}, isUnread=${isUnread}`);
@@ -614,7 +616,7 @@ class MailboxManager {
                                 </div>
                                 <div class="email-subject">
                                     ${this.escapeHtml(email.Subject || '无主题')}
-                                    ${this.isHtmlEmail(email.Body) ? '<span class="html-badge" title="HTML邮件">📧</span>' : ''}
+                                    ${email.ContentType === 'HTML' || this.isHtmlEmail(email.Body) ? '<span class="html-badge" title="HTML邮件">📧</span>' : ''}
                                 </div>
                                 <div class="email-preview">${this.escapeHtml(preview)}</div>
                             </div>
@@ -653,7 +655,47 @@ class MailboxManager {
         }
     }
 
-    showEmailDetail(emailId) {
+    async loadEmailBody(email) {
+        try {
+            const response = await fetch(`/api/get_email?address=${encodeURIComponent(this.mailboxAddress)}&id=${encodeURIComponent(email.id)}&token=${this.accessToken}`);
+            if (!response.ok) {
+                console.error('获取邮件正文失败:', response.status);
+                return false;
+            }
+            const detail = await response.json();
+            email.Body = detail.Body;
+            return true;
+        } catch (error) {
+            console.error('获取邮件正文失败:', error);
+            return false;
+        }
+    }
+
+    renderAttachments(email) {
+        const attachments = email.Attachments || [];
+        if (attachments.length === 0 || this.isDemoMode) {
+            return '';
+        }
+
+        // 附件内容按需从附件接口下载，列表只包含元数据
+        const items = attachments.map(part => {
+            const url = `/api/get_attachment?address=${encodeURIComponent(this.mailboxAddress)}&id=${encodeURIComponent(email.id)}&part=${part.id}&token=${this.accessToken}`;
+            const name = part.Filename || `附件 ${part.id}`;
+            const size = part.Size >= 1024 * 1024
+                ? `${(part.Size / 1024 / 1024).toFixed(2)} MB`
+                : `${Math.max(1, Math.round(part.Size / 1024))} KB`;
+            return `<li><a href="${url}" target="_blank" rel="noopener">${this.escapeHtml(name)}</a> <span class="text-muted">(${size})</span></li>`;
+        }).join('');
+
+        return `
+            <div class="email-attachments">
+                <div class="email-meta-label">附件 (${attachments.length}):</div>
+                <ul>${items}</ul>
+            </div>
+        `;
+    }
+
+    async showEmailDetail(emailId) {
         console.log('=== 邮件详情调试开始 ===');
         console.log('点击的邮件ID:', emailId);
         console.log('当前邮件列表长度:', this.emails.length);
@@ -705,6 +747,11 @@ class MailboxManager {
             console.log('邮件已经是已读状态，无需标记');
         }
 
+        // 列表只包含摘要，首次打开时按需获取正文
+        if (email.Body === undefined && !this.isDemoMode) {
+            await this.loadEmailBody(email);
+        }
+
         // 渲染邮件详情
         const content = document.getElementById('email-detail-content');
         if (!content) {
@@ -753,6 +800,7 @@ class MailboxManager {
             <div class="email-body">
                 ${this.renderEmailContent(email.Body || '邮件内容为空')}
             </div>
+            ${this.renderAttachments(email)}
         `;
 
         console.log('邮件内容已渲染，切换到详情视图');
@@ -1096,29 +1144,90 @@ class MailboxManager {
 
         // 页面可见性检测
         this.isPageVisible = true;
+        this.refreshPending = false;
         document.addEventListener('visibilitychange', () => {
             this.isPageVisible = !document.hidden;
             console.log('页面可见性变化:', this.isPageVisible ? '可见' : '隐藏');
+            // 隐藏期间收到的新邮件在页面重新可见时加载
+            if (this.isPageVisible && this.refreshPending) {
+                this.refreshPending = false;
+                this.autoRefresh();
+            }
         });
 
+        // 演示模式没有新邮件推送，沿用定时刷新
+        if (this.isDemoMode || !window.EventSource) {
+            this.startPolling();
+            return;
+        }
+
+        if (!this.accessToken || !this.mailboxAddress) return;
+
+        // 新邮件由服务器推送，收到事件才刷新列表
+        const url = `/api/stream?address=${encodeURIComponent(this.mailboxAddress)}&token=${this.accessToken}`;
+        const stream = new EventSource(url);
+        let opened = false;
+        const onNewMail = () => {
+            if (this.isPageVisible) {
+                this.autoRefresh();
+            } else {
+                this.refreshPending = true;
+            }
+        };
+        stream.addEventListener('email', onNewMail);
+        stream.addEventListener('changed', onNewMail);
+        stream.onopen = () => {
+            console.log('新邮件推送已连接');
+            this.stopPolling();
+            // 重连期间可能有新邮件，重连成功后刷新一次
+            if (opened) onNewMail();
+            opened = true;
+        };
+        stream.onerror = () => {
+            // 服务器拒绝连接（令牌失效、连接数已满等）时不会自动重连，退回定时刷新
+            if (stream.readyState === EventSource.CLOSED) {
+                console.log('新邮件推送不可用，改为定时刷新');
+                this.startPolling();
+            }
+        };
+        this.eventStream = stream;
+    }
+
+    autoRefresh() {
+        if (this.currentView === 'inbox') {
+            console.log('执行自动刷新...');
+            this.loadEmails();
+        } else {
+            console.log('跳过自动刷新 - 视图:', this.currentView);
+        }
+    }
+
+    startPolling() {
+        if (this.refreshInterval) return;
+
         // 每30秒自动刷新邮件
         this.refreshInterval = setInterval(() => {
-            if (this.currentView === 'inbox' && this.isPageVisible) {
-                console.log('执行自动刷新...');
-                this.loadEmails();
-            } else {
-                console.log('跳过自动刷新 - 视图:', this.currentView, '页面可见:', this.isPageVisible);
+            if (this.isPageVisible) {
+                this.autoRefresh();
             }
         }, 30000);
     }
-    
-    stopAutoRefresh() {
+
+    stopPolling() {
         if (this.refreshInterval) {
             clearInterval(this.refreshInterval);
             this.refreshInterval = null;
         }
     }
 
+    stopAutoRefresh() {
+        this.stopPolling();
+        if (this.eventStream) {
+            this.eventStream.close();
+            this.eventStream = null;
+        }
+    }
+
     async retryInitialization() {
         console.log('用户请求重试初始化...');
         try {
@@ -163,9 +163,53 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     }
 
+    // subscribe to new mail for the current address, so the inbox only refreshes when mail arrives
+    let inboxStream = null;
+    let streamAddress = null;
+    let pollTimer = null;
+
+    function connectInboxStream() {
+        if (!currentEmail || streamAddress === currentEmail) return;
+        if (inboxStream) inboxStream.close();
+        streamAddress = currentEmail;
+
+        if (!window.EventSource) {
+            startPolling();
+            return;
+        }
+
+        const stream = new EventSource(`/api/stream?address=${encodeURIComponent(currentEmail)}`);
+        let opened = false;
+        stream.addEventListener('email', fetchInbox);
+        stream.addEventListener('changed', fetchInbox);
+        stream.onopen = () => {
+            stopPolling();
+            // 重连期间可能有新邮件，重连成功后刷新一次
+            if (opened) fetchInbox();
+            opened = true;
+        };
+        stream.onerror = () => {
+            // 服务器拒绝连接（如地址需要密码或连接数已满）时不会自动重连，退回轮询
+            if (stream.readyState === EventSource.CLOSED) startPolling();
+        };
+        inboxStream = stream;
+    }
+
+    function startPolling() {
+        if (!pollTimer) pollTimer = setInterval(fetchInbox, 5000);
+    }
+
+    function stopPolling() {
+        if (pollTimer) {
+            clearInterval(pollTimer);
+            pollTimer = null;
+        }
+    }
+
     // fetch the inbox from the server
     async function fetchInbox() {
         if (!currentEmail) return;
+        connectInboxStream();
 
         refreshBtn.classList.add('loading');
 
@@ -224,13 +268,28 @@ document.addEventListener("DOMContentLoaded", () => {
                 inboxList.appendChild(emailItem);
 
                 const iframe = emailItem.querySelector('.email-body-iframe');
-                iframe.srcdoc = email.Body || '';
+
+                // 列表只包含摘要时，展开邮件才获取正文
+                const showBody = async () => {
+                    if (email.Body === undefined) {
+                        const password = localStorage.getItem(`${currentEmail}-password`);
+                        const detail = await getEmail(currentEmail, email.id, password);
+                        email.Body = detail.error ? '' : (detail.Body || '');
+                    }
+                    iframe.srcdoc = email.Body || '';
+                };
+
+                if (email.Body === undefined) {
+                    emailItem.classList.remove('open');
+                } else {
+                    iframe.srcdoc = email.Body || '';
+                }
 
                 const summary = emailItem.querySelector('.email-summary');
                 summary.addEventListener('click', () => {
                     emailItem.classList.toggle('open');
                     if (emailItem.classList.contains('open')) {
-                        iframe.srcdoc = email.Body || '';
+                        showBody();
                     }
                 });
             });
@@ -472,8 +531,7 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     });
 
-    // automatic inbox refreshing
-    setInterval(fetchInbox, 5000);
+    // automatic inbox refreshing: new mail is pushed through /api/stream (see connectInboxStream)
 });
 
 
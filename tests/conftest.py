@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT_DIR, 'src', 'backend')
+
+# 后端模块以顶层模块名导入（如 database），与运行时一致
+for path in (ROOT_DIR, BACKEND_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# 全局实例（db_manager、inbox_store、spool）在导入时按配置创建，导入前指向临时目录，不影响工作目录
+DATA_DIR = tempfile.mkdtemp(prefix='tempmail-tests-')
+os.environ.setdefault('DATABASE_PATH', os.path.join(DATA_DIR, 'mailbox.db'))
+os.environ.setdefault('INBOX_FILE_NAME', os.path.join(DATA_DIR, 'inbox.json'))
+os.environ.setdefault('INGEST_SPOOL_DIR', os.path.join(DATA_DIR, 'spool'))
+
+
+@pytest.fixture
+def db(tmp_path):
+    """使用临时文件的独立数据库（已执行全部迁移）"""
+    from database import DatabaseManager
+    manager = DatabaseManager(str(tmp_path / 'mailbox.db'))
+    yield manager
+    manager.writer.stop()
+
+
+def make_email(to: str, subject: str = 'Hi', body: str = None, timestamp: int = None, **fields) -> dict:
+    """构造入库用的邮件数据（默认正文各不相同，不触发正文去重）"""
+    email = {
+        'id': str(uuid.uuid4()),
+        'From': 'sender@example.com',
+        'To': to,
+        'Subject': subject,
+        'Body': body if body is not None else f'body {uuid.uuid4()}',
+        'ContentType': 'Text',
+        'Timestamp': int(time.time()) if timestamp is None else timestamp,
+    }
+    email.update(fields)
+    return email
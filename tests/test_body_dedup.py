@@ -0,0 +1,126 @@
+"""
+正文去重测试：内容相同的邮件共享一份正文和附件，引用计数由触发器维护，最后一个引用删除时一并删除
+"""
+
+from conftest import make_email
+
+ATTACHMENT = {'Filename': 'report.txt', 'ContentType': 'text/plain', 'Data': b'shared attachment data'}
+
+
+def _body_id(db, email_id):
+    with db.get_connection() as conn:
+        return conn.execute('SELECT body_id FROM emails WHERE id = ?', (email_id,)).fetchone()['body_id']
+
+
+def _ref_count(db, body_id):
+    with db.get_connection() as conn:
+        row = conn.execute('SELECT ref_count FROM email_bodies WHERE id = ?', (body_id,)).fetchone()
+        return row['ref_count'] if row else None
+
+
+def _blobs(db):
+    with db.get_connection() as conn:
+        return {row['sha256']: row['ref_count'] for row in conn.execute('SELECT sha256, ref_count FROM blobs')}
+
+
+def _count(db, table):
+    with db.get_connection() as conn:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def test_identical_content_shares_one_body(db):
+    first = db.create_mailbox('first@localhost', retention_days=1)
+    second = db.create_mailbox('second@localhost', retention_days=1)
+
+    # 分别到达的两封内容相同的邮件（正文和附件均相同）
+    a = db.add_email(first['id'], make_email('first@localhost', body='same body', Attachments=[ATTACHMENT]))
+    b = db.add_email(second['id'], make_email('second@localhost', body='same body', Attachments=[ATTACHMENT]))
+
+    body_id = _body_id(db, a)
+    assert _body_id(db, b) == body_id
+    assert _count(db, 'email_bodies') == 1
+    assert _ref_count(db, body_id) == 2
+    # 附件属于共享正文，只有一个邮件部分引用内容
+    assert _count(db, 'email_parts') == 1
+    assert list(_blobs(db).values()) == [1]
+
+    # 两个邮箱都按完整的邮件大小（含共享正文）计入已用容量
+    with db.get_connection() as conn:
+        sizes = dict(conn.execute('SELECT mailbox_id, size_bytes FROM emails').fetchall())
+    for mailbox in (first, second):
+        assert sizes[mailbox['id']] > len(ATTACHMENT['Data'])
+        assert db.get_mailbox_stats(mailbox['id'])['storage_used'] == sizes[mailbox['id']]
+
+    stats = db.get_dedup_stats()
+    assert stats['bodies']['rows'] == 1
+    assert stats['bodies']['references'] == 2
+    assert stats['bodies']['saved_bytes'] == stats['bodies']['physical_bytes']
+
+
+def test_different_body_creates_new_row(db):
+    mailbox = db.create_mailbox('diff@localhost', retention_days=1)
+    a = db.add_email(mailbox['id'], make_email('diff@localhost', body='one', Attachments=[ATTACHMENT]))
+    b = db.add_email(mailbox['id'], make_email('diff@localhost', body='two', Attachments=[ATTACHMENT]))
+
+    assert _body_id(db, a) != _body_id(db, b)
+    assert _count(db, 'email_bodies') == 2
+    # 正文不同但附件相同：附件内容仍只存一份，由两个邮件部分引用
+    assert _count(db, 'email_parts') == 2
+    assert list(_blobs(db).values()) == [2]
+
+
+def test_delete_releases_references(db):
+    first = db.create_mailbox('del1@localhost', retention_days=1)
+    second = db.create_mailbox('del2@localhost', retention_days=1)
+    a = db.add_email(first['id'], make_email('del1@localhost', body='shared', Attachments=[ATTACHMENT]))
+    b = db.add_email(second['id'], make_email('del2@localhost', body='shared', Attachments=[ATTACHMENT]))
+    body_id = _body_id(db, a)
+
+    assert db.delete_email(a)
+    assert _ref_count(db, body_id) == 1
+    # 剩余的邮件仍可读取正文和附件
+    assert db.get_email_by_id(b)['Body'] == 'shared'
+    assert _count(db, 'email_parts') == 1
+    assert _count(db, 'blobs') == 1
+
+    # 删除最后一个引用时正文、邮件部分和附件内容一并删除
+    assert db.delete_email(b)
+    assert _ref_count(db, body_id) is None
+    assert _count(db, 'email_bodies') == 0
+    assert _count(db, 'email_parts') == 0
+    assert _count(db, 'blobs') == 0
+
+    # 之后再次到达相同内容时重新写入
+    c = db.add_email(first['id'], make_email('del1@localhost', body='shared', Attachments=[ATTACHMENT]))
+    assert _ref_count(db, _body_id(db, c)) == 1
+    assert list(_blobs(db).values()) == [1]
+
+
+def test_multi_recipient_delivery_shares_body(db):
+    mailboxes = [db.create_mailbox(f'multi{i}@localhost', retention_days=1) for i in range(3)]
+    email = make_email('multi0@localhost', body='to everyone')
+    results = db.add_email_to_mailboxes([(m['id'], m['address']) for m in mailboxes], email)
+
+    email_ids = [email_id for email_id, error in results.values() if error is None]
+    assert len(email_ids) == 3
+    body_ids = {_body_id(db, email_id) for email_id in email_ids}
+    assert len(body_ids) == 1
+    assert _ref_count(db, body_ids.pop()) == 3
+
+
+def test_trim_and_reap_release_references(db):
+    first = db.create_mailbox('trimref@localhost', retention_days=1)
+    second = db.create_mailbox('reapref@localhost', retention_days=1)
+    a = db.add_email(first['id'], make_email('trimref@localhost', body='kept once', timestamp=100))
+    db.add_email(first['id'], make_email('trimref@localhost', timestamp=200))
+    db.add_email(second['id'], make_email('reapref@localhost', body='kept once'))
+    body_id = _body_id(db, a)
+    assert _ref_count(db, body_id) == 2
+
+    # 裁剪删除较旧的邮件，释放其引用
+    assert db.trim_mailbox_emails(first['id'], keep=1) == 1
+    assert _ref_count(db, body_id) == 1
+
+    # 过期邮箱回收时删除其邮件，最后一个引用释放后正文被删除
+    db.reap_expired_mailboxes(second['expires_at'] + 1, 100)
+    assert _ref_count(db, body_id) is None
@@ -0,0 +1,32 @@
+"""
+读连接池测试：线程本地连接在线程结束时归还连接池
+"""
+
+import threading
+
+from connection_pool import ConnectionPool
+
+
+def test_thread_local_connection_released_on_thread_exit(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'db.sqlite'), max_idle=4)
+
+    def reader():
+        conn = pool.connection()
+        assert pool.connection() is conn
+        conn.execute('SELECT 1').fetchone()
+        stats = pool.get_stats()
+        assert stats['thread_local'] == 1 and stats['in_use'] == 1
+
+    for _ in range(3):
+        thread = threading.Thread(target=reader)
+        thread.start()
+        thread.join()
+
+        stats = pool.get_stats()
+        assert stats['thread_local'] == 0
+        assert stats['in_use'] == 0
+        assert stats['idle'] == 1
+
+    # 后续线程复用归还的连接，不会每个线程新建一个
+    assert pool.get_stats()['created'] == 1
+    assert pool.get_stats()['reused'] == 2
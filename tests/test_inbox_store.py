@@ -0,0 +1,178 @@
+"""
+JSON 收件箱存储测试：合并快照不阻塞读写、合并中断后的恢复、按最久未访问淘汰
+"""
+
+import json
+import os
+import threading
+
+from src.backend import inbox_store as inbox_store_module
+from src.backend.inbox_store import InboxStore
+
+
+def _email(email_id, timestamp=1):
+    return {'id': email_id, 'From': 'a@x.com', 'Subject': email_id, 'Timestamp': timestamp}
+
+
+def _new_store(tmp_path, **kwargs):
+    kwargs.setdefault('flush_interval', 0)
+    return InboxStore(str(tmp_path / 'inbox.json'), **kwargs)
+
+
+def test_compaction_writes_snapshot_outside_lock(tmp_path, monkeypatch):
+    """写快照（fsync）期间其他线程仍可读写，期间的修改写入新日志"""
+    store = _new_store(tmp_path)
+    store.put_mailbox('u@test.com', {'created_at': 1, 'expires_at': 2 ** 40})
+    store.add_email('u@test.com', _email('a'))
+
+    writing = threading.Event()
+    release = threading.Event()
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        if os.path.realpath(f'/proc/self/fd/{fd}') == os.path.realpath(store.path + '.tmp'):
+            writing.set()
+            release.wait(5)
+        real_fsync(fd)
+
+    monkeypatch.setattr(inbox_store_module.os, 'fsync', slow_fsync)
+    compactor = threading.Thread(target=store.replace, args=(store.snapshot(),))
+    compactor.start()
+    assert writing.wait(5)
+
+    # 快照写入被阻塞时读写照常完成
+    done = threading.Event()
+
+    def writer():
+        store.add_email('u@test.com', _email('b', 2))
+        assert len(store.get_mailbox('u@test.com')['emails']) == 2
+        done.set()
+
+    threading.Thread(target=writer).start()
+    assert done.wait(2)
+    release.set()
+    compactor.join(5)
+
+    assert not os.path.exists(store.compacting_path)
+    with open(store.path) as f:
+        assert [email['id'] for email in json.load(f)['u@test.com']['emails']] == ['a']
+    reloaded = InboxStore(store.path, flush_interval=0)
+    assert [email['id'] for email in reloaded.get_mailbox('u@test.com')['emails']] == ['a', 'b']
+
+
+def test_recover_after_interrupted_compaction(tmp_path):
+    """快照已替换、改名的日志未删除时重放不会产生重复邮件；快照未替换时数据也完整"""
+    store = _new_store(tmp_path)
+    store.put_mailbox('u@test.com', {'created_at': 1, 'expires_at': 2 ** 40})
+    store.add_email('u@test.com', _email('a'))
+    store.add_email('u@test.com', _email('b', 2), keep=1)
+
+    # 模拟崩溃：日志已改名，快照尚未写入
+    with store.lock:
+        store._compact()
+        store._pending_snapshot = None
+        store._compacting = False
+    store.add_email('u@test.com', _email('c', 3))
+    assert os.path.exists(store.compacting_path)
+
+    reloaded = InboxStore(store.path, flush_interval=0)
+    assert [email['id'] for email in reloaded.get_mailbox('u@test.com')['emails']] == ['b', 'c']
+
+    # 模拟崩溃：快照已包含改名的日志，但改名的日志没有删除
+    with open(store.compacting_path, 'w') as f:
+        f.write(json.dumps({'op': 'email', 'address': 'u@test.com', 'email': _email('c', 3)}) + '\n')
+    again = InboxStore(store.path, flush_interval=0)
+    assert [email['id'] for email in again.get_mailbox('u@test.com')['emails']] == ['b', 'c']
+    assert not os.path.exists(again.compacting_path)
+
+
+def test_compact_inbox_file_refuses_loaded_store(tmp_path):
+    """迁移使用同一个模块中的 compact_inbox_file，且不会合并正在使用中的文件"""
+    import pytest
+    from src.backend import db_inbox_handler
+
+    assert db_inbox_handler.compact_inbox_file is inbox_store_module.compact_inbox_file
+
+    store = _new_store(tmp_path)
+    store.add_email('u@test.com', _email('a'))
+    log_size = os.path.getsize(store.log_path)
+    with pytest.raises(RuntimeError):
+        inbox_store_module.compact_inbox_file(store.path)
+    assert os.path.getsize(store.log_path) == log_size
+
+    # 未加载的文件正常合并：日志并入快照后删除
+    other = tmp_path / 'other.json'
+    with open(f'{other}.log', 'w') as f:
+        f.write(json.dumps({'op': 'email', 'address': 'v@test.com', 'email': _email('x')}) + '\n')
+    inbox_store_module.compact_inbox_file(str(other))
+    assert not os.path.exists(f'{other}.log')
+    with open(other) as f:
+        assert [email['id'] for email in json.load(f)['v@test.com']['emails']] == ['x']
+
+
+def _filled_store(tmp_path):
+    """三个邮箱按 a、b、c 的顺序写入，每个邮箱三封邮件（时间戳越小越旧）"""
+    store = _new_store(tmp_path)
+    for address in ('a@test.com', 'b@test.com', 'c@test.com'):
+        store.put_mailbox(address, {'created_at': 1, 'expires_at': 2 ** 40})
+        for timestamp in (3, 1, 2):
+            email = dict(_email(f'{address}-{timestamp}', timestamp), Body='x' * 200)
+            store.add_email(address, email)
+    return store
+
+
+def _email_ids(store, address):
+    mailbox = store.snapshot().get(address)
+    return None if mailbox is None else sorted(email['id'] for email in mailbox['emails'])
+
+
+def test_evict_under_limit_returns_none(tmp_path):
+    store = _filled_store(tmp_path)
+    size = store.get_stats()['size_bytes']
+    assert store.evict(size) is None
+    assert store.get_stats()['evicted_emails'] == 0
+    assert _email_ids(store, 'a@test.com') == ['a@test.com-1', 'a@test.com-2', 'a@test.com-3']
+
+
+def test_evict_removes_oldest_emails_of_least_recently_used_mailbox(tmp_path):
+    store = _filled_store(tmp_path)
+    # 读取 a 后访问顺序为 b、c、a
+    store.get_mailbox('a@test.com')
+    size = store.get_stats()['size_bytes']
+
+    report = store.evict(size - 1, target_ratio=1)
+    assert report['evicted_emails'] == 1
+    assert report['evicted_mailboxes'] == 0
+    assert report['mailboxes'] == ['b@test.com']
+    assert report['size_bytes'] == size - report['freed_bytes'] < size
+    assert _email_ids(store, 'b@test.com') == ['b@test.com-2', 'b@test.com-3']
+    assert len(_email_ids(store, 'a@test.com')) == len(_email_ids(store, 'c@test.com')) == 3
+
+    # 需要释放更多空间时继续按访问顺序淘汰：b 清空后淘汰 c 最旧的邮件
+    size = store.get_stats()['size_bytes']
+    per_email = report['freed_bytes']
+    report = store.evict(size - 2 * per_email - 1, target_ratio=1)
+    assert report['mailboxes'] == ['b@test.com', 'c@test.com']
+    assert _email_ids(store, 'b@test.com') == []
+    assert _email_ids(store, 'c@test.com') == ['c@test.com-2', 'c@test.com-3']
+    assert len(_email_ids(store, 'a@test.com')) == 3
+
+    stats = store.get_stats()
+    assert stats['evicted_emails'] == 4
+    assert stats['last_eviction'] == report
+
+    # 淘汰写入日志，重新加载后仍然生效
+    reloaded = InboxStore(store.path, flush_interval=0)
+    assert reloaded.get_mailbox('b@test.com')['emails'] == []
+    assert len(reloaded.get_mailbox('c@test.com')['emails']) == 2
+
+
+def test_evict_removes_empty_mailboxes_last(tmp_path):
+    store = _filled_store(tmp_path)
+    report = store.evict(1, target_ratio=0)
+    assert report['evicted_emails'] == 9
+    assert report['evicted_mailboxes'] == 3
+    assert report['mailboxes'] == ['a@test.com', 'b@test.com', 'c@test.com']
+    assert report['size_bytes'] == 0
+    assert store.get_stats()['mailboxes'] == 0
+    assert _email_ids(store, 'a@test.com') is None
@@ -0,0 +1,140 @@
+"""
+落盘队列崩溃重放测试
+每个阶段在独立子进程中运行，用 os._exit 模拟入库提交后、确认落盘前进程崩溃
+"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+from conftest import BACKEND_DIR, ROOT_DIR
+
+CHILD = textwrap.dedent('''
+    import os, sys, time
+    sys.path[:0] = [ROOT_DIR, BACKEND_DIR]
+    from database import db_manager
+    from src.backend.ingest_executor import IngestExecutor, process_email
+    from src.backend.ingest_spool import IngestSpool
+
+    mode = sys.argv[1]
+    spool_dir = os.environ['INGEST_SPOOL_DIR']
+    content = b"From: x@y.com\\r\\nTo: alice@localhost\\r\\nSubject: Hi\\r\\n\\r\\nhello\\r\\n"
+    rcpts = ['alice@localhost', 'bob@localhost']
+
+    if mode == 'setup':
+        db_manager.create_mailbox('alice@localhost', retention_days=1)
+        db_manager.create_mailbox('bob@localhost', retention_days=1)
+        os._exit(0)
+
+    process_fn = process_email
+    if mode == 'crash':
+        # 入库已提交，确认写入前崩溃
+        IngestSpool.ack = lambda self, record: os._exit(3)
+    elif mode == 'partial':
+        # alice 入库成功，bob 临时失败；记录部分确认后崩溃
+        def process_fn(content, recipients, spool_id):
+            parsed, results = process_email(content, [r for r in recipients if r != 'bob@localhost'], spool_id)
+            if 'bob@localhost' in recipients:
+                results['bob@localhost'] = 'Failed to save email: simulated'
+            return parsed, results
+        IngestSpool._on_failure = lambda self, record, error: os._exit(4)
+
+    spool = IngestSpool(directory=spool_dir)
+    spool.start(IngestExecutor(mode='thread'), process_fn)
+    if mode != 'replay':
+        spool.append('x@y.com', rcpts, content)
+        time.sleep(10)
+        os._exit(1)
+
+    deadline = time.time() + 10
+    while spool.get_stats()['completed'] < 1 and time.time() < deadline:
+        time.sleep(0.05)
+    os._exit(0 if spool.get_stats()['completed'] >= 1 else 2)
+''').replace('ROOT_DIR', repr(ROOT_DIR)).replace('BACKEND_DIR', repr(BACKEND_DIR))
+
+
+def _run(tmp_path, mode):
+    env = dict(os.environ,
+               USE_DATABASE='true',
+               DATABASE_PATH=str(tmp_path / 'mailbox.db'),
+               INGEST_SPOOL_DIR=str(tmp_path / 'spool'),
+               INGEST_SPOOL_FSYNC='true')
+    return subprocess.run([sys.executable, '-c', CHILD, mode], cwd=str(tmp_path), env=env,
+                          capture_output=True, text=True, timeout=60)
+
+
+def _copies(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'mailbox.db'))
+    try:
+        return dict(conn.execute('SELECT to_address, COUNT(*) FROM emails GROUP BY to_address').fetchall())
+    finally:
+        conn.close()
+
+
+def test_replay_after_crash_between_commit_and_ack(tmp_path):
+    assert _run(tmp_path, 'setup').returncode == 0
+
+    crashed = _run(tmp_path, 'crash')
+    assert crashed.returncode == 3, crashed.stdout + crashed.stderr
+    assert _copies(tmp_path) == {'alice@localhost': 1, 'bob@localhost': 1}
+
+    replayed = _run(tmp_path, 'replay')
+    assert replayed.returncode == 0, replayed.stdout + replayed.stderr
+    assert _copies(tmp_path) == {'alice@localhost': 1, 'bob@localhost': 1}
+
+
+def test_replay_only_pending_recipients_after_partial_failure(tmp_path):
+    assert _run(tmp_path, 'setup').returncode == 0
+
+    crashed = _run(tmp_path, 'partial')
+    assert crashed.returncode == 4, crashed.stdout + crashed.stderr
+    assert _copies(tmp_path) == {'alice@localhost': 1}
+    ack_files = [name for name in os.listdir(tmp_path / 'spool') if name.endswith('.ack')]
+    assert ack_files
+    assert '["bob@localhost"]' in (tmp_path / 'spool' / ack_files[0]).read_text()
+
+    replayed = _run(tmp_path, 'replay')
+    assert replayed.returncode == 0, replayed.stdout + replayed.stderr
+    assert _copies(tmp_path) == {'alice@localhost': 1, 'bob@localhost': 1}
+
+
+class _HeldExecutor:
+    """投递后不完成的处理池，由测试控制何时完成"""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit_background(self, fn, *args):
+        from concurrent.futures import Future
+        future = Future()
+        future.set_running_or_notify_cancel()
+        self.futures.append((future, args))
+        return future
+
+
+def test_append_rejected_when_pending_bytes_exceed_limit(tmp_path):
+    """未入库的邮件总大小超过上限时 append 返回None，已追加的记录不在内存中保留邮件内容"""
+    import time
+    from src.backend.ingest_spool import IngestSpool
+
+    content = b"Subject: Hi\r\n\r\n" + b"x" * 4000
+    executor = _HeldExecutor()
+    spool = IngestSpool(directory=str(tmp_path / 'spool'), fsync=False, max_pending_bytes=10000)
+    spool.start(executor, None)
+
+    first = spool.append('x@y.com', ['alice@localhost'], content)
+    second = spool.append('x@y.com', ['alice@localhost'], content)
+    assert first is not None and second is not None
+    assert first.content is None and second.content is None
+    assert spool.append('x@y.com', ['alice@localhost'], content) is None
+    assert spool.get_stats()['rejected'] == 1
+
+    # 处理池从段文件读取到完整邮件；完成后腾出空间，可以继续追加
+    deadline = time.time() + 5
+    while len(executor.futures) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert [args[0] for _, args in executor.futures] == [content, content]
+    executor.futures[0][0].set_result(({}, {'alice@localhost': 'Email accepted'}))
+    assert spool.append('x@y.com', ['alice@localhost'], content) is not None
@@ -0,0 +1,61 @@
+"""
+邮箱计数字段测试：触发器在插入、已读状态变化和删除时维护计数，校正函数修复不一致的计数
+"""
+
+from conftest import make_email
+
+
+def _actual(db, mailbox_id):
+    with db.get_connection() as conn:
+        row = conn.execute('''
+            SELECT COUNT(*) AS total, COALESCE(SUM(is_read = 0), 0) AS unread,
+                   MAX(timestamp) AS last, COALESCE(SUM(size_bytes), 0) AS storage
+            FROM emails WHERE mailbox_id = ?
+        ''', (mailbox_id,)).fetchone()
+    return row['total'], row['unread'], row['last'], row['storage']
+
+
+def _counters(db, mailbox_id):
+    stats = db.get_mailbox_stats(mailbox_id)
+    return stats['total_emails'], stats['unread_emails'], stats['last_email_time'], stats['storage_used']
+
+
+def test_triggers_keep_counters_in_sync(db):
+    mailbox = db.create_mailbox('counter@localhost', retention_days=1)
+    ids = [db.add_email(mailbox['id'], make_email('counter@localhost', timestamp=1000 + i)) for i in range(3)]
+    assert _counters(db, mailbox['id']) == _actual(db, mailbox['id'])
+    assert _counters(db, mailbox['id'])[:3] == (3, 3, 1002)
+
+    db.mark_email_as_read(ids[0])
+    assert _counters(db, mailbox['id'])[1] == 2
+    db.mark_email_as_unread(ids[0])
+    db.mark_email_as_read(ids[1])
+    assert _counters(db, mailbox['id'])[1] == 2
+
+    db.delete_email(ids[2])
+    assert _counters(db, mailbox['id']) == _actual(db, mailbox['id'])
+    assert _counters(db, mailbox['id'])[:3] == (2, 1, 1001)
+
+    for email_id in ids[:2]:
+        db.delete_email(email_id)
+    assert _counters(db, mailbox['id']) == (0, 0, None, 0)
+
+
+def test_reconcile_fixes_drifted_counters(db):
+    drifted = db.create_mailbox('drifted@localhost', retention_days=1)
+    healthy = db.create_mailbox('healthy@localhost', retention_days=1)
+    for address, mailbox in (('drifted@localhost', drifted), ('healthy@localhost', healthy)):
+        for i in range(2):
+            db.add_email(mailbox['id'], make_email(address, timestamp=2000 + i))
+    expected = _actual(db, drifted['id'])
+
+    db.write(lambda conn: conn.execute('''
+        UPDATE mailboxes SET email_count = 99, unread_count = 0, last_email_time = 1, storage_used = 5
+        WHERE id = ?
+    ''', (drifted['id'],)))
+    assert _counters(db, drifted['id']) != expected
+
+    assert db.reconcile_mailbox_counters()['fixed_mailboxes'] == 1
+    assert _counters(db, drifted['id']) == expected
+    assert _counters(db, healthy['id']) == _actual(db, healthy['id'])
+    assert db.reconcile_mailbox_counters()['fixed_mailboxes'] == 0
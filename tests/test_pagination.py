@@ -0,0 +1,55 @@
+"""
+游标分页测试：时间戳相同的邮件按 (timestamp, id) 排序，翻页不重复、不遗漏
+"""
+
+import pytest
+
+from conftest import make_email
+from pagination import decode_cursor, encode_cursor
+
+
+def _all_pages(db, mailbox_id, limit, between_pages=None):
+    seen, cursor = [], None
+    while True:
+        emails, next_key = db.get_emails_page(mailbox_id, limit, after=decode_cursor(cursor))
+        seen.extend(email['id'] for email in emails)
+        cursor = encode_cursor(next_key)
+        if cursor is None:
+            return seen
+        if between_pages:
+            between_pages()
+
+
+def test_pages_stable_with_equal_timestamps(db):
+    mailbox = db.create_mailbox('pages@localhost', retention_days=1)
+    # 多数邮件时间戳相同，分页边界会落在相同时间戳的邮件之间
+    timestamps = [100, 200, 200, 200, 200, 200, 300]
+    for timestamp in timestamps:
+        db.add_email(mailbox['id'], make_email('pages@localhost', timestamp=timestamp))
+
+    expected = [email['id'] for email in sorted(
+        db.get_emails_by_mailbox(mailbox['id']), key=lambda email: (email['Timestamp'], email['id']), reverse=True
+    )]
+    for limit in (1, 2, 3, 7, 10):
+        assert _all_pages(db, mailbox['id'], limit) == expected
+
+
+def test_new_mail_between_pages_does_not_shift_pages(db):
+    mailbox = db.create_mailbox('shift@localhost', retention_days=1)
+    for _ in range(6):
+        db.add_email(mailbox['id'], make_email('shift@localhost', timestamp=500))
+    before = {email['id'] for email in db.get_emails_by_mailbox(mailbox['id'])}
+
+    # 翻页期间到达更新的邮件：已有邮件既不重复也不遗漏，新邮件不出现在后续页中
+    seen = _all_pages(db, mailbox['id'], 2, between_pages=lambda: db.add_email(
+        mailbox['id'], make_email('shift@localhost', timestamp=900)))
+    assert len(seen) == len(set(seen))
+    assert set(seen) == before
+
+
+def test_invalid_cursor_rejected():
+    assert decode_cursor(encode_cursor((1, 'a'))) == (1, 'a')
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor((1, 'a', 'b')))
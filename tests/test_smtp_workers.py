@@ -0,0 +1,38 @@
+"""
+SMTP 工作进程的邮箱缓存测试：Web 进程删除或禁用邮箱后，工作进程在 RCPT 阶段立即拒收
+"""
+
+import asyncio
+import uuid
+
+from aiosmtpd.smtp import Envelope
+
+from database import DatabaseManager, db_manager
+from mailbox_service import MailboxService
+from src.backend.smtp_server import SMTPServer
+from src.backend.smtp_workers import disable_mailbox_cache
+
+
+def _rcpt(address):
+    envelope = Envelope()
+    envelope.mail_from = 'sender@example.com'
+    return asyncio.run(SMTPServer().handle_RCPT(None, None, envelope, address, []))
+
+
+def test_deleted_mailbox_rejected_at_rcpt(monkeypatch):
+    monkeypatch.setattr(db_manager.mailbox_cache, 'ttl', db_manager.mailbox_cache.ttl)
+    monkeypatch.setattr(db_manager.mailbox_cache, 'negative_ttl', db_manager.mailbox_cache.negative_ttl)
+    disable_mailbox_cache()
+
+    # 另一个 DatabaseManager 实例模拟 Web 进程：它的缓存失效不会到达工作进程
+    web_service = MailboxService(DatabaseManager(db_manager.db_path))
+    soft = db_manager.create_mailbox(f'soft-{uuid.uuid4().hex[:8]}@localhost', retention_days=1)
+    hard = db_manager.create_mailbox(f'hard-{uuid.uuid4().hex[:8]}@localhost', retention_days=1)
+    assert _rcpt(soft['address']) == '250 OK'
+    assert _rcpt(hard['address']) == '250 OK'
+
+    assert web_service.delete_mailbox(soft['id'], soft_delete=True)[0]
+    assert web_service.delete_mailbox(hard['id'], soft_delete=False)[0]
+
+    assert _rcpt(soft['address']).startswith('550 ')
+    assert _rcpt(hard['address']) == f"550 Mailbox {hard['address']} does not exist"
@@ -0,0 +1,69 @@
+"""
+写线程异常退出测试：打开写连接失败时调用方应收到异常而不是一直等待
+"""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from storage_writer import StorageWriter
+
+
+def _insert(conn, value):
+    conn.execute('INSERT INTO t (v) VALUES (?)', (value,))
+    return value
+
+
+def test_connect_failure_fails_callers(tmp_path):
+    """写连接的初始化失败时，execute 抛出该异常，排队中的写操作也全部失败"""
+    release = threading.Event()
+
+    def configure(conn):
+        release.wait(5)
+        raise sqlite3.OperationalError('simulated configure failure')
+
+    writer = StorageWriter(str(tmp_path / 'db.sqlite'), configure=configure, write_timeout=5)
+    futures = [writer.submit(_insert, i) for i in range(3)]
+    release.set()
+
+    for future in futures:
+        with pytest.raises(sqlite3.OperationalError, match='simulated'):
+            future.result(timeout=5)
+
+    started = time.monotonic()
+    with pytest.raises(sqlite3.OperationalError, match='simulated'):
+        writer.execute(_insert, 99)
+    assert time.monotonic() - started < 5
+    assert writer.get_stats()['failed'] == 4
+
+
+def test_bad_path_fails_callers(tmp_path):
+    """数据库路径不可用时 execute 立即失败"""
+    writer = StorageWriter(str(tmp_path / 'missing' / 'db.sqlite'), write_timeout=5)
+    with pytest.raises(sqlite3.OperationalError):
+        writer.execute(_insert, 1)
+
+
+def test_execute_timeout(tmp_path):
+    """写操作长时间未完成时 execute 在 write_timeout 后抛出 TimeoutError"""
+    path = str(tmp_path / 'db.sqlite')
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE t (v INTEGER)')
+
+    release = threading.Event()
+    writer = StorageWriter(path, write_timeout=0.2)
+    blocker = writer.submit(lambda conn: release.wait(5))
+    try:
+        with pytest.raises(TimeoutError, match='0.2'):
+            writer.execute(_insert, 1)
+    finally:
+        release.set()
+    blocker.result(timeout=5)
+
+    # 超时的写操作已取消，之后的写操作正常提交
+    assert writer.execute(_insert, 2) == 2
+    writer.stop()
+    with sqlite3.connect(path) as conn:
+        assert [row[0] for row in conn.execute('SELECT v FROM t')] == [2]
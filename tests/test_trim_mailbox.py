@@ -0,0 +1,55 @@
+"""
+邮件数上限测试：投递时在同一事务中只保留最新的 MAX_EMAILS_PER_ADDRESS 封邮件
+"""
+
+import config
+from conftest import make_email
+
+
+def _ids(db, mailbox_id):
+    return {email['id'] for email in db.get_emails_by_mailbox(mailbox_id)}
+
+
+def test_delivery_keeps_newest_emails(db, monkeypatch):
+    monkeypatch.setattr(config, 'MAX_EMAILS_PER_ADDRESS', 3)
+    mailbox = db.create_mailbox('trim@localhost', retention_days=1)
+
+    # 较旧的邮件后到达时按时间戳裁剪，而不是按到达顺序
+    delivered = {}
+    for timestamp in (100, 500, 300, 200, 400, 50):
+        delivered[timestamp] = db.add_email(mailbox['id'], make_email('trim@localhost', timestamp=timestamp))
+
+    assert _ids(db, mailbox['id']) == {delivered[t] for t in (300, 400, 500)}
+    stats = db.get_mailbox_stats(mailbox['id'])
+    assert stats['total_emails'] == 3
+    assert stats['last_email_time'] == 500
+
+
+def test_trim_orders_equal_timestamps_by_id(db, monkeypatch):
+    monkeypatch.setattr(config, 'MAX_EMAILS_PER_ADDRESS', 0)
+    mailbox = db.create_mailbox('ties@localhost', retention_days=1)
+    ids = [db.add_email(mailbox['id'], make_email('ties@localhost', timestamp=700)) for _ in range(5)]
+    assert len(_ids(db, mailbox['id'])) == 5
+
+    # 上限为0时不裁剪；显式裁剪时时间戳相同的邮件按ID保留较大的
+    assert db.trim_mailbox_emails(mailbox['id']) == 0
+    assert db.trim_mailbox_emails(mailbox['id'], keep=2) == 3
+    assert _ids(db, mailbox['id']) == set(sorted(ids)[-2:])
+    assert db.get_mailbox_stats(mailbox['id'])['total_emails'] == 2
+    assert db.trim_mailbox_emails(mailbox['id'], keep=2) == 0
+
+
+def test_multi_recipient_delivery_trims_each_mailbox(db, monkeypatch):
+    monkeypatch.setattr(config, 'MAX_EMAILS_PER_ADDRESS', 2)
+    full = db.create_mailbox('full@localhost', retention_days=1)
+    empty = db.create_mailbox('empty@localhost', retention_days=1)
+    for timestamp in (10, 20):
+        db.add_email(full['id'], make_email('full@localhost', timestamp=timestamp))
+
+    results = db.add_email_to_mailboxes(
+        [(full['id'], 'full@localhost'), (empty['id'], 'empty@localhost')],
+        make_email('full@localhost', timestamp=30)
+    )
+    assert all(error is None for _, error in results.values())
+    assert sorted(email['Timestamp'] for email in db.get_emails_by_mailbox(full['id'])) == [20, 30]
+    assert [email['Timestamp'] for email in db.get_emails_by_mailbox(empty['id'])] == [30]
@@ -0,0 +1,99 @@
+"""
+等待新邮件接口测试：已有或等待期间到达的符合条件的邮件立即返回，超时返回204
+"""
+
+import threading
+import time
+import uuid
+
+import pytest
+
+import config
+from conftest import make_email
+
+
+@pytest.fixture
+def client():
+    from src.backend.flask_app import app
+    return app.test_client()
+
+
+@pytest.fixture
+def mailbox():
+    from database import db_manager
+    return db_manager.create_mailbox(f'wait-{uuid.uuid4().hex[:8]}@localhost', retention_days=1)
+
+
+def _wait(client, mailbox, **params):
+    params = dict(params, address=mailbox['address'], token=mailbox['access_token'])
+    return client.get('/api/wait_for_email', query_string=params, environ_base={'REMOTE_ADDR': '127.0.0.1'})
+
+
+def _deliver(mailbox, **fields):
+    from src.backend.db_inbox_handler import deliver_email
+    from src.backend.mail_notifier import notifier
+    email = make_email(mailbox['address'], **fields)
+    results = deliver_email(email, [mailbox['address']])
+    assert results == {mailbox['address']: 'Email accepted'}
+    notifier.publish_results(email, results)
+    return email
+
+
+def test_returns_existing_match(client, mailbox):
+    _deliver(mailbox, subject='Newsletter', timestamp=100)
+    code = _deliver(mailbox, subject='Your code is 1234', body='code body', timestamp=200)
+    _deliver(mailbox, subject='Your code is 5678', timestamp=300)
+
+    # 返回最早的一封符合条件的完整邮件
+    response = _wait(client, mailbox, subject_regex=r'code is \d+', timeout=5)
+    assert response.status_code == 200
+    assert response.get_json()['id'] == code['id']
+    assert response.get_json()['Body'] == 'code body'
+
+    response = _wait(client, mailbox, subject_regex='code', since=250, timeout=5)
+    assert response.status_code == 200
+    assert response.get_json()['Subject'] == 'Your code is 5678'
+
+
+def test_wakes_when_matching_email_arrives(client, mailbox, monkeypatch):
+    from src.backend.mail_notifier import notifier
+
+    # 轮询间隔大于等待时间：只有新邮件通知能及时唤醒请求
+    monkeypatch.setattr(config, 'STREAM_POLL_INTERVAL', 30)
+    _deliver(mailbox, subject='Unrelated', timestamp=100)
+    delivered = {}
+
+    def deliver_later():
+        time.sleep(0.3)
+        delivered['email'] = _deliver(mailbox, subject='Welcome aboard', **{'From': 'noreply@service.com'})
+
+    thread = threading.Thread(target=deliver_later)
+    started = time.time()
+    thread.start()
+    response = _wait(client, mailbox, subject_regex='^Welcome', **{'from': 'NOREPLY@service.com', 'timeout': 10})
+    elapsed = time.time() - started
+    thread.join(5)
+
+    assert response.status_code == 200
+    assert response.get_json()['id'] == delivered['email']['id']
+    assert elapsed < 5
+    assert notifier.subscriber_count() == 0
+
+
+def test_timeout_returns_no_content(client, mailbox, monkeypatch):
+    from src.backend.mail_notifier import notifier
+
+    monkeypatch.setattr(config, 'STREAM_POLL_INTERVAL', 0.1)
+    _deliver(mailbox, subject='Unrelated')
+
+    started = time.time()
+    response = _wait(client, mailbox, subject_regex='^Welcome', timeout=0.5)
+    assert response.status_code == 204
+    assert response.data == b''
+    assert 0.5 <= time.time() - started < 5
+    assert notifier.subscriber_count() == 0
+
+
+def test_rejects_invalid_token(client, mailbox):
+    response = _wait(client, dict(mailbox, access_token='wrong'), timeout=0)
+    assert response.status_code == 401